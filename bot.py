@@ -16,9 +16,12 @@ import sentry_sdk
 
 from coc.ext import discordlinks
 from discord.ext import commands
+from prometheus_async.aio.web import start_http_server
+from prometheus_client import Gauge
 
 from botlog import setup_logging, add_hooks
 from cogs.utils import context
+from cogs.utils.cache import ClanCache, GuildConfigCache
 from cogs.utils.error_handler import error_handler, discord_event_error
 from cogs.utils.command_tree import CustomCommandTree
 
@@ -68,6 +71,14 @@ intents.emojis = True
 
 log = logging.getLogger()
 
+config_cache_gauge = Gauge("donbot_guild_config_cache", "Guild configuration cache statistics.", ["stat"])
+clan_cache_gauge = Gauge("donbot_clan_cache", "Guild clan cache statistics.", ["stat"])
+
+# how long a guild's clans are cached for. Membership changes from the syncer refresh them sooner.
+CLAN_CACHE_TTL = 600.0
+# membership notifications for a clan within this many seconds are coalesced into one refresh.
+CLAN_REFRESH_DELAY = 10.0
+
 
 async def get_pref(bot, message):
     if command_prefix:
@@ -127,6 +138,20 @@ class DonationBot(commands.AutoShardedBot):
 
         self.fake_clan_guilds = {}
 
+        self.clan_cache = ClanCache(ttl=CLAN_CACHE_TTL)
+        self._clan_refreshes = {}  # clan tag: asyncio.TimerHandle
+        self.config_cache = GuildConfigCache(self)
+        self.listener = None
+        self._listener_tasks = set()
+
+        for stat in ("entries", "hits", "misses"):
+            config_cache_gauge.labels(stat).set_function(
+                lambda stat=stat: len(self.config_cache) if stat == "entries" else getattr(self.config_cache, stat)
+            )
+            clan_cache_gauge.labels(stat).set_function(
+                lambda stat=stat: len(self.clan_cache) if stat == "entries" else getattr(self.clan_cache, stat)
+            )
+
     async def setup_hook(self):
         setup_logging(bot)
         self.session = aiohttp.ClientSession()
@@ -145,6 +170,9 @@ class DonationBot(commands.AutoShardedBot):
 
         self.links = await discordlinks.login(creds.links_username, creds.links_password)
 
+        await self.start_listener()
+        await start_http_server(port=8003)
+
         for e in initial_extensions:
             try:
                 await self.load_extension(e)  # load cogs
@@ -200,8 +228,12 @@ class DonationBot(commands.AutoShardedBot):
 
             return  # if there's no command invoked return
 
-        async with ctx.acquire():
+        # commands borrow a connection per query (see Context.db), so there's nothing to hold here.
+        # anything a command explicitly acquired and didn't give back is released when it's done.
+        try:
             await self.invoke(ctx)
+        finally:
+            await ctx.release()
 
     async def on_ready(self):
         await self.change_presence(activity=discord.Game("Creator Code: Sidekick"))
@@ -213,13 +245,89 @@ class DonationBot(commands.AutoShardedBot):
         await self.change_presence(activity=discord.Game('+help for commands'))
 
     async def get_clans(self, guild_id, in_event=False):
-        if in_event:
-            query = "SELECT DISTINCT clan_tag FROM clans WHERE guild_id = $1 AND in_event = $2"
-            fetch = await self.pool.fetch(query, guild_id, in_event)
+        async def fetch_clans():
+            if in_event:
+                query = "SELECT DISTINCT clan_tag FROM clans WHERE guild_id = $1 AND in_event = $2"
+                fetch = await self.pool.fetch(query, guild_id, in_event)
+            else:
+                query = "SELECT DISTINCT clan_tag FROM clans WHERE guild_id = $1"
+                fetch = await self.pool.fetch(query, guild_id)
+            return await self.coc.get_clans(n[0].strip() for n in fetch).flatten()
+
+        return list(await self.clan_cache.get((guild_id, in_event), fetch_clans) or [])
+
+    async def close(self):
+        await super().close()
+        for handle in self._clan_refreshes.values():
+            handle.cancel()
+        for task in self._listener_tasks:
+            task.cancel()
+        if self.listener and not self.listener.is_closed():
+            await self.listener.close()
+
+    async def start_listener(self):
+        self.listener = await asyncpg.connect(creds.postgres)
+        self.listener.add_termination_listener(self.on_listener_terminated)
+        await self.listener.add_listener("clans_update", self.on_clans_notify)
+        await self.listener.add_listener("clan_members", self.on_clan_members_notify)
+        await self.listener.add_listener("guild_config", self.on_guild_config_notify)
+
+    def create_listener_task(self, coro):
+        # keep a reference so the task isn't garbage collected before it's done.
+        task = asyncio.create_task(coro)
+        self._listener_tasks.add(task)
+        task.add_done_callback(self._on_listener_task_done)
+        return task
+
+    def _on_listener_task_done(self, task):
+        self._listener_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            log.error("postgres listener task failed", exc_info=task.exception())
+
+    def on_listener_terminated(self, connection):
+        if self.is_closed():
+            return  # we're shutting down, so it was closed on purpose.
+
+        log.warning("postgres listener connection closed, reconnecting")
+        # anything could have changed while we weren't listening.
+        self.clan_cache.invalidate()
+        self.config_cache.invalidate()
+        self.create_listener_task(self.reconnect_listener())
+
+    async def reconnect_listener(self):
+        while True:
+            try:
+                await self.start_listener()
+            except (OSError, asyncpg.PostgresError):
+                log.exception("failed to reconnect postgres listener")
+                await asyncio.sleep(5)
+            else:
+                return
+
+    def on_clans_notify(self, connection, pid, channel, payload):
+        # a clan was added to or removed from the guild.
+        self.clan_cache.invalidate(int(payload))
+        self.config_cache.invalidate(int(payload))
+
+    def on_guild_config_notify(self, connection, pid, channel, payload):
+        self.config_cache.invalidate(int(payload))
+
+    def on_clan_members_notify(self, connection, pid, channel, payload):
+        # someone joined or left the clan, so refresh its cached copy (once, however many of them there are).
+        if payload in self._clan_refreshes or not self.clan_cache.has_clan(payload):
+            return
+        self._clan_refreshes[payload] = self.loop.call_later(
+            CLAN_REFRESH_DELAY, lambda: self.create_listener_task(self.refresh_cached_clan(payload))
+        )
+
+    async def refresh_cached_clan(self, clan_tag):
+        self._clan_refreshes.pop(clan_tag, None)
+        try:
+            clan = await self.coc.get_clan(clan_tag)
+        except coc.HTTPException:
+            log.info("failed to refresh cached clan %s", clan_tag)
         else:
-            query = "SELECT DISTINCT clan_tag FROM clans WHERE guild_id = $1"
-            fetch = await self.pool.fetch(query, guild_id)
-        return await self.coc.get_clans(n[0].strip() for n in fetch).flatten()
+            self.clan_cache.update_clan(clan)
 
     async def on_command_error(self, context, exception):
         try:
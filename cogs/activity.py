@@ -1,17 +1,29 @@
+import asyncio
 import datetime
+import hashlib
 import io
+import multiprocessing
 import typing
 
+from concurrent.futures import ProcessPoolExecutor
+
 import discord
-import numpy as np
-import seaborn as sns
 
-from matplotlib import pyplot as plt
-from matplotlib import dates as mdates
 from coc.utils import correct_tag
 from discord import app_commands
 from discord.ext import commands, tasks
 
+from cogs.utils.cache import BytesCache
+from cogs.utils.graphs import render_bar_graph, render_line_graph
+
+GRAPH_WORKERS = 2
+GRAPH_CACHE_TTL = 3600.0
+
+
+def line_points(records):
+    """Plain (date, counter, stdev) tuples, so they can be sent to the render pool."""
+    return [(r['date'], r['counter'], r['stdev']) for r in records]
+
 
 class Activity(commands.Cog):
     def __init__(self, bot):
@@ -20,12 +32,26 @@ class Activity(commands.Cog):
         self.graphs = {}
         self.bot_wide_line = None
 
+        # spawn rather than fork, so workers don't inherit the bot's event loop and sockets.
+        self.render_pool = ProcessPoolExecutor(max_workers=GRAPH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        # keyed by everything that goes into the image, including a digest of the data. identical requests
+        # that come in while one is rendering wait for that render instead of starting their own.
+        self.graph_cache = BytesCache(max_bytes=32 * 1024 * 1024, ttl=GRAPH_CACHE_TTL)
+
         self.clean_graph_cache.start()
         self.load_bot_wide_data.start()
 
     def cog_unload(self):
         self.clean_graph_cache.cancel()
         self.load_bot_wide_data.cancel()
+        self.render_pool.shutdown(wait=False, cancel_futures=True)
+
+    async def render_graph(self, key, func, *args):
+        def fetch():
+            return asyncio.get_running_loop().run_in_executor(self.render_pool, func, *args)
+
+        digest = hashlib.sha1(repr(args).encode()).hexdigest()
+        return await self.graph_cache.get((*key, digest), fetch)
 
     def add_bar_graph(self, channel_id, author_id, **data):
         key = ("bar", channel_id, author_id)
@@ -53,11 +79,11 @@ class Activity(commands.Cog):
     async def load_bot_wide_data(self):
         await self.bot.wait_until_ready()
         query = """WITH cte AS (
-                            SELECT cast(SUM(counter) as decimal) / COUNT(distinct player_tag) AS counter, 
-                                   date_trunc('day', hour_time) AS "date" 
-                            FROM activity_query 
-                            WHERE hour_time < TIMESTAMP 'today'
-                            GROUP BY date 
+                            SELECT cast(SUM(total) as decimal) / COUNT(*) AS counter, 
+                                   day::timestamp AS "date" 
+                            FROM activity_player_daily 
+                            WHERE day < CURRENT_DATE
+                            GROUP BY day 
                         ),
                         cte2 AS (
                             SELECT stddev(counter) AS stdev, 
@@ -74,7 +100,7 @@ class Activity(commands.Cog):
                         ORDER BY date
                 """
         fetch = await self.bot.pool.fetch(query)
-        self.bot_wide_line = ("Bot Average", fetch)
+        self.bot_wide_line = ("Bot Average", line_points(fetch))
 
     @tasks.loop(minutes=1)
     async def clean_graph_cache(self):
@@ -86,6 +112,8 @@ class Activity(commands.Cog):
             except KeyError:
                 pass
 
+        await self.graph_cache.prune()
+
     async def fetch_player(self, name_or_tag: str, guild_id, user):
         fake_clan_in_server = guild_id in self.bot.fake_clan_guilds
         join = "(clans.clan_tag = players.clan_tag OR " \
@@ -200,10 +228,7 @@ class Activity(commands.Cog):
                           COALESCE((SELECT dark_mode FROM user_config WHERE user_id = $1), False) as dark_mode"""
         fetch = await self.bot.pool.fetchrow(query, intr.user.id)
         timezone_offset = int(fetch['timezone_offset'])
-        if fetch['dark_mode']:
-            plt.style.use('dark_background')
-        else:
-            plt.style.use('default')
+        dark_mode = fetch['dark_mode']
 
         if clan:
             fetch = await self.fetch_clan(clan, intr.guild_id, intr.user)
@@ -225,51 +250,30 @@ class Activity(commands.Cog):
 
         if clan:
             query = """
-                                WITH cte1 AS (
-                                    SELECT COUNT(DISTINCT player_tag) as "num_players", 
-                                           DATE(activity_query.hour_time) as "date" 
-                                    FROM activity_query 
-                                    WHERE clan_tag = $1 
-                                    AND activity_query.hour_time > now() - ($2 ||' days')::interval
-                                    GROUP by date
-                                ),
-                                cte2 AS (
-                                    SELECT cast(SUM(counter) as decimal) / MIN(num_players) AS num_events, 
-                                           hour_time 
-                                    FROM activity_query 
-                                    JOIN cte1 
-                                    ON cte1.date = date(hour_time) 
-                                    WHERE clan_tag = $1 
-                                    AND activity_query.hour_time > now() - ($2 ||' days')::interval
-                                    GROUP BY hour_time
-                                )
-                                SELECT date_part('HOUR', hour_time) as "hour_digit", AVG(num_events), MIN(hour_time) 
-                                FROM cte2 
-                                GROUP BY hour_digit
-                                """
+                    SELECT g.h - 1 AS "hour_digit",
+                           COALESCE(AVG(days.counters[g.h]::decimal / days.num_players) FILTER (WHERE days.counters[g.h] > 0), 0) AS "avg",
+                           MIN(days.day)::timestamp AS "min"
+                    FROM activity_clan_daily AS days
+                    CROSS JOIN generate_series(1, 24) AS g(h)
+                    WHERE days.clan_tag = $1
+                    AND days.num_players > 0
+                    AND days.day > (now() - ($2 ||' days')::interval)::date
+                    GROUP BY g.h
+                    ORDER BY g.h
+                    """
             res2 = await self.bot.pool.fetch(query, fetch['clan_tag'], str(days))
             res = [(fetch['clan_name'], res2)]
         elif player:
             query = """
-                    WITH valid_times AS (
-                        SELECT generate_series(min(hour_time), max(hour_time), '1 hour'::interval) as "time"
-                        FROM activity_query 
-                        WHERE player_tag = $1
-                        AND activity_query.hour_time > now() - ($2 ||' days')::interval
-                    ),
-                    actual_times AS (
-                        SELECT hour_time as "time", counter
-                        FROM activity_query
-                        WHERE player_tag = $1
-                        AND activity_query.hour_time > now() - ($2 ||' days')::interval
-                    )
-                    SELECT date_part('HOUR', valid_times."time") AS "hour", 
-                           AVG(COALESCE(actual_times.counter, 0)), 
-                           min(valid_times."time")
-                    FROM valid_times
-                    LEFT JOIN actual_times ON actual_times.time = valid_times.time
-                    GROUP BY "hour"
-                    ORDER BY "hour"
+                    SELECT g.h - 1 AS "hour",
+                           SUM(days.counters[g.h])::decimal / (MAX(days.day) - MIN(days.day) + 1) AS "avg",
+                           MIN(days.day)::timestamp AS "min"
+                    FROM activity_player_daily AS days
+                    CROSS JOIN generate_series(1, 24) AS g(h)
+                    WHERE days.player_tag = $1
+                    AND days.day > (now() - ($2 ||' days')::interval)::date
+                    GROUP BY g.h
+                    ORDER BY g.h
                     """
             res2 = await self.bot.pool.fetch(query, fetch['player_tag'], str(days))
             res = [(fetch['player_name'], res2)]
@@ -302,33 +306,13 @@ class Activity(commands.Cog):
 
         data_to_add = {**existing_graph_data, **data_to_add}
 
-        def get_width_offset(index):
-            scr_width = 0.8 / len(data_to_add)
-            return scr_width, scr_width * index
-
-        y_pos = np.arange(24)
-        graphs = []
-
-        for i, (name, data_iter) in enumerate(data_to_add.items()):
-            data_iter = dict(sorted(data_iter.items()))
-            width, offset = get_width_offset(i)
-            graphs.append((
-                plt.bar([n + offset for n in y_pos], list(data_iter.values()), width, align='center'), name
-            ))
-
-        plt.xticks(y_pos, list(range(24)))
-        plt.xlabel(f"Time (hr) - UTC{'+' + str(timezone_offset) if timezone_offset > 0 else timezone_offset}")
-        plt.ylabel("Activity (average events)")
-        plt.title(f"Activity Graph - Time Period: {days + 1}d")
-        plt.legend(tuple(n[0] for n in graphs), tuple(n[1] for n in graphs))
-
         self.add_bar_graph(intr.channel.id, intr.user.id, **data_to_add)
 
-        b = io.BytesIO()
-        plt.savefig(b, format='png')
-        b.seek(0)
-        await intr.edit_original_response(attachments=[discord.File(b, f'activitygraph.png')])
-        plt.close()
+        image = await self.render_graph(
+            ("bar", intr.guild_id, tuple(data_to_add), days, timezone_offset, dark_mode),
+            render_bar_graph, data_to_add, days, timezone_offset, dark_mode,
+        )
+        await intr.edit_original_response(attachments=[discord.File(io.BytesIO(image), f'activitygraph.png')])
 
     @activity_group.command(
         name="line", description="See long-term changes in activity/online times for a clan or player."
@@ -376,10 +360,7 @@ class Activity(commands.Cog):
 
         query = """SELECT COALESCE((SELECT dark_mode FROM user_config WHERE user_id = $1), False) as dark_mode"""
         fetch = await self.bot.pool.fetchrow(query, intr.user.id)
-        if fetch['dark_mode']:
-            plt.style.use('dark_background')
-        else:
-            plt.style.use('default')
+        dark_mode = fetch['dark_mode']
 
         if clan:
             fetch = await self.fetch_clan(clan, intr.guild_id, intr.user)
@@ -401,13 +382,12 @@ class Activity(commands.Cog):
 
         if clan:
             query = """WITH cte AS (
-                            SELECT cast(SUM(counter) as decimal) / COUNT(distinct player_tag) AS counter, 
-                                   date_trunc('day', hour_time) AS "date" 
-                            FROM activity_query 
+                            SELECT cast(total as decimal) / num_players AS counter, 
+                                   day::timestamp AS "date" 
+                            FROM activity_clan_daily 
                             WHERE clan_tag = $1 
-                            AND hour_time < TIMESTAMP 'today'
-                            GROUP BY date 
-                            ORDER BY date
+                            AND day < CURRENT_DATE
+                            AND num_players > 0
                         ),
                         cte2 AS (
                             SELECT stddev(counter) AS stdev, 
@@ -424,16 +404,14 @@ class Activity(commands.Cog):
                         ORDER BY date
                     """
             res2 = await self.bot.pool.fetch(query, fetch['clan_tag'])
-            res = [(fetch['clan_name'], res2)]
+            res = [(fetch['clan_name'], line_points(res2))]
         elif player:
             query = """WITH cte AS (
-                            SELECT SUM(counter) AS counter, 
-                                   date_trunc('day', hour_time) AS date 
-                            FROM activity_query 
+                            SELECT total AS counter, 
+                                   day::timestamp AS date 
+                            FROM activity_player_daily 
                             WHERE player_tag = $1 
-                            AND hour_time < TIMESTAMP 'today'
-                            GROUP BY date 
-                            ORDER BY date
+                            AND day < CURRENT_DATE
                         ),
                         cte2 AS (
                             SELECT stddev(counter) AS stdev, 
@@ -450,7 +428,7 @@ class Activity(commands.Cog):
                         ORDER BY date
                     """
             res2 = await self.bot.pool.fetch(query, fetch['player_tag'])
-            res = [(fetch['player_name'], res2)]
+            res = [(fetch['player_name'], line_points(res2))]
         else:
             fetch = None
 
@@ -465,54 +443,14 @@ class Activity(commands.Cog):
         if self.bot_wide_line:
             data.insert(0, self.bot_wide_line)
 
-        colours = sns.color_palette("hls", len(data))
-
-        fig, ax = plt.subplots()
-        min_date = None
-        max_date = None
-
-        for i, entry in enumerate(data):
-            name, record = entry
-            means = []
-            stdev = []
-            dates = []
-            for item in record:
-                means.append(item['counter'])
-                stdev.append(item['stdev'])
-                dates.append(item['date'])
-
-            meanst = np.array(means, dtype=np.float64)
-            sdt = np.array(stdev, dtype=np.float64)
-            ax.plot(dates, means, label=name, color=colours[i])
-
-            if name != "Bot Average":
-                ax.fill_between(dates, [max(0, n) for n in meanst - sdt], meanst + sdt, alpha=0.3, facecolor=colours[i])
-                if not min_date or dates[0] < min_date:
-                    min_date = dates[0]
-                if not max_date or dates[-1] > max_date:
-                    max_date = dates[-1]
-
-            locator = mdates.AutoDateLocator(minticks=3, maxticks=10)
-            formatter = mdates.ConciseDateFormatter(locator)
-            ax.xaxis.set_major_locator(locator)
-            ax.xaxis.set_major_formatter(formatter)
-
-            ax.legend()
-
-        ax.grid(True)
-        ax.set_ylabel("Activity")
-        ax.set_title("Activity Change Over Time")
-        ax.set_xlim(min_date, max_date)
+        image = await self.render_graph(
+            ("line", intr.guild_id, tuple(n for n, _ in data), dark_mode), render_line_graph, data, dark_mode
+        )
 
         data = [(n, v) for n, v in data if n != "Bot Average"]
-
         self.add_line_graph(intr.channel.id, intr.user.id, data)
 
-        b = io.BytesIO()
-        plt.savefig(b, format='png')
-        b.seek(0)
-        await intr.edit_original_response(attachments=[discord.File(b, f'activitygraph.png')])
-        plt.close()
+        await intr.edit_original_response(attachments=[discord.File(io.BytesIO(image), f'activitygraph.png')])
 
     @activity_group.command(name='clear', description="Clear cache for any previous activity commands.")
     async def activity_clear(self, intr: discord.Interaction):
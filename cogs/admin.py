@@ -18,6 +18,7 @@ import logging
 from typing import Union, Optional
 import shlex
 
+from cogs.utils.exports import export_csv, export_filename
 from cogs.utils.formatters import TabularData
 from cogs.utils.converters import GlobalChannel
 from cogs.utils.emoji_lookup import misc
@@ -104,6 +105,19 @@ class Admin(commands.Cog):
         # remove `foo`
         return content.strip('` \n')
 
+    @staticmethod
+    def pop_flag(content, flag):
+        """Remove ``flag`` if it's the first or last word of ``content``. Returns whether it was there, and the rest."""
+        parts = content.split(maxsplit=1)
+        if parts and parts[0] == flag:
+            return True, parts[1] if len(parts) > 1 else ""
+
+        parts = content.rsplit(maxsplit=1)
+        if len(parts) == 2 and parts[1] == flag:
+            return True, parts[0]
+
+        return False, content
+
     async def cog_check(self, ctx):
         return await self.bot.is_owner(ctx.author)
 
@@ -396,26 +410,31 @@ class Admin(commands.Cog):
 
     @commands.command(hidden=True)
     async def sqlcsv(self, ctx, *, query: str):
-        results, timer = await self.execute_sql(ctx, query)
-        if not timer:
-            return await self.safe_send(ctx, results)
+        """Run some SQL and get the results as a .csv. Add `--gzip` before or after the query to compress it."""
+        compress, query = self.pop_flag(query, "--gzip")
+        query = self.cleanup_code(query)
+        if query.count(';') > 1:
+            return await ctx.send("Exports only support a single statement.")
 
-        rows = len(results)
-        if rows == 0:
-            return await ctx.send(f'`{timer:.2f}ms: {results}`')
+        try:
+            start = time.perf_counter()
+            async with ctx.acquire() as conn:
+                fp, rows = await export_csv(conn, query, compress=compress)
+            timer = (time.perf_counter() - start) * 1000.0
+        except Exception:
+            return await self.safe_send(ctx, f'```py\n{traceback.format_exc()}\n```')
 
-        csv = ""
-        for i, row in enumerate(results):
-            if i == 0:
-                # headers
-                csv += ''.join(f"{col}," for col in row.keys())
-                csv += '\n'
+        with fp:
+            if rows == 0:
+                return await ctx.send(f'`{timer:.2f}ms: no rows returned`')
 
-            csv += ''.join(f"{r}," for r in row.values())
-            csv += '\n'
+            size = fp.seek(0, io.SEEK_END)
+            fp.seek(0)
+            if ctx.guild and size > ctx.guild.filesize_limit:
+                return await ctx.send(f'`{timer:.2f}ms: {rows} rows is too big to upload, try --gzip or a LIMIT`')
 
-        fmt = f'Returned {rows} rows in {timer:.2f}ms*'
-        return await ctx.send(fmt, file=discord.File(filename="sql-query-results.csv", fp=io.BytesIO(csv.encode("utf-8"))))
+            fmt = f'Returned {rows} rows in {timer:.2f}ms*'
+            return await ctx.send(fmt, file=discord.File(filename=export_filename("sql-query-results", compress), fp=fp))
 
 
 async def setup(bot):
@@ -10,6 +10,7 @@ import coc
 import pytz
 
 from discord.ext import commands, tasks
+from prometheus_client import Counter, Histogram
 
 from cogs.utils.db_objects import SlimEventConfig
 from cogs.utils.formatters import readable_time, LineWrapper
@@ -18,6 +19,10 @@ from cogs.utils.donationtrophylogs import get_events_fmt
 
 log = logging.getLogger(__name__)
 
+activity_sync_histo = Histogram("donbot_activity_sync_seconds", "Time taken by each activity sync.", buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800))
+activity_sync_events = Counter("donbot_activity_sync_events", "Donation and trophy events processed by the activity sync.")
+activity_sync_rows = Counter("donbot_activity_sync_rows", "Rows inserted into activity_query by the activity sync.")
+
 
 def seconds_until_5am():
     now = datetime.datetime.now(pytz.utc)
@@ -72,18 +77,16 @@ class BackgroundManagement(commands.Cog):
     @tasks.loop()
     async def sync_activity_stats(self):
         await asyncio.sleep(seconds_until_5am())
-        query = """INSERT INTO activity_query (
-                       player_tag, 
-                       clan_tag, 
-                       hour_time, 
-                       counter, 
-                       hour_digit
-                    ) 
-                    SELECT player_tag, clan_tag, timer, num_events, hour 
-                    FROM get_activity_to_sync()
-                    ON CONFLICT DO NOTHING
-                """
-        await self.bot.pool.execute(query)
+        # only events since the last run are synced; each run is recorded in activity_sync_runs.
+        run = await self.bot.pool.fetchrow("SELECT * FROM sync_activity()")
+
+        activity_sync_histo.observe(run['duration'].total_seconds())
+        activity_sync_events.inc(run['events_processed'])
+        activity_sync_rows.inc(run['rows_inserted'])
+        log.info(
+            'synced activity from %s to %s: %s events, %s rows inserted in %s',
+            run['synced_from'], run['synced_to'], run['events_processed'], run['rows_inserted'], run['duration']
+        )
 
     @commands.command(hidden=True)
     @commands.is_owner()
@@ -93,52 +96,12 @@ class BackgroundManagement(commands.Cog):
     @tasks.loop()
     async def daily_history_updater(self):
         await asyncio.sleep(seconds_until_5am())
-        query = """INSERT INTO players_history (
-                                    player_tag, 
-                                    donations, 
-                                    received, 
-                                    user_id, 
-                                    friend_in_need, 
-                                    sharing_is_caring, 
-                                    trophies, 
-                                    best_trophies, 
-                                    last_updated, 
-                                    league_id, 
-                                    versus_trophies, 
-                                    clan_tag, 
-                                    level, 
-                                    player_name, 
-                                    attacks, 
-                                    defenses, 
-                                    versus_attacks, 
-                                    exp_level, 
-                                    games_champion, 
-                                    well_seasoned
-                                )             
-                   SELECT player_tag,
-                          donations,
-                          received,
-                          user_id,
-                          end_friend_in_need,
-                          end_sharing_is_caring,
-                          trophies,
-                          end_best_trophies,
-                          last_updated,
-                          league_id,
-                          versus_trophies,
-                          clan_tag,
-                          level,
-                          player_name,
-                          attacks,
-                          defenses,
-                          versus_attacks,
-                          exp_level,
-                          games_champion,
-                          well_seasoned
-                   FROM players
-                   WHERE players.season_id = $1
-        """
-        await self.bot.pool.execute(query, await self.bot.seasonconfig.get_season_id())
+        # only players that changed since their last snapshot get a new row; last_updated alone doesn't count.
+        # use players_history_on(day) to get everyone's state on a given day.
+        written = await self.bot.pool.fetchval(
+            "SELECT snapshot_players_history($1)", await self.bot.seasonconfig.get_season_id()
+        )
+        log.info('daily history snapshot wrote %s rows', written)
 
     @tasks.loop()
     async def next_event_starts(self):
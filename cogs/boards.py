@@ -2,6 +2,7 @@ import asyncio
 import typing
 import re
 
+import aiohttp
 import asyncpg as asyncpg
 import coc
 import discord
@@ -15,7 +16,7 @@ from discord.ext import commands
 from cogs.add import BOARD_PLACEHOLDER, titles, default_sort_by
 from cogs.utils.checks import manage_guild
 from cogs.utils.db_objects import DatabaseMessage, BoardConfig
-from syncboards import SyncBoards, default_sort_by
+from syncboards import default_sort_by, BOARD_RPC_HOST, BOARD_RPC_PORT, BOARD_RPC_TIMEOUT
 
 if typing.TYPE_CHECKING:
     from bot import DonationBot
@@ -39,6 +40,7 @@ TROPHY_EMOJI = discord.PartialEmoji.from_str("<:trophygold:632521243278442505>")
 DONATE_EMOJI = discord.PartialEmoji.from_str("<:donated_cc:684682634277683405>")
 
 GLOBAL_BOARDS_CHANNEL_ID = 663683345108172830
+BOARD_UPDATE_FAILED = "Sorry, I couldn't update the board right now. Please try again later."
 
 
 CHANNEL_CONFIRMATION_MESSAGE = \
@@ -118,7 +120,8 @@ class BoardButton(
 
         config = BoardConfig(bot=self.cog.bot, record=fetch)
         await interaction.response.defer()
-        await self.cog.update_board(None, config=config)
+        if not await self.cog.update_board(None, config=config):
+            await interaction.followup.send(BOARD_UPDATE_FAILED, ephemeral=True)
 
     async def interaction_check(self, interaction: discord.Interaction["DonationBot"], /):
         if self.key == "edit" and not interaction.permissions.manage_guild:
@@ -246,7 +249,8 @@ class EditBoardModal(discord.ui.Modal, title="Edit Board"):
         await interaction.response.send_message(f"Configuration successfully updated!", ephemeral=True)
 
         config = BoardConfig(bot=self.bot, record=fetch)
-        await self.cog.update_board(None, config=config)
+        if not await self.cog.update_board(None, config=config):
+            await interaction.followup.send(BOARD_UPDATE_FAILED, ephemeral=True)
 
     async def on_error(self, interaction: discord.Interaction, error: Exception) -> None:
         if await interaction.original_response():
@@ -484,8 +488,7 @@ class BoardSetupMenu(discord.ui.View):
         return {r["type"] for r in fetch}
 
     async def get_all_boards_config(self, channel_id: int):
-        fetch = await self.cog.bot.pool.fetch("SELECT * FROM boards WHERE channel_id=$1", channel_id)
-        return [BoardConfig(bot=self.cog.bot, record=row) for row in fetch]
+        return await self.cog.bot.config_cache.board_configs(self.guild.id, channel_id=channel_id)
 
     async def load_default_channel(self):
         fetch = await self.cog.bot.pool.fetch("SELECT DISTINCT channel_id FROM boards WHERE guild_id=$1", self.guild.id)
@@ -745,20 +748,10 @@ class DonationBoard(commands.Cog):
         self._board_channels = []
         self.season_meta = {}
 
-        self.board_updater: "SyncBoards" = None
-
         bot.add_dynamic_items(BoardButton)
-        bot.loop.create_task(self.on_init())
-
-    async def on_init(self):
-        await self.bot.wait_until_ready()
-        self.board_updater = SyncBoards(
-            self.bot, start_loop=False, session=self.bot.session, fake_clan_guilds=self.bot.fake_clan_guilds
-        )
 
     async def cog_unload(self) -> None:
         self.bot.remove_dynamic_items(BoardButton)
-        await self.board_updater.close()
 
     async def get_board_config(self, message_id: int) -> typing.Optional[BoardConfig]:
         query = "SELECT * FROM boards WHERE message_id = $1"
@@ -837,7 +830,8 @@ class DonationBoard(commands.Cog):
             fetch = await ctx.db.fetchrow("SELECT * FROM boards OFFSET random() LIMIT 1")
 
         config = BoardConfig(bot=self.bot, record=fetch)
-        await self.update_board(None, config, divert_to=ctx.channel.id)
+        if not await self.update_board(None, config, divert_to=ctx.channel.id):
+            await ctx.send(BOARD_UPDATE_FAILED)
 
     @commands.command()
     async def showboard(self, ctx, *, board_type: str = "donation"):
@@ -900,7 +894,9 @@ class DonationBoard(commands.Cog):
 
         async with ctx.typing():
             for config in configs:
-                await self.update_board(None, config, divert_to=ctx.channel.id)
+                if not await self.update_board(None, config, divert_to=ctx.channel.id):
+                    await ctx.send(BOARD_UPDATE_FAILED)
+                    return
 
     @commands.Cog.listener()
     async def on_guild_channel_delete(self, channel):
@@ -994,7 +990,8 @@ class DonationBoard(commands.Cog):
     @commands.command(hidden=True)
     @commands.is_owner()
     async def forceboard(self, ctx, message_id: int = None):
-        await self.update_board(message_id=message_id)
+        if not await self.update_board(message_id=message_id):
+            return await ctx.send(BOARD_UPDATE_FAILED)
         await ctx.confirm()
 
     @commands.Cog.listener()
@@ -1057,14 +1054,29 @@ class DonationBoard(commands.Cog):
         await self.update_board(None, config=config)
 
     async def update_board(self, message_id, config=None, **kwargs):
+        """Have the board render service update a board. Returns whether it was updated."""
         if config is None:
-            config = await self.bot.utils.board_config(message_id)
-
-        if self.board_updater.webhooks is None:
-            await self.board_updater.on_init()
-
-        await self.board_updater.update_board(config, **kwargs)
+            # not from the config cache, which doesn't keep the page and season that are on screen up to date.
+            config = await self.get_board_config(message_id)
 
+        # boards are rendered by the syncboards process, so board traffic never touches the bot's event loop.
+        payload = {
+            "config": {slot: getattr(config, slot) for slot in BoardConfig.__slots__ if slot != "bot"},
+            "divert_to": kwargs.get("divert_to"),
+        }
+        try:
+            async with self.bot.session.post(
+                f"http://{BOARD_RPC_HOST}:{BOARD_RPC_PORT}/boards/update",
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=BOARD_RPC_TIMEOUT),
+            ) as resp:
+                if resp.status != 200:
+                    log.info("board render service failed to update board for %s: %s", config.channel_id, await resp.text())
+                    return False
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            log.exception("couldn't reach the board render service for %s", config.channel_id)
+            return False
+        return True
 
 async def setup(bot):
     await bot.add_cog(DonationBoard(bot))
@@ -18,90 +18,21 @@ class Utils(commands.Cog):
         self._messages = {}
 
     async def log_config(self, channel_id: int, log_type: str) -> Union[LogConfig, None]:
-        query = """SELECT guild_id, 
-                          channel_id, 
-                          "interval", 
-                          toggle,
-                          type,
-                          detailed 
-                   FROM logs 
-                   WHERE channel_id=$1 
-                   AND type=$2
-                """
-        fetch = await self.bot.pool.fetchrow(query, channel_id, log_type)
-        if not fetch:
-            return None
-
-        return LogConfig(bot=self.bot, record=fetch)
+        return await self.bot.config_cache.log_config(channel_id, log_type)
 
     async def board_config(self, message_id: int) -> Union[BoardConfig, None]:
-        query = """SELECT guild_id, 
-                          channel_id,
-                          icon_url,
-                          title,
-                          render,
-                          sort_by,
-                          toggle,
-                          type,
-                          in_event,
-                          message_id,
-                          per_page,
-                          page,
-                          season_id
-                   FROM boards
-                   WHERE message_id = $1
-                """
-        fetch = await self.bot.pool.fetchrow(query, message_id)
-
-        if not fetch:
-            return None
-
-        return BoardConfig(bot=self.bot, record=fetch)
+        return await self.bot.config_cache.board_config(message_id)
 
     async def get_board_channels(self, guild_id: int, board_type: str) -> Union[List[int], None]:
-        query = "SELECT message_id FROM boards WHERE guild_id = $1 AND type = $2 AND toggle = True;"
-        fetch = await self.bot.pool.fetch(query, guild_id, board_type)
-        return [n["message_id"] for n in fetch]
+        configs = await self.bot.config_cache.board_configs(guild_id, board_type)
+        return [config.message_id for config in configs if config.toggle]
 
     async def board_config_from_channel(self, channel_id: int, board_type: str) -> Union[BoardConfig, None]:
-        query = """SELECT guild_id, 
-                          channel_id,
-                          icon_url,
-                          title,
-                          render,
-                          sort_by,
-                          toggle,
-                          type,
-                          in_event,
-                          message_id,
-                          per_page,
-                          page,
-                          season_id
-                   FROM boards
-                   WHERE channel_id = $1
-                   AND type = $2
-                """
-        fetch = await self.bot.pool.fetchrow(query, channel_id, board_type)
-
-        if not fetch:
-            return None
-
-        return BoardConfig(bot=self.bot, record=fetch)
+        return await self.bot.config_cache.board_config_from_channel(channel_id, board_type)
 
     async def get_board_configs(self, guild_id: int, board_type: str) -> List[BoardConfig]:
-        message_ids = await self.get_board_channels(guild_id, board_type)
-
-        if not message_ids:
-            return list()
-
-        message_ids = [int(n) for n in message_ids]
-
-        configs = list()
-
-        for n in message_ids:
-            configs.append(await self.board_config(n))
-
-        return configs
+        configs = await self.bot.config_cache.board_configs(guild_id, board_type)
+        return [config for config in configs if config.toggle]
 
     async def event_config(self, guild_id: int) -> Union[SlimEventConfig, None]:
         query = """SELECT id,
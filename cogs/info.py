@@ -8,6 +8,7 @@ import io
 import math
 import copy
 import csv
+import re
 import statistics
 
 from matplotlib import pyplot as plt
@@ -21,6 +22,7 @@ from cogs.utils.formatters import CLYTable, readable_time, TabularData
 from cogs.utils.emoji_lookup import misc
 from cogs.utils.checks import requires_config
 from cogs.utils.converters import GlobalChannel, ConvertToPlayers
+from cogs.utils.exports import export_csv, export_filename
 from datetime import datetime
 from collections import Counter
 
@@ -180,17 +182,7 @@ class Info(commands.Cog, name='\u200bInfo'):
         guild = channel and channel.guild or ctx.guild
 
         if not channels:
-            query = "SELECT channel_id FROM logs WHERE guild_id = $1"
-            log_channels = await ctx.db.fetch(query, guild.id)
-            channels.update({n["channel_id"] for n in log_channels})
-
-            query = "SELECT channel_id FROM boards WHERE guild_id = $1"
-            board_channels = await ctx.db.fetch(query, guild.id)
-            channels.update({n["channel_id"] for n in board_channels})
-
-            query = "SELECT channel_id FROM clans WHERE guild_id = $1"
-            clan_channels = await ctx.db.fetch(query, guild.id)
-            channels.update({n["channel_id"] for n in clan_channels})
+            channels.update((await self.bot.config_cache.get(guild.id)).channel_ids)
 
         embeds = []
 
@@ -216,18 +208,14 @@ class Info(commands.Cog, name='\u200bInfo'):
                                      f"{misc['online'] + 'Enabled' if trophylog.toggle else misc['offline'] + 'Disabled'}\n" \
                                      f":hourglass: Wait time of {readable_time(trophylog.seconds)}\n\n"
 
-            fetch = await ctx.db.fetch("SELECT * FROM boards WHERE channel_id = $1", channel_id)
-            for row in fetch:
-                board_config = BoardConfig(bot=self.bot, record=row)
-
+            for board_config in await self.bot.config_cache.board_configs(channel.guild.id, channel_id=channel_id):
                 embed.description += f"**{board_config.type.capitalize()}Board**\n" \
                                      f":notepad_spiral: {board_config.channel.mention}\n" \
                                      f":paperclip: [Background URL]({board_config.icon_url})\n" \
                                      f":chart_with_upwards_trend: Sorted by: *{board_config.sort_by}*\n" \
                                      f":notebook_with_decorative_cover: Title: *{board_config.title}*\n\n"
 
-            query = "SELECT clan_tag, fake_clan FROM clans WHERE channel_id = $1"
-            clan_tags = await ctx.db.fetch(query, channel.id)
+            clan_tags = await self.bot.config_cache.clans(channel.guild.id, channel_id=channel.id)
             if clan_tags:
                 embed.description += "**Clans**\n"
             async for clan in self.bot.coc.get_clans((n["clan_tag"] for n in clan_tags if not n["fake_clan"])):
@@ -533,11 +521,14 @@ class Info(commands.Cog, name='\u200bInfo'):
     # @app_commands.checks.cooldown(1, 60 * 60, key=lambda i: i.guild_id)
     # async def dump(self, intr: discord.Interaction):
     @commands.group(invoke_without_command=True)
-    async def dump(self, ctx, *, argument: ConvertToPlayers = None):
+    async def dump(self, ctx, *, argument: str = None):
         """Get a .csv of all player data the bot has stored for a clan/players.
 
         Use `+dump legends` to get a .csv of recent legend data, as seen on the legend boards.
 
+        Add `--season ID` to only get one season, `--since YYYY-MM-DD` to only get seasons since a date,
+        or `--gzip` to get a compressed file (useful for large exports).
+
         **Parameters**
         :key: The argument: Can be a clan tag, name, player tag, name, channel #mention, user @mention or `server` for all clans linked to the server.
 
@@ -559,9 +550,21 @@ class Info(commands.Cog, name='\u200bInfo'):
         :white_check_mark: `+dump @mathsman#1208`
         :white_check_mark: `+dump #donation-log`
         :white_check_mark: `+dump all`
+        :white_check_mark: `+dump Reddit --season 20 --gzip`
         """
-        if not argument:
-            argument = await ConvertToPlayers().convert(ctx, "all")
+        argument = argument or ""
+        compress = "--gzip" in argument
+        season = re.search(r"--season (\d+)", argument)
+        since = re.search(r"--since (\d{4}-\d{2}-\d{2})", argument)
+        argument = re.sub(r"--gzip|--season \d+|--since \S+", "", argument).strip()
+
+        season_id = season and int(season.group(1))
+        try:
+            since = since and datetime.strptime(since.group(1), "%Y-%m-%d")
+        except ValueError:
+            return await ctx.send("Please give the date as `YYYY-MM-DD`, eg. `--since 2021-06-01`.")
+
+        argument = await ConvertToPlayers().convert(ctx, argument or "all")
         if not argument:
             return await ctx.send("Couldn't find any players - try adding a clan?")
 
@@ -588,14 +591,30 @@ class Info(commands.Cog, name='\u200bInfo'):
                           season_id
                     FROM players
                     WHERE clan_tag = ANY($1::TEXT[])
+                    AND ($2::INTEGER IS NULL OR season_id = $2)
+                    AND ($3::TIMESTAMP IS NULL OR season_id IN (SELECT id FROM seasons WHERE finish >= $3))
                     ORDER BY season_id DESC
                     """
-        fetch = await self.bot.pool.fetch(query, list({p['clan_tag'] for p in argument}))
-        if not fetch:
-            return await ctx.send(content="Sorry, I have not collected enough data yet.")
+        async with ctx.acquire() as conn:
+            fp, rows = await export_csv(
+                conn, query, list({p['clan_tag'] for p in argument}), season_id, since, compress=compress
+            )
+
+        with fp:
+            if not rows:
+                return await ctx.send(content="Sorry, I have not collected enough data yet.")
 
-        rows = [{k: v for k, v in row.items()} for row in fetch]
-        await ctx.send(content="Please find a .csv file attached.", file=discord.File(filename="donation-tracker-player-export.csv", fp=self.convert_rows_to_bytes(rows)))
+            size = fp.seek(0, io.SEEK_END)
+            fp.seek(0)
+            if ctx.guild and size > ctx.guild.filesize_limit:
+                return await ctx.send(
+                    "That export is too big to upload. Try adding `--gzip`, or narrowing it down with `--season` or `--since`."
+                )
+
+            await ctx.send(
+                content="Please find a .csv file attached.",
+                file=discord.File(filename=export_filename("donation-tracker-player-export", compress), fp=fp),
+            )
 
     # @dump.command(name="legend", aliases=["legends", "leg"])
     # async def dump_legends(self, ctx, *, argument: ConvertToPlayers = None):
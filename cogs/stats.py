@@ -1,5 +1,4 @@
 import itertools
-import time
 import math
 
 from collections import namedtuple, defaultdict
@@ -9,7 +8,11 @@ import coc
 from discord.ext import commands
 from discord.ext.commands.core import _CaseInsensitiveDict
 
+from cogs.utils.cache import PlayerCache
 from cogs.utils.converters import ConvertToPlayers
+from cogs.utils.formatters import readable_time
+from cogs.utils.profiles import ProfilePlayer, SELECT_PLAYER_PROFILES, UPSERT_PLAYER_PROFILES, profile_record, \
+                                load_achievement_info, save_achievement_info
 from cogs.utils.paginator import StatsAttacksPaginator, StatsDefensesPaginator, StatsTrophiesPaginator, \
                                  StatsDonorsPaginator, StatsLastOnlinePaginator, StatsAchievementPaginator, \
                                  StatsAccountsPaginator
@@ -17,6 +20,9 @@ from cogs.utils.paginator import StatsAttacksPaginator, StatsDefensesPaginator,
 
 FakeClan = namedtuple("FakeClan", "tag")
 
+# only mention how old the stats are once profiles are at least this old (in seconds).
+PROFILE_STALE_AFTER = 15 * 60
+
 
 class CustomPlayer(coc.Player):
     def get_caseinsensitive_achievement(self, name):
@@ -44,44 +50,50 @@ class SuperPlayer:
         return getattr(self, item, None)
 
 
-class ExpiringCache(dict):
-    def __init__(self, seconds):
-        self.ttl = seconds
-        super().__init__()
-
-    def clean_old(self):
-        # Have to do this in two steps...
-        current_time = time.monotonic()
-        to_remove = [k for (k, (v, t)) in self.items() if current_time > (t + self.ttl)]
-        for k in to_remove:
-            del self[k]
-
-    def __getitem__(self, key):
-        self.clean_old()
-        return super().__getitem__(key)[0]
-
-    def __setitem__(self, key, value):
-        super().__setitem__(key, (value, time.monotonic()))
-
-    def __contains__(self, key):
-        self.clean_old()
-        return super().__contains__(key)
-
-
 class Stats(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self._players = ExpiringCache(seconds=3600.0)
+        self._players = PlayerCache(max_size=20000, ttl=3600.0)
+
+    async def _get_players_by_tag(self, player_tags):
+        """Get players from the profile store, which syncer keeps warm. Only players it doesn't have are fetched from the API."""
+        players, missing = self._players.get_many(player_tags)
+        if missing:
+            records = await self.bot.pool.fetch(SELECT_PLAYER_PROFILES, missing)
+            for record in records:
+                player = self._players[record['player_tag']] = ProfilePlayer(record=record)
+                players[player.tag] = player
+            missing = [tag for tag in missing if tag not in players]
+
+            names = {name for record in records for name in record['achievements']}
+            if records and not await load_achievement_info(self.bot.pool, names):
+                # nobody has saved these achievements' descriptions yet, so learn them from one of the players.
+                missing.append(max(records, key=lambda r: len(r['achievements']))['player_tag'])
+
+        if missing:
+            fetched = []
+            async for player in self.bot.coc.get_players(missing, cls=CustomPlayer):
+                self._players[player.tag] = player
+                players[player.tag] = player
+                fetched.append(profile_record(player))
+            if fetched:
+                await self.bot.pool.execute(UPSERT_PLAYER_PROFILES, fetched)
+                await save_achievement_info(self.bot.pool)
+
+        return players
 
     async def _get_players(self, player_tags):
-        need_to_get = [tag for tag in player_tags if tag not in self._players.keys()]
-        if need_to_get:
-            async for player in self.bot.coc.get_players([tag for tag in player_tags if tag not in self._players.keys()], cls=CustomPlayer):
-                self._players[player.tag] = player
+        players = await self._get_players_by_tag(player_tags)
+        return players, list(players.values())
 
-        return [v for (k, (v, _)) in self._players.items() if k in player_tags]
+    @staticmethod
+    def _get_staleness(players):
+        age = max((getattr(p, "age", 0) for p in players.values()), default=0)
+        if age < PROFILE_STALE_AFTER:
+            return ""
+        return f"*Some stats were last updated {readable_time(-age)}.*\n\n"
 
-    async def _group_players_by_user(self, players, guild, fetch_api=False, achievement=None):
+    async def _group_players_by_user(self, players, guild, api_players=None, achievement=None):
         to_return = []
 
         user_ids = {row['user_id'] for row in players if row['user_id']}
@@ -89,20 +101,20 @@ class Stats(commands.Cog):
 
         for user_id, accounts in itertools.groupby(sorted(players, key=lambda r: (r['user_id'] or 0)), key=lambda r: (r['user_id'] or 0)):
             accounts = list(accounts)
-            if fetch_api:
-                api_players = [self._players[row['player_tag']] for row in accounts]
+            if api_players is not None:
+                profiles = [api_players[row['player_tag']] for row in accounts if row['player_tag'] in api_players]
 
                 if user_id == 0:
-                    to_return.extend(api_players)
+                    to_return.extend(profiles)
                 else:
                     super_player = SuperPlayer(
                         tag=user_id,
                         name=str(discord_members.get(user_id, "NotFound")),
-                        attack_wins=sum(p.attack_wins for p in api_players),
-                        defense_wins=sum(p.defense_wins for p in api_players),
-                        donations=sum(p.trophies for p in api_players),
+                        attack_wins=sum(p.attack_wins for p in profiles),
+                        defense_wins=sum(p.defense_wins for p in profiles),
+                        donations=sum(p.trophies for p in profiles),
                         clan=FakeClan(accounts[0]['clan_tag']),
-                        aggr_achievement=sum(p.get_ach_value(achievement) for p in api_players) if achievement else 0,
+                        aggr_achievement=sum(p.get_ach_value(achievement) for p in profiles) if achievement else 0,
                     )
                     to_return.append(super_player)
 
@@ -183,9 +195,9 @@ class Stats(commands.Cog):
         if not argument:
             return await ctx.send("I couldn't find any players. Perhaps try adding a clan?")
 
-        data = await self._get_players([p['player_tag'] for p in argument])
+        api_players, data = await self._get_players([p['player_tag'] for p in argument])
         if "--byuser" in ctx.message.clean_content:
-            data = await self._group_players_by_user(argument, ctx.guild, fetch_api=True)
+            data = await self._group_players_by_user(argument, ctx.guild, api_players=api_players)
 
         att_sum = defaultdict(int)
         for player in data:
@@ -194,6 +206,7 @@ class Stats(commands.Cog):
         title = f"Top Attack Wins"
         emojis = await self._get_emojis(ctx.guild.id)
         description = self._get_description(emojis, argument, lambda tag: f"({att_sum[tag]})", sum(att_sum.values()))
+        description += self._get_staleness(api_players)
 
         p = StatsAttacksPaginator(
             ctx,
@@ -239,9 +252,9 @@ class Stats(commands.Cog):
         if not argument:
             return await ctx.send("I couldn't find any players. Perhaps try adding a clan?")
 
-        data = await self._get_players([p['player_tag'] for p in argument])
+        api_players, data = await self._get_players([p['player_tag'] for p in argument])
         if "--byuser" in ctx.message.clean_content:
-            data = await self._group_players_by_user(argument, ctx.guild, fetch_api=True)
+            data = await self._group_players_by_user(argument, ctx.guild, api_players=api_players)
 
         def_sum = defaultdict(int)
         for player in data:
@@ -250,6 +263,7 @@ class Stats(commands.Cog):
         title = f"Top Defense Wins"
         emojis = await self._get_emojis(ctx.guild.id)
         description = self._get_description(emojis, argument, lambda tag: f"({def_sum[tag]})", sum(def_sum.values()))
+        description += self._get_staleness(api_players)
 
         p = StatsDefensesPaginator(
             ctx,
@@ -528,9 +542,9 @@ class Stats(commands.Cog):
         title = f"Achievement Stats: {achievement}"
 
         players = await ConvertToPlayers().convert(ctx, "all")
-        data = await self._get_players([p['player_tag'] for p in players])
+        api_players, data = await self._get_players([p['player_tag'] for p in players])
         if "--byuser" in ctx.message.clean_content:
-            data = await self._group_players_by_user(players, ctx.guild, fetch_api=True, achievement=achievement)
+            data = await self._group_players_by_user(players, ctx.guild, api_players=api_players, achievement=achievement)
 
         if not data[0].get_caseinsensitive_achievement(achievement):
             return await ctx.send("I couldn't find that achievement, sorry. Please make sure your spelling is correct!")
@@ -544,6 +558,7 @@ class Stats(commands.Cog):
         emojis = await self._get_emojis(ctx.guild.id)
         description = "*" + data[0].get_caseinsensitive_achievement(achievement).info + "*\n\n"
         description += self._get_description(emojis, players, lambda tag: f"({data_sum[tag]})", sum(data_sum.values()))
+        description += self._get_staleness(api_players)
 
         p = StatsAchievementPaginator(
             ctx, data=data, page_count=math.ceil(len(data) / 20), title=title, description=description, achievement=achievement, emojis=emojis
@@ -0,0 +1,505 @@
+import asyncio
+import copy
+import logging
+import os
+import time
+
+from collections import OrderedDict
+from pathlib import Path
+
+from lru import LRU
+
+from cogs.utils.db_objects import BoardConfig, GuildConfig, LogConfig
+
+log = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """An in-memory LRU cache, bounded by number of entries and with a per-entry TTL.
+
+    Concurrent lookups for the same key share a single fetch.
+    """
+    def __init__(self, *, max_size=1000, ttl=86400.0):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # key: (expires, data)
+        self._pending = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self._get_memory(key) is not None
+
+    def _get_memory(self, key):
+        try:
+            expires, data = self._entries[key]
+        except KeyError:
+            return None
+
+        if expires < time.monotonic():
+            self._remove(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return data
+
+    def _full(self):
+        return len(self._entries) > self.max_size
+
+    def _add(self, key, data, expires):
+        self._entries[key] = (expires, data)
+
+    def _remove(self, key):
+        self._entries.pop(key)
+
+    def _put_memory(self, key, data, expires=None):
+        if key in self._entries:
+            self._remove(key)
+
+        self._add(key, data, expires or time.monotonic() + self.ttl)
+        while self._full():
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    async def get(self, key, fetch, *, ttl=None):
+        """Get the value for ``key``, calling ``await fetch()`` on a miss.
+
+        ``fetch`` should return the value, or ``None`` if it couldn't be found.
+        Misses are not cached, so a failed fetch will be retried next time.
+        ``ttl`` overrides the cache's TTL for a fetched value; ``float('inf')`` keeps it until it's evicted.
+        """
+        data = self._get_memory(key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        try:
+            return await asyncio.shield(self._pending[key])
+        except KeyError:
+            pass
+
+        self.misses += 1
+        future = self._pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            data = await self._load(key, fetch, ttl)
+        except Exception as exc:
+            future.set_exception(exc)
+            # make sure it doesn't complain about the exception never being retrieved.
+            future.exception()
+            raise
+        else:
+            future.set_result(data)
+            return data
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    async def _load(self, key, fetch, ttl):
+        data = await fetch()
+        if data:
+            self._put_memory(key, data, expires=ttl and time.monotonic() + ttl)
+        return data or None
+
+    def _prune_memory(self):
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self._entries.items() if expires < now]:
+            self._remove(key)
+
+    async def prune(self):
+        """Remove expired entries."""
+        self._prune_memory()
+
+
+class BytesCache(LRUCache):
+    """An in-memory LRU cache of bytes, bounded by total size and with a per-entry TTL.
+
+    Concurrent lookups for the same key share a single fetch.
+    """
+    def __init__(self, *, max_bytes=32 * 1024 * 1024, ttl=86400.0):
+        super().__init__(max_size=None, ttl=ttl)
+        self.max_bytes = max_bytes
+        self._size = 0
+
+    @staticmethod
+    def _weigh(data):
+        return len(data)
+
+    def _full(self):
+        return self._size > self.max_bytes
+
+    def _add(self, key, data, expires):
+        super()._add(key, data, expires)
+        self._size += self._weigh(data)
+
+    def _remove(self, key):
+        _, data = self._entries.pop(key)
+        self._size -= self._weigh(data)
+
+    def _put_memory(self, key, data, expires=None):
+        if self._weigh(data) > self.max_bytes:
+            if key in self._entries:
+                self._remove(key)
+            return
+
+        super()._put_memory(key, data, expires)
+
+
+class Generations:
+    """Counts the invalidations of each guild, and of every guild at once.
+
+    A load compares the generation from before and after it, so one that was running when its guild was invalidated
+    isn't cached.
+    """
+    def __init__(self):
+        self._generations = {}  # guild id: generation
+        self._epoch = 0
+
+    def __getitem__(self, guild_id):
+        return self._epoch, self._generations.get(guild_id, 0)
+
+    def bump(self, guild_id=None):
+        if guild_id is None:
+            self._epoch += 1
+        else:
+            self._generations[guild_id] = self._generations.get(guild_id, 0) + 1
+
+
+class ClanCache(LRUCache):
+    """The ``coc.Clan`` objects claimed by each guild, keyed by ``(guild_id, in_event)``.
+
+    Bounded by number of guilds. Entries are invalidated when a guild's clans change,
+    and individual clans can be swapped for a fresher copy without refetching the rest of the guild.
+    """
+    def __init__(self, *, max_guilds=5000, ttl=300.0):
+        super().__init__(max_size=max_guilds, ttl=ttl)
+        self._generations = Generations()
+
+    def invalidate(self, guild_id=None):
+        """Drop a guild, or every guild if ``guild_id`` is ``None``."""
+        self._generations.bump(guild_id)
+        if guild_id is None:
+            self._entries.clear()
+            self._pending.clear()
+            return
+
+        for key in [k for k in self._entries if k[0] == guild_id]:
+            self._remove(key)
+        for key in [k for k in self._pending if k[0] == guild_id]:
+            del self._pending[key]
+
+    async def _load(self, key, fetch, ttl):
+        generation = self._generations[key[0]]
+        data = await fetch()
+        if data and self._generations[key[0]] == generation:
+            self._put_memory(key, data, expires=ttl and time.monotonic() + ttl)
+        return data or None
+
+    def update_clan(self, clan):
+        """Replace ``clan`` in every guild that has it cached. Returns the number of guilds updated."""
+        updated = 0
+        for key, (expires, clans) in self._entries.items():
+            if any(c.tag == clan.tag for c in clans):
+                self._entries[key] = (expires, [clan if c.tag == clan.tag else c for c in clans])
+                updated += 1
+        return updated
+
+    def has_clan(self, clan_tag):
+        return any(c.tag == clan_tag for _, clans in self._entries.values() for c in clans)
+
+
+class PlayerCache:
+    """An LRU of API player objects keyed by tag, bounded by number of players and with a per-entry TTL.
+
+    Expired players are dropped when they're looked up, and the whole cache is swept at most once every ``ttl / 4``
+    seconds so players nobody asks for again don't linger until they're evicted.
+    """
+    def __init__(self, *, max_size=20000, ttl=3600.0):
+        self.ttl = ttl
+        self._entries = LRU(max_size)  # tag: (expires, player)
+        self._next_sweep = time.monotonic() + ttl / 4
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, tag):
+        return self.get(tag) is not None
+
+    def __setitem__(self, tag, player):
+        self._entries[tag] = (time.monotonic() + self.ttl, player)
+        self._maybe_sweep()
+
+    def get(self, tag):
+        try:
+            expires, player = self._entries[tag]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        if expires < time.monotonic():
+            del self._entries[tag]
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return player
+
+    def get_many(self, tags):
+        """Look up ``tags`` in one go. Returns a dict of the cached players, and a list of tags that weren't cached."""
+        found, missing = {}, []
+        for tag in dict.fromkeys(tags):
+            player = self.get(tag)
+            if player is None:
+                missing.append(tag)
+            else:
+                found[tag] = player
+        return found, missing
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+
+        self._next_sweep = now + self.ttl / 4
+        for tag in [k for k, (expires, _) in self._entries.items() if expires < now]:
+            del self._entries[tag]
+
+
+class IconCache(BytesCache):
+    """A process-wide LRU cache for board icons (clan badges and custom emojis).
+
+    Entries are bounded by total size in bytes and each entry expires after ``ttl`` seconds.
+    Icons are persisted to ``directory`` so a restart doesn't have to re-download everything,
+    but all disk access happens in the default executor so it never blocks the event loop.
+    """
+    def __init__(self, *, directory="assets/board_icons", max_bytes=32 * 1024 * 1024, ttl=86400.0):
+        super().__init__(max_bytes=max_bytes, ttl=ttl)
+        self.directory = Path(directory)
+
+    def _path(self, key):
+        return self.directory / f"{key}.png"
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            age = time.time() - path.stat().st_mtime
+            if age > self.ttl:
+                return None, 0
+            with open(path, "rb") as fp:
+                return fp.read(), age
+        except FileNotFoundError:
+            return None, 0
+
+    def _write_disk(self, key, data):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._path(key).with_suffix(".tmp")
+        with open(tmp, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp, self._path(key))
+
+    def _prune_disk(self):
+        removed = 0
+        now = time.time()
+        try:
+            paths = list(self.directory.iterdir())
+        except FileNotFoundError:
+            return 0
+
+        for path in paths:
+            try:
+                if now - path.stat().st_mtime > self.ttl:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    async def _load(self, key, fetch, ttl):
+        loop = asyncio.get_running_loop()
+
+        data, age = await loop.run_in_executor(None, self._read_disk, key)
+        if data is not None:
+            self._put_memory(key, data, expires=time.monotonic() + self.ttl - age)
+            return data
+
+        data = await fetch()
+        if not data:
+            return None
+
+        self._put_memory(key, data, expires=ttl and time.monotonic() + ttl)
+        try:
+            await loop.run_in_executor(None, self._write_disk, key, data)
+        except OSError:
+            log.exception("failed to save board icon %s to disk", key)
+
+        return data
+
+    async def prune(self):
+        """Remove expired entries from memory and disk."""
+        self._prune_memory()
+        return await asyncio.get_running_loop().run_in_executor(None, self._prune_disk)
+
+
+class GuildConfigs:
+    """Everything configured for one guild: its guild row, logs, boards and clans."""
+    __slots__ = ('guild', 'logs', 'boards', 'clans')
+
+    def __init__(self, guild, logs, boards, clans):
+        self.guild: GuildConfig = guild
+        self.logs: list = logs
+        self.boards: list = boards
+        self.clans: list = clans  # clans table records
+
+    @property
+    def channel_ids(self):
+        return {c.channel_id for c in self.logs} | {c.channel_id for c in self.boards} | {r['channel_id'] for r in self.clans}
+
+
+class GuildConfigCache:
+    """Per-guild configuration, loaded the first time a guild is looked at.
+
+    There's no TTL: Postgres notifies us whenever a guild's configuration changes and the guild is dropped,
+    to be loaded again next time it's needed. Configs handed out are copies, so callers are free to change them.
+
+    A board's ``page`` and ``season_id`` change with every button press, so they aren't notified for and may be stale.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+
+        self._entries = {}  # guild id: GuildConfigs
+        self._pending = {}
+        self._message_guilds = {}  # board message id: guild id
+        self._generations = Generations()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self, guild_id=None):
+        """Drop a guild, or every guild if ``guild_id`` is ``None``."""
+        self._generations.bump(guild_id)
+        if guild_id is None:
+            self._entries.clear()
+            self._pending.clear()
+            self._message_guilds.clear()
+            return
+
+        self._entries.pop(guild_id, None)
+        self._pending.pop(guild_id, None)
+        for message_id in [m for m, g in self._message_guilds.items() if g == guild_id]:
+            del self._message_guilds[message_id]
+
+    async def get(self, guild_id):
+        try:
+            entry = self._entries[guild_id]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            return entry
+
+        try:
+            return await asyncio.shield(self._pending[guild_id])
+        except KeyError:
+            pass
+
+        self.misses += 1
+        generation = self._generations[guild_id]
+        future = self._pending[guild_id] = asyncio.get_running_loop().create_future()
+        try:
+            entry = await self._load(guild_id)
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()
+            raise
+        else:
+            future.set_result(entry)
+            if self._generations[guild_id] == generation:
+                self._store(guild_id, entry)
+            return entry
+        finally:
+            if self._pending.get(guild_id) is future:
+                del self._pending[guild_id]
+
+    async def _load(self, guild_id):
+        async with self.bot.pool.acquire() as conn:
+            guild = await conn.fetchrow("SELECT * FROM guilds WHERE guild_id = $1", guild_id)
+            logs = await conn.fetch("SELECT * FROM logs WHERE guild_id = $1", guild_id)
+            boards = await conn.fetch("SELECT * FROM boards WHERE guild_id = $1", guild_id)
+            clans = await conn.fetch("SELECT * FROM clans WHERE guild_id = $1", guild_id)
+
+        return GuildConfigs(
+            guild=GuildConfig(bot=self.bot, record=guild or {'guild_id': guild_id}),
+            logs=[LogConfig(bot=self.bot, record=row) for row in logs],
+            boards=[BoardConfig(bot=self.bot, record=row) for row in boards],
+            clans=list(clans),
+        )
+
+    def _store(self, guild_id, entry):
+        for board in entry.boards:
+            if board.message_id:
+                self._message_guilds[board.message_id] = guild_id
+        self._entries[guild_id] = entry
+
+    async def _guild_id_for_channel(self, channel_id):
+        channel = self.bot.get_channel(channel_id)
+        if channel and getattr(channel, "guild", None):
+            return channel.guild.id
+
+        query = """SELECT guild_id FROM logs WHERE channel_id = $1
+                   UNION SELECT guild_id FROM boards WHERE channel_id = $1
+                   UNION SELECT guild_id FROM clans WHERE channel_id = $1
+                   LIMIT 1
+                """
+        return await self.bot.pool.fetchval(query, channel_id)
+
+    async def guild_config(self, guild_id):
+        return copy.copy((await self.get(guild_id)).guild)
+
+    async def log_config(self, channel_id, log_type):
+        guild_id = await self._guild_id_for_channel(channel_id)
+        if guild_id is None:
+            return None
+
+        for config in (await self.get(guild_id)).logs:
+            if config.channel_id == channel_id and config.type == log_type:
+                return copy.copy(config)
+        return None
+
+    async def board_config(self, message_id):
+        guild_id = self._message_guilds.get(message_id)
+        if guild_id is None:
+            guild_id = await self.bot.pool.fetchval("SELECT guild_id FROM boards WHERE message_id = $1", message_id)
+            if guild_id is None:
+                return None
+
+        for config in (await self.get(guild_id)).boards:
+            if config.message_id == message_id:
+                return copy.copy(config)
+        return None
+
+    async def board_configs(self, guild_id, board_type=None, channel_id=None):
+        return [
+            copy.copy(config) for config in (await self.get(guild_id)).boards
+            if (board_type is None or config.type == board_type) and (channel_id is None or config.channel_id == channel_id)
+        ]
+
+    async def board_config_from_channel(self, channel_id, board_type):
+        guild_id = await self._guild_id_for_channel(channel_id)
+        if guild_id is None:
+            return None
+
+        configs = await self.board_configs(guild_id, board_type, channel_id)
+        return configs and configs[0] or None
+
+    async def clans(self, guild_id, channel_id=None):
+        return [row for row in (await self.get(guild_id)).clans if channel_id is None or row['channel_id'] == channel_id]
@@ -1,8 +1,14 @@
 # https://github.com/Rapptz/RoboDanny/blob/rewrite/cogs/utils/context.py
 
 from discord.ext import commands
+from prometheus_client import Histogram
 import asyncio
 import discord
+import time
+
+db_buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+pool_wait_histo = Histogram("donbot_db_pool_wait_seconds", "Time commands spend waiting for a pool connection.", ["command"], buckets=db_buckets)
+pool_hold_histo = Histogram("donbot_db_connection_hold_seconds", "Time commands hold a pool connection for.", ["command"], buckets=db_buckets)
 
 class _ContextDBAcquire:
     __slots__ = ('ctx', 'timeout')
@@ -22,12 +28,81 @@ class _ContextDBAcquire:
         await self.ctx.release()
 
 
+class _ContextTransaction:
+    __slots__ = ('ctx', 'kwargs', 'acquired', 'transaction')
+
+    def __init__(self, ctx, kwargs):
+        self.ctx = ctx
+        self.kwargs = kwargs
+        self.acquired = False
+        self.transaction = None
+
+    async def __aenter__(self):
+        # the connection is bound to the context until the transaction finishes, so ctx.db uses it in the meantime.
+        self.acquired = self.ctx._db is None
+        conn = await self.ctx._acquire(None)
+        self.transaction = conn.transaction(**self.kwargs)
+        try:
+            await self.transaction.__aenter__()
+        except BaseException:
+            if self.acquired:
+                await self.ctx.release()
+            raise
+        return conn
+
+    async def __aexit__(self, *args):
+        try:
+            return await self.transaction.__aexit__(*args)
+        finally:
+            if self.acquired:
+                await self.ctx.release()
+
+
+class _LazyContextDB:
+    """Borrows a pool connection for each query, rather than holding one for a whole command."""
+    __slots__ = ('ctx',)
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    async def _run(self, method, *args, **kwargs):
+        # this isn't bound to the context, so queries run concurrently (eg. with asyncio.gather) get their own connections.
+        label = self.ctx._metric_label
+        start = time.perf_counter()
+        async with self.ctx.pool.acquire() as conn:
+            acquired = time.perf_counter()
+            pool_wait_histo.labels(label).observe(acquired - start)
+            try:
+                return await getattr(conn, method)(*args, **kwargs)
+            finally:
+                pool_hold_histo.labels(label).observe(time.perf_counter() - acquired)
+
+    async def execute(self, *args, **kwargs):
+        return await self._run('execute', *args, **kwargs)
+
+    async def executemany(self, *args, **kwargs):
+        return await self._run('executemany', *args, **kwargs)
+
+    async def fetch(self, *args, **kwargs):
+        return await self._run('fetch', *args, **kwargs)
+
+    async def fetchrow(self, *args, **kwargs):
+        return await self._run('fetchrow', *args, **kwargs)
+
+    async def fetchval(self, *args, **kwargs):
+        return await self._run('fetchval', *args, **kwargs)
+
+    def transaction(self, **kwargs):
+        return _ContextTransaction(self.ctx, kwargs)
+
+
 class Context(commands.Context):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.pool = self.bot.pool
         self.coc = self.bot.coc
         self._db = None
+        self._db_acquired_at = None
 
     async def entry_to_code(self, entries):
         width = max(len(a) for a, b in entries)
@@ -62,6 +137,7 @@ class Context(commands.Context):
         def check(m):
             return m.content.isdigit() and m.author.id == self.author.id and m.channel.id == self.channel.id
 
+        reacquire = self._db is not None
         await self.release()
 
         # only give them 3 tries.
@@ -80,7 +156,8 @@ class Context(commands.Context):
 
             raise ValueError('Too many tries. Goodbye.')
         finally:
-            await self.acquire()
+            if reacquire:
+                await self.acquire()
 
     async def prompt(self, message, *, timeout=60.0, delete_after=True, reacquire=True, author_id=None,
                      additional_options=0):
@@ -147,6 +224,8 @@ class Context(commands.Context):
         for i in range(additional_options):
             await msg.add_reaction(f'{i+1}\N{combining enclosing keycap}')
 
+        # only take a connection back if we were holding one.
+        reacquire = reacquire and self._db is not None
         if reacquire:
             await self.release()
 
@@ -182,11 +261,22 @@ class Context(commands.Context):
 
     @property
     def db(self):
-        return self._db if self._db else self.pool
+        """The connection acquired with :meth:`acquire` or a transaction, if there is one.
+
+        Otherwise, each query borrows a connection from the pool for just as long as it runs.
+        """
+        return self._db if self._db else _LazyContextDB(self)
+
+    @property
+    def _metric_label(self):
+        return self.command and self.command.qualified_name or "none"
 
     async def _acquire(self, timeout):
         if self._db is None:
+            start = time.perf_counter()
             self._db = await self.pool.acquire(timeout=timeout)
+            self._db_acquired_at = time.perf_counter()
+            pool_wait_histo.labels(self._metric_label).observe(self._db_acquired_at - start)
         return self._db
 
     def acquire(self, *, timeout=None):
@@ -214,6 +304,7 @@ class Context(commands.Context):
         if self._db is not None:
             await self.bot.pool.release(self._db)
             self._db = None
+            pool_hold_histo.labels(self._metric_label).observe(time.perf_counter() - self._db_acquired_at)
 
     async def show_help(self, command=None):
         """Shows the help command for the specified command if given.
@@ -66,6 +66,11 @@ class ClanConverter(commands.Converter):
         tag = coc.utils.correct_tag(argument)
         name = argument.strip().lower()
 
+        guild_clans = await ctx.get_clans()
+        matches = [n for n in guild_clans if n.name.lower() == name or n.tag == tag]
+        if matches:
+            return matches
+
         if tag_validator.match(tag):
             try:
                 clan = await ctx.coc.get_clan(tag)
@@ -77,13 +82,7 @@ class ClanConverter(commands.Converter):
 
             raise commands.BadArgument(f'{tag} is not a valid clan tag.')
 
-        guild_clans = await ctx.get_clans()
-        matches = [n for n in guild_clans if n.name.lower() == name or n.tag == tag]
-
-        if not matches:
-            raise commands.BadArgument(f'Clan name or tag `{argument}` not found')
-
-        return matches
+        raise commands.BadArgument(f'Clan name or tag `{argument}` not found')
 
 
 class AddClanConverter(commands.Converter):
@@ -384,32 +383,18 @@ class ActivityBarConverter(commands.Converter):
                         SELECT DISTINCT clan_tag, clan_name 
                         FROM clans 
                         WHERE channel_id = $1 OR guild_id = $1
-                    ),
-
-                    cte1 AS (
-                        SELECT COUNT(DISTINCT player_tag) as "num_players", 
-                               DATE(activity_query.hour_time) as "date",
-                               clan_tags.clan_name
-                        FROM activity_query 
-                        INNER JOIN clan_tags ON activity_query.clan_tag = clan_tags.clan_tag
-                        WHERE activity_query.hour_time > now() - ($2 ||' days')::interval
-                        GROUP by clan_tags.clan_name, date
-                    ),
-                    cte2 AS (
-                        SELECT cast(SUM(counter) as decimal) / MIN(num_players) AS num_events, 
-                               hour_time,
-                               clan_tags.clan_name
-                        FROM activity_query 
-                        JOIN cte1 
-                        ON cte1.date = date(hour_time) 
-                        INNER JOIN clan_tags ON clan_tags.clan_tag = activity_query.clan_tag
-                        AND activity_query.hour_time > now() - ($2 ||' days')::interval
-                        GROUP by clan_tags.clan_name, hour_time
                     )
-                    SELECT date_part('HOUR', hour_time) as "hour_digit", AVG(num_events), MIN(hour_time), clan_name
-                    FROM cte2 
-                    GROUP BY clan_name, hour_digit
-                    ORDER BY clan_name, hour_digit
+                    SELECT g.h - 1 AS "hour_digit",
+                           COALESCE(AVG(days.counters[g.h]::decimal / days.num_players) FILTER (WHERE days.counters[g.h] > 0), 0) AS "avg",
+                           MIN(days.day)::timestamp AS "min",
+                           clan_tags.clan_name
+                    FROM activity_clan_daily AS days
+                    INNER JOIN clan_tags ON clan_tags.clan_tag = days.clan_tag
+                    CROSS JOIN generate_series(1, 24) AS g(h)
+                    WHERE days.num_players > 0
+                    AND days.day > (now() - ($2 ||' days')::interval)::date
+                    GROUP BY clan_tags.clan_name, g.h
+                    ORDER BY clan_tags.clan_name, g.h
                     """
 
             fetch = await ctx.db.fetch(query, channel and channel.id or guild.id, str(time_ or 365))
@@ -426,28 +411,17 @@ class ActivityBarConverter(commands.Converter):
             query = """
                     WITH player_tags AS (
                         SELECT DISTINCT player_tag, player_name FROM players WHERE user_id = $1 AND player_name IS NOT null AND season_id = $3
-                    ),
-                    valid_times AS (
-                        SELECT generate_series(min(hour_time), max(hour_time), '1 hour'::interval) as "time", player_tags.player_name
-                        FROM activity_query 
-                        INNER JOIN player_tags 
-                        ON activity_query.player_tag = player_tags.player_tag
-                        WHERE activity_query.hour_time > now() - ($2 ||' days')::interval
-                        GROUP BY player_tags.player_name
-                    ),
-                    actual_times AS (
-                        SELECT hour_time as "time", counter, player_tags.player_name
-                        FROM activity_query 
-                        INNER JOIN player_tags 
-                        ON activity_query.player_tag = player_tags.player_tag
-                        AND activity_query.hour_time > now() - ($2 ||' days')::interval
-                        GROUP BY player_tags.player_name, time, counter
                     )
-                    SELECT date_part('HOUR', valid_times."time") AS "hour", AVG(COALESCE(actual_times.counter, 0)), min(valid_times."time"), valid_times.player_name
-                    FROM valid_times
-                    LEFT JOIN actual_times ON actual_times.time = valid_times.time AND actual_times.player_name = valid_times.player_name
-                    GROUP BY valid_times.player_name, "hour"
-                    ORDER BY valid_times.player_name, "hour"
+                    SELECT g.h - 1 AS "hour",
+                           SUM(days.counters[g.h])::decimal / (MAX(days.day) - MIN(days.day) + 1) AS "avg",
+                           MIN(days.day)::timestamp AS "min",
+                           player_tags.player_name
+                    FROM activity_player_daily AS days
+                    INNER JOIN player_tags ON player_tags.player_tag = days.player_tag
+                    CROSS JOIN generate_series(1, 24) AS g(h)
+                    WHERE days.day > (now() - ($2 ||' days')::interval)::date
+                    GROUP BY player_tags.player_name, g.h
+                    ORDER BY player_tags.player_name, g.h
                     """
             fetch = await ctx.db.fetch(query, user.id, str(time_ or 365), await ctx.bot.seasonconfig.get_season_id())
             if not fetch:
@@ -461,23 +435,15 @@ class ActivityBarConverter(commands.Converter):
 
         if player:
             query = """
-                    WITH valid_times AS (
-                        SELECT generate_series(min(hour_time), max(hour_time), '1 hour'::interval) as "time"
-                        FROM activity_query 
-                        WHERE player_tag = $1
-                        AND activity_query.hour_time > now() - ($2 ||' days')::interval
-                    ),
-                    actual_times AS (
-                        SELECT hour_time as "time", counter
-                        FROM activity_query
-                        WHERE player_tag = $1
-                        AND activity_query.hour_time > now() - ($2 ||' days')::interval
-                    )
-                    SELECT date_part('HOUR', valid_times."time") AS "hour", AVG(COALESCE(actual_times.counter, 0)), min(valid_times."time")
-                    FROM valid_times
-                    LEFT JOIN actual_times ON actual_times.time = valid_times.time
-                    GROUP BY "hour"
-                    ORDER BY "hour"
+                    SELECT g.h - 1 AS "hour",
+                           SUM(days.counters[g.h])::decimal / (MAX(days.day) - MIN(days.day) + 1) AS "avg",
+                           MIN(days.day)::timestamp AS "min"
+                    FROM activity_player_daily AS days
+                    CROSS JOIN generate_series(1, 24) AS g(h)
+                    WHERE days.player_tag = $1
+                    AND days.day > (now() - ($2 ||' days')::interval)::date
+                    GROUP BY g.h
+                    ORDER BY g.h
                     """
             fetch = await ctx.db.fetch(query, player['player_tag'], str(time_ or 365))
             if not fetch:
@@ -487,27 +453,16 @@ class ActivityBarConverter(commands.Converter):
 
         if clan:
             query = """
-                    WITH cte1 AS (
-                        SELECT COUNT(DISTINCT player_tag) as "num_players", 
-                               DATE(activity_query.hour_time) as "date" 
-                        FROM activity_query 
-                        WHERE clan_tag = $1 
-                        AND activity_query.hour_time > now() - ($2 ||' days')::interval
-                        GROUP by date
-                    ),
-                    cte2 AS (
-                        SELECT cast(SUM(counter) as decimal) / MIN(num_players) AS num_events, 
-                               hour_time 
-                        FROM activity_query 
-                        JOIN cte1 
-                        ON cte1.date = date(hour_time) 
-                        WHERE clan_tag = $1 
-                        AND activity_query.hour_time > now() - ($2 ||' days')::interval
-                        GROUP BY hour_time
-                    )
-                    SELECT date_part('HOUR', hour_time) as "hour_digit", AVG(num_events), MIN(hour_time) 
-                    FROM cte2 
-                    GROUP BY hour_digit
+                    SELECT g.h - 1 AS "hour_digit",
+                           COALESCE(AVG(days.counters[g.h]::decimal / days.num_players) FILTER (WHERE days.counters[g.h] > 0), 0) AS "avg",
+                           MIN(days.day)::timestamp AS "min"
+                    FROM activity_clan_daily AS days
+                    CROSS JOIN generate_series(1, 24) AS g(h)
+                    WHERE days.clan_tag = $1
+                    AND days.num_players > 0
+                    AND days.day > (now() - ($2 ||' days')::interval)::date
+                    GROUP BY g.h
+                    ORDER BY g.h
                     """
             fetch = await ctx.db.fetch(query, clan['clan_tag'], str(time_ or 365))
             if not fetch:
@@ -532,15 +487,15 @@ class ActivityLineConverter(commands.Converter):
                         WHERE channel_id = $1 OR guild_id = $1
                     ),
                     cte AS (
-                        SELECT cast(SUM(counter) as decimal) / COUNT(DISTINCT player_tag) AS counter, 
-                               date_trunc('day', hour_time) AS date,
+                        SELECT cast(SUM(total) as decimal) / SUM(num_players) AS counter, 
+                               days.day::timestamp AS date,
                                clan_tags.clan_name
-                        FROM activity_query 
+                        FROM activity_clan_daily AS days
                         INNER JOIN clan_tags
-                        ON clan_tags.clan_tag = activity_query.clan_tag
-                        AND hour_time < TIMESTAMP 'today'
+                        ON clan_tags.clan_tag = days.clan_tag
+                        AND days.day < CURRENT_DATE
+                        AND days.num_players > 0
                         GROUP BY date, clan_tags.clan_name 
-                        ORDER BY date
                     ),
                     cte2 AS (
                         SELECT stddev(counter) AS stdev, 
@@ -575,15 +530,14 @@ class ActivityLineConverter(commands.Converter):
                         SELECT DISTINCT player_tag, player_name FROM players WHERE user_id = $1 AND player_name IS NOT null
                     ),
                     cte AS (
-                        SELECT SUM(counter) AS counter, 
-                               date_trunc('day', hour_time) AS date,
+                        SELECT SUM(total) AS counter, 
+                               days.day::timestamp AS date,
                                player_tags.player_name
-                        FROM activity_query 
+                        FROM activity_player_daily AS days
                         INNER JOIN player_tags
-                        ON player_tags.player_tag = activity_query.player_tag
-                        AND hour_time < TIMESTAMP 'today'
+                        ON player_tags.player_tag = days.player_tag
+                        AND days.day < CURRENT_DATE
                         GROUP BY date, player_tags.player_name 
-                        ORDER BY date
                     ),
                     cte2 AS (
                         SELECT stddev(counter) AS stdev, 
@@ -613,13 +567,11 @@ class ActivityLineConverter(commands.Converter):
 
         if player:
             query = """WITH cte AS (
-                            SELECT SUM(counter) AS counter, 
-                                   date_trunc('day', hour_time) AS date 
-                            FROM activity_query 
+                            SELECT total AS counter, 
+                                   day::timestamp AS date 
+                            FROM activity_player_daily 
                             WHERE player_tag = $1 
-                            AND hour_time < TIMESTAMP 'today'
-                            GROUP BY date 
-                            ORDER BY date
+                            AND day < CURRENT_DATE
                         ),
                         cte2 AS (
                             SELECT stddev(counter) AS stdev, 
@@ -642,13 +594,12 @@ class ActivityLineConverter(commands.Converter):
 
         if clan:
             query = """WITH cte AS (
-                            SELECT cast(SUM(counter) as decimal) / COUNT(distinct player_tag) AS counter, 
-                                   date_trunc('day', hour_time) AS "date" 
-                            FROM activity_query 
+                            SELECT cast(total as decimal) / num_players AS counter, 
+                                   day::timestamp AS "date" 
+                            FROM activity_clan_daily 
                             WHERE clan_tag = $1 
-                            AND hour_time < TIMESTAMP 'today'
-                            GROUP BY date 
-                            ORDER BY date
+                            AND day < CURRENT_DATE
+                            AND num_players > 0
                         ),
                         cte2 AS (
                             SELECT stddev(counter) AS stdev, 
@@ -29,6 +29,22 @@ class DatabasePlayer:
         return await self.bot.coc.get_player(self.player_tag)
 
 
+class GuildConfig:
+    __slots__ = ('bot', 'guild_id', 'prefix', 'auto_claim', 'activity_sync')
+
+    def __init__(self, *, bot, record):
+        self.bot = bot
+
+        self.guild_id: int = record['guild_id']
+        self.prefix: str = record.get('prefix') or '+'
+        self.auto_claim: bool = record.get('auto_claim') or False
+        self.activity_sync: bool = record.get('activity_sync') or False
+
+    @property
+    def guild(self) -> discord.Guild:
+        return self.bot.get_guild(self.guild_id)
+
+
 class LogConfig:
     __slots__ = ('bot', 'guild_id', 'channel_id', 'interval', 'toggle', 'type', 'detailed')
 
@@ -59,12 +75,13 @@ class LogConfig:
 
 
 class BoardConfig:
-    __slots__ = ('bot', 'guild_id', 'channel_id', 'icon_url', 'title',
+    __slots__ = ('bot', 'id', 'guild_id', 'channel_id', 'icon_url', 'title',
                  'sort_by', 'toggle', 'type', 'in_event', 'message_id', 'per_page', 'page', 'season_id')
 
     def __init__(self, *, bot, record):
         self.bot = bot
 
+        self.id: int = record.get('id')
         self.guild_id: int = record['guild_id']
         self.channel_id: int = record['channel_id']
         self.icon_url: str = record['icon_url']
@@ -0,0 +1,60 @@
+import asyncio
+import csv
+import gzip
+import io
+import tempfile
+
+# rows fetched from the server-side cursor at a time
+EXPORT_CHUNK_SIZE = 1000
+
+
+async def export_csv(conn, query, *args, compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream the results of ``query`` into a CSV file, optionally gzipped.
+
+    Rows are read from a server-side cursor ``chunk_size`` at a time and each chunk is written to a
+    temporary file in an executor, so memory use doesn't depend on the size of the export and the
+    event loop isn't blocked by the csv encoding, compression or disk writes.
+
+    Returns ``(fp, rows)``. ``fp`` is a file object positioned at the start, which the caller should close.
+    """
+    loop = asyncio.get_running_loop()
+    fp = tempfile.TemporaryFile()
+    raw = gzip.GzipFile(fileobj=fp, mode="wb") if compress else fp
+    # utf-8-sig so excel picks up the encoding.
+    text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+
+    def write(records, header):
+        if header:
+            writer.writerow(records[0].keys())
+        writer.writerows(record.values() for record in records)
+
+    def finish():
+        text.flush()
+        text.detach()
+        if compress:
+            # this only finishes the gzip stream, it doesn't close fp.
+            raw.close()
+        fp.seek(0)
+
+    rows = 0
+    try:
+        async with conn.transaction():
+            cursor = await conn.cursor(query, *args)
+            while True:
+                records = await cursor.fetch(chunk_size)
+                if not records:
+                    break
+                await loop.run_in_executor(None, write, records, rows == 0)
+                rows += len(records)
+
+        await loop.run_in_executor(None, finish)
+    except BaseException:
+        fp.close()
+        raise
+
+    return fp, rows
+
+
+def export_filename(name, compress):
+    return f"{name}.csv.gz" if compress else f"{name}.csv"
@@ -0,0 +1,86 @@
+# activity graphs are rendered in a process pool, so these only take plain (picklable) data and return png bytes.
+# styles are applied per render with plt.style.context, and every figure is closed when it's done.
+import io
+
+import matplotlib
+matplotlib.use("Agg")
+
+import numpy as np
+import seaborn as sns
+
+from matplotlib import pyplot as plt
+from matplotlib import dates as mdates
+
+
+def _style(dark_mode):
+    return 'dark_background' if dark_mode else 'default'
+
+
+def _to_png(fig):
+    b = io.BytesIO()
+    fig.savefig(b, format='png')
+    plt.close(fig)
+    return b.getvalue()
+
+
+def render_bar_graph(data, days, timezone_offset, dark_mode):
+    """``data`` is ``{name: {hour: events}}``."""
+    with plt.style.context(_style(dark_mode)):
+        fig, ax = plt.subplots()
+
+        y_pos = np.arange(24)
+        width = 0.8 / len(data)
+        graphs = []
+
+        for i, (name, data_iter) in enumerate(data.items()):
+            data_iter = dict(sorted(data_iter.items()))
+            graphs.append((
+                ax.bar([n + width * i for n in y_pos], list(data_iter.values()), width, align='center'), name
+            ))
+
+        ax.set_xticks(y_pos)
+        ax.set_xticklabels(list(range(24)))
+        ax.set_xlabel(f"Time (hr) - UTC{'+' + str(timezone_offset) if timezone_offset > 0 else timezone_offset}")
+        ax.set_ylabel("Activity (average events)")
+        ax.set_title(f"Activity Graph - Time Period: {days + 1}d")
+        ax.legend(tuple(n[0] for n in graphs), tuple(n[1] for n in graphs))
+
+        return _to_png(fig)
+
+
+def render_line_graph(data, dark_mode):
+    """``data`` is a list of ``(name, [(date, counter, stdev), ...])``."""
+    with plt.style.context(_style(dark_mode)):
+        colours = sns.color_palette("hls", len(data))
+
+        fig, ax = plt.subplots()
+        min_date = None
+        max_date = None
+
+        for i, (name, record) in enumerate(data):
+            dates = [n[0] for n in record]
+            means = [n[1] for n in record]
+
+            meanst = np.array(means, dtype=np.float64)
+            sdt = np.array([n[2] for n in record], dtype=np.float64)
+            ax.plot(dates, means, label=name, color=colours[i])
+
+            if name != "Bot Average":
+                ax.fill_between(dates, [max(0, n) for n in meanst - sdt], meanst + sdt, alpha=0.3, facecolor=colours[i])
+                if not min_date or dates[0] < min_date:
+                    min_date = dates[0]
+                if not max_date or dates[-1] > max_date:
+                    max_date = dates[-1]
+
+        locator = mdates.AutoDateLocator(minticks=3, maxticks=10)
+        formatter = mdates.ConciseDateFormatter(locator)
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(formatter)
+        ax.legend()
+
+        ax.grid(True)
+        ax.set_ylabel("Activity")
+        ax.set_title("Activity Change Over Time")
+        ax.set_xlim(min_date, max_date)
+
+        return _to_png(fig)
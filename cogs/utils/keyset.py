@@ -0,0 +1,34 @@
+# keyset pagination for boards. A board ordering is a tuple of (column, direction, type) keys, and the last key
+# must be unique so every row has a distinct position. Then a page can seek past the last row of the page before
+# it, rather than using OFFSET.
+
+
+def get_order_by(keys):
+    return ", ".join(f"{column} {direction}" for column, direction, _ in keys)
+
+
+def get_keyset_condition(keys, start):
+    """Get a WHERE condition for rows that come after a page boundary when ordered by ``keys``.
+
+    The boundary values are parameters ``$start``, ``$start + 1``... passed as text, one per key.
+    """
+    keys = [(column, direction, type_ if type_ == "text" else f"text::{type_}") for column, direction, type_ in keys]
+    clauses = []
+    for i, (column, direction, type_) in enumerate(keys):
+        parts = [f"{c} = ${start + j}::{t}" for j, (c, _, t) in enumerate(keys[:i])]
+        after = f"{column} {'<' if direction.startswith('DESC') else '>'} ${start + i}::{type_}"
+        if direction.endswith("NULLS LAST"):
+            # the boundary is never NULL, so every NULL comes after it.
+            after = f"({after} OR {column} IS NULL)"
+        parts.append(after)
+        clauses.append("(" + " AND ".join(parts) + ")")
+    return "(" + " OR ".join(clauses) + ")"
+
+
+def get_keyset_values(keys, row):
+    """Get the boundary values of ``row`` to pass to :func:`get_keyset_condition`, or ``None`` if it has any NULLs."""
+    values = [row[column.split(".")[-1]] for column, _, _ in keys]
+    if None in values:
+        # NULLs don't compare, so this page will have to be found with OFFSET.
+        return None
+    return [str(value) for value in values]
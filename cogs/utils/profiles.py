@@ -0,0 +1,132 @@
+import time
+
+from collections import namedtuple
+
+
+ProfileClan = namedtuple("ProfileClan", "tag")
+ProfileAchievement = namedtuple("ProfileAchievement", "name value info")
+
+# achievement name: description. they're the same for every player, so they're saved once in the achievement_info
+# table rather than with every profile, and kept here once we've seen them.
+achievement_info = {}
+# descriptions seen from the API that haven't been saved yet.
+unsaved_achievement_info = {}
+
+UPSERT_PLAYER_PROFILES = """INSERT INTO player_profiles (player_tag, player_name, clan_tag, trophies, best_trophies,
+                                                        attack_wins, defense_wins, achievements, updated)
+                            SELECT x.player_tag, x.player_name, x.clan_tag, x.trophies, x.best_trophies,
+                                   x.attack_wins, x.defense_wins, x.achievements, now()
+                            FROM jsonb_to_recordset($1::jsonb)
+                            AS x (
+                                player_tag TEXT,
+                                player_name TEXT,
+                                clan_tag TEXT,
+                                trophies INTEGER,
+                                best_trophies INTEGER,
+                                attack_wins INTEGER,
+                                defense_wins INTEGER,
+                                achievements JSONB
+                            )
+                            ON CONFLICT (player_tag)
+                            DO UPDATE SET player_name = excluded.player_name,
+                                          clan_tag = excluded.clan_tag,
+                                          trophies = excluded.trophies,
+                                          best_trophies = excluded.best_trophies,
+                                          attack_wins = excluded.attack_wins,
+                                          defense_wins = excluded.defense_wins,
+                                          achievements = excluded.achievements,
+                                          updated = excluded.updated
+                         """
+
+UPSERT_ACHIEVEMENT_INFO = """INSERT INTO achievement_info (name, info)
+                             SELECT x.name, x.info
+                             FROM jsonb_to_recordset($1::jsonb)
+                             AS x (name TEXT, info TEXT)
+                             ON CONFLICT (name)
+                             DO UPDATE SET info = excluded.info
+                          """
+
+SELECT_PLAYER_PROFILES = """SELECT *, EXTRACT(EPOCH FROM now() - updated) AS age
+                            FROM player_profiles
+                            WHERE player_tag = ANY($1::text[])
+                         """
+
+
+def profile_record(player):
+    """The ``player_profiles`` row for a ``coc.Player``, to be passed to ``UPSERT_PLAYER_PROFILES``."""
+    achievements = {}
+    for achievement in player.achievements:
+        achievements[achievement.name] = achievement.value
+        if achievement_info.get(achievement.name) != achievement.info:
+            achievement_info[achievement.name] = achievement.info
+            unsaved_achievement_info[achievement.name] = achievement.info
+
+    return {
+        'player_tag': player.tag,
+        'player_name': player.name,
+        'clan_tag': player.clan and player.clan.tag,
+        'trophies': player.trophies,
+        'best_trophies': player.best_trophies,
+        'attack_wins': player.attack_wins,
+        'defense_wins': player.defense_wins,
+        'achievements': achievements,
+    }
+
+
+async def save_achievement_info(conn):
+    """Save the achievement descriptions seen since the last save."""
+    if not unsaved_achievement_info:
+        return
+
+    saving = dict(unsaved_achievement_info)
+    await conn.execute(UPSERT_ACHIEVEMENT_INFO, [{'name': name, 'info': info} for name, info in saving.items()])
+    for name, info in saving.items():
+        if unsaved_achievement_info.get(name) == info:
+            del unsaved_achievement_info[name]
+
+
+async def load_achievement_info(conn, names):
+    """Load the descriptions of any of ``names`` we haven't seen yet. Returns whether they're all known now."""
+    missing = [name for name in names if name not in achievement_info]
+    if not missing:
+        return True
+
+    for row in await conn.fetch("SELECT name, info FROM achievement_info WHERE name = ANY($1::text[])", missing):
+        achievement_info.setdefault(row['name'], row['info'])
+    return all(name in achievement_info for name in missing)
+
+
+class ProfilePlayer:
+    """A player from the ``player_profiles`` table, with the parts of ``coc.Player`` the stats commands use.
+
+    ``age`` is how many seconds ago the profile was refreshed from the API.
+    """
+    __slots__ = ('tag', 'name', 'clan', 'trophies', 'best_trophies', 'attack_wins', 'defense_wins', '_age', '_loaded', '_achievements')
+
+    def __init__(self, *, record):
+        self.tag = record['player_tag']
+        self.name = record['player_name']
+        self.clan = record['clan_tag'] and ProfileClan(record['clan_tag'])
+        self.trophies = record['trophies']
+        self.best_trophies = record['best_trophies']
+        self.attack_wins = record['attack_wins']
+        self.defense_wins = record['defense_wins']
+        self._age = float(record['age'])
+        self._loaded = time.monotonic()
+        self._achievements = {name.casefold(): (name, value) for name, value in record['achievements'].items()}
+
+    @property
+    def age(self):
+        # it may be served from a cache for a while after it was loaded.
+        return self._age + time.monotonic() - self._loaded
+
+    def get_caseinsensitive_achievement(self, name):
+        try:
+            name, value = self._achievements[name.casefold()]
+        except KeyError:
+            return None
+        return ProfileAchievement(name, value, achievement_info[name])
+
+    def get_ach_value(self, name):
+        ach = self.get_caseinsensitive_achievement(name)
+        return ach and ach.value or 0
@@ -1,29 +1,37 @@
 import asyncio
+import contextlib
+import copy
+import hashlib
+import heapq
 import io
 import itertools
 import logging
-import time
 import os
-import shutil
-
-from pathlib import Path
+import socket
+import sys
+import time
 
+from collections import deque
 from datetime import datetime, timedelta
 
 import aiohttp
+import aiohttp.web
+import asyncpg
 import httpx
 import coc
 import discord
 
 from discord.ext import tasks
 from prometheus_async.aio.web import start_http_server
-from prometheus_client import Histogram, Counter
+from prometheus_client import Histogram, Counter, Gauge
 
 import creds
 
 from botlog import setup_logging
 
+from cogs.utils.cache import BytesCache, IconCache
 from cogs.utils.db_objects import BoardConfig
+from cogs.utils.keyset import get_order_by, get_keyset_condition, get_keyset_values
 
 
 REFRESH_EMOJI = discord.PartialEmoji(name="refresh", id=694395354841350254, animated=False)
@@ -52,6 +60,13 @@ titles = {
     "legend": "Legend Leaderboard",
     "war": "War Leaderboard",
 }
+# how each board type is screenshotted. quality only applies to jpeg and webp, and scale zooms the whole page.
+board_encodings = {
+    "donation": {"format": "jpeg", "quality": 85, "scale": 1.0},
+    "trophy": {"format": "jpeg", "quality": 85, "scale": 1.0},
+    "legend": {"format": "jpeg", "quality": 85, "scale": 1.0},
+    "war": {"format": "jpeg", "quality": 85, "scale": 1.0},
+}
 default_sort_by = {
     "donation": "donations",
     "trophy": "trophies",
@@ -70,26 +85,126 @@ If a board doesn't appear, please make sure you have `+add clan #clantag #dt-boa
 """
 
 GLOBAL_BOARDS_CHANNEL_ID = 663683345108172830
+# how many players global_board_players keeps per sort key. The default k in tables.sql must match.
+GLOBAL_BOARD_TOP_K = 500
+# how often the global top k is refreshed for players updated since the last refresh, and fully rebuilt.
+GLOBAL_BOARD_REFRESH_INTERVAL = 60.0
+GLOBAL_BOARD_REBUILD_INTERVAL = 3600.0
+
+# board sort_by: the (column, direction, type) keys a board is ordered by, for keyset pagination (cogs.utils.keyset).
+# Every one of the board_players orderings is covered by an index. snapshot_board_season and the global board
+# functions in tables.sql use the same ORDER BYs.
+board_players_sorting = {
+    "donations": (("donations", "DESC", "integer"), ("player_tag", "ASC", "text")),
+    "received": (("received", "DESC", "integer"), ("player_tag", "ASC", "text")),
+    "ratio": (("ratio", "DESC", "decimal"), ("player_tag", "ASC", "text")),
+    "trophies": (("trophies", "DESC", "integer"), ("player_tag", "ASC", "text")),
+    "gain": (("gain", "DESC", "integer"), ("player_tag", "ASC", "text")),
+    "last_online ASC, player_name": (
+        ("last_updated", "DESC NULLS LAST", "timestamp"), ("player_name", "DESC", "text"), ("player_tag", "ASC", "text")
+    ),
+}
+# war stats are summed over the player's clans in the channel, so war boards seek on the sums.
+war_sorting = {
+    "stars": (("stars", "DESC", "bigint"), ("destruction", "DESC", "decimal"), ("player_tag", "ASC", "text")),
+    "destruction": (("destruction", "DESC", "decimal"), ("player_tag", "ASC", "text")),
+    "3_star": (("three_stars", "DESC", "bigint"), ("player_tag", "ASC", "text")),
+    "2_star": (("two_stars", "DESC", "bigint"), ("player_tag", "ASC", "text")),
+    "missed": (("missed", "DESC", "bigint"), ("player_tag", "ASC", "text")),
+}
+# legend stats are NULL until they're known, and those rows go last.
+legend_sorting = {
+    key: ((f"COALESCE(legend_days.{key}, -1)", "DESC", "integer"), ("legend_days.player_tag", "ASC", "text"))
+    for key in ("starting", "gain", "loss", "finishing")
+}
+
+# whether to post a perf summary for each board to the logging webhooks. This is never on the critical path.
+LOG_BOARD_PERF = True
+
+# renders bigger than this are re-encoded at a lower quality, then a smaller scale, until they fit.
+BOARD_IMAGE_BUDGET = 2 * 1024 * 1024
+BOARD_IMAGE_MIN_QUALITY = 40
+BOARD_IMAGE_MIN_SCALE = 0.5
+
+# the number of legend boards archived at once at the daily reset.
+LEGEND_ARCHIVE_CONCURRENCY = 5
+
+# the number of boards rendered at once, and how many of those are kept free for interactive updates
+# (button presses and reactions) so they never wait behind background refreshes.
+BOARD_RENDER_SLOTS = 4
+BOARD_INTERACTIVE_SLOTS = 1
+
+# log every board's stage timings to the syncboards.trace logger.
+BOARD_TRACE_LOG = False
+
+# the bot hands interactive board updates to this process over http on localhost.
+# if several syncboards processes are running, the first one to bind the port serves them.
+BOARD_RPC_HOST = "127.0.0.1"
+BOARD_RPC_PORT = 8002
+BOARD_RPC_TIMEOUT = 120.0
+
+# a board is updated as soon as it's marked, but any further updates within this many seconds are coalesced into one.
+BOARD_UPDATE_DEBOUNCE = 5.0
+# if a worker hasn't finished (or crashed) a claimed board after this many seconds, another worker can take it.
+# a worker renews its claims every BOARD_CLAIM_RENEW seconds while it's still rendering them.
+BOARD_CLAIM_LEASE = 120.0
+BOARD_CLAIM_RENEW = BOARD_CLAIM_LEASE / 3
+# an interactive update waits up to this many seconds for a background update of the same board to release it,
+# checking every BOARD_CLAIM_POLL seconds, so the two never edit the message at the same time.
+BOARD_INTERACTIVE_CLAIM_WAIT = 30.0
+BOARD_CLAIM_POLL = 0.5
+
+# prometheus metrics port. each syncboards process on a host needs its own, so it can be passed as the first argument.
+BOARD_METRICS_PORT = 8001
 
 log = logging.getLogger(__name__)
+trace_log = logging.getLogger(__name__ + ".trace")
 
 counter = Counter("donbot_boards_processed", "The number of boards processed.")
 render_histo = Histogram("donbot_boards_render_latency_seconds", "Latency of board processing.", buckets=(0.01, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.2, 1.5, 2.0, 3.0, 5.0, 10.0))
 overall_histo = Histogram("donbot_boards_overall_latency_seconds", "Latency of board processing.", buckets=(0.01, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.2, 1.5, 2.0, 3.0, 5.0, 10.0))
+encode_histo = Histogram("donbot_boards_encode_latency_seconds", "Latency of screenshotting and encoding board images.", ["type"], buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0))
+image_bytes_histo = Histogram("donbot_boards_image_bytes", "Size of uploaded board images.", ["type"], buckets=(50_000, 100_000, 200_000, 400_000, 750_000, 1_000_000, 1_500_000, 2_000_000, 4_000_000, 8_000_000))
+stage_histo = Histogram("donbot_boards_stage_latency_seconds", "Latency of each stage of board processing.", ["stage", "type"], buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0))
+failure_counter = Counter("donbot_boards_failures", "The number of boards that failed to update.", ["cause", "type"])
+queue_depth_gauge = Gauge("donbot_boards_queue_depth", "The number of boards waiting for a render slot.", ["lane"])
+queue_wait_histo = Histogram("donbot_boards_queue_wait_seconds", "Time boards spend waiting for a render slot.", ["lane"], buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0))
+legend_archive_gauge = Gauge("donbot_boards_legend_archive_seconds", "How long the last daily legend board archive took.")
+encode_attempts = Counter("donbot_boards_encode_attempts", "The number of times board images were encoded, including re-encodes to fit the size budget.", ["type"])
+
+# shared between every board render in the process - badges and emojis rarely change.
+board_icons = IconCache(directory="assets/board_icons", max_bytes=64 * 1024 * 1024, ttl=86400.0)
+icon_cache_gauge = Gauge("donbot_boards_icon_cache", "Board icon cache statistics.", ["stat"])
+icon_cache_gauge.labels("entries").set_function(lambda: len(board_icons))
+icon_cache_gauge.labels("hits").set_function(lambda: board_icons.hits)
+icon_cache_gauge.labels("misses").set_function(lambda: board_icons.misses)
+
+# finished board images, keyed by a hash of the page's rows and settings. Lets a page that was prefetched,
+# or that hasn't changed since it was last rendered, skip the renderer. The rows are hashed without their
+# "last online" intervals, which change every time they're read, so a cached image's last online times can
+# be up to the ttl old.
+board_renders = BytesCache(max_bytes=128 * 1024 * 1024, ttl=600.0)
+render_cache_gauge = Gauge("donbot_boards_render_cache", "Board render cache statistics.", ["stat"])
+render_cache_gauge.labels("entries").set_function(lambda: len(board_renders))
+render_cache_gauge.labels("hits").set_function(lambda: board_renders.hits)
+render_cache_gauge.labels("misses").set_function(lambda: board_renders.misses)
 
 class HTMLImages:
-    def __init__(self, players, title=None, image=None, sort_by=None, footer=None, offset=None, board_type='donation', fonts=None, session=None, coc_client=None):
+    def __init__(self, players, title=None, image=None, sort_by=None, footer=None, offset=None, board_type='donation', fonts=None, session=None, coc_client=None, cache_ttl=None):
         self.players = players
+        self.cache_ttl = cache_ttl
         self.session = session
         self.coc_client = coc_client
 
         self.emoji_data = {}
+        self.timings = {}  # stage: seconds
 
         self.offset = offset or 1
         self.title = title or titles.get(board_type, backgrounds['donation'])
         self.image = image
 
         self.footer = footer
+        self.encoding = dict(board_encodings.get(board_type, board_encodings["donation"]))
         self.fonts = fonts or "symbola, Helvetica, Verdana,courier,arial,symbola"
         self.board_type = board_type
 
@@ -131,28 +246,27 @@ class HTMLImages:
         emoji_or_clan_id = emoji_or_clan_id.replace("#", "")
         if emoji_or_clan_id in self.emoji_data:
             return emoji_or_clan_id
-        else:
-            path = Path(f'assets/board_icons/{emoji_or_clan_id}.png')
-            if path.is_file():
-                with open(path, "rb") as fp:
-                    self.emoji_data[emoji_or_clan_id] = fp.read()
-                return emoji_or_clan_id
 
-            else:
-                if clan_tag:
-                    clan = await self.coc_client.get_clan(clan_tag)
-                    if clan:
-                        b = await clan.badge.save(path)
-                        return b and (await self.load_or_save_custom_emoji(emoji_or_clan_id, clan_tag)) or False
-                else:
-                    resp = await self.session.get(f"{discord.Asset.BASE}/emojis/{emoji_or_clan_id}.png")
-                    if resp.status_code == 200:
-                        data = resp.read()
-                        with open(f'assets/board_icons/{emoji_or_clan_id}.png', 'wb') as f:
-                            f.write(data)
-
-                        self.emoji_data[emoji_or_clan_id] = data
-                        return emoji_or_clan_id
+        async def fetch_badge():
+            clan = await self.coc_client.get_clan(clan_tag)
+            return clan and await clan.badge.read()
+
+        async def fetch_emoji():
+            resp = await self.session.get(f"{discord.Asset.BASE}/emojis/{emoji_or_clan_id}.png")
+            if resp.status_code == 200:
+                return resp.read()
+
+        try:
+            data = await board_icons.get(emoji_or_clan_id, fetch_badge if clan_tag else fetch_emoji)
+        except (coc.HTTPException, httpx.HTTPError) as exc:
+            log.info("failed to fetch board icon %s: %s", emoji_or_clan_id, exc)
+            return False
+
+        if not data:
+            return False
+
+        self.emoji_data[emoji_or_clan_id] = data
+        return emoji_or_clan_id
 
     def get_readable(self, delta):
         hours, remainder = divmod(int(delta.total_seconds()), 3600)
@@ -330,26 +444,19 @@ font-weight: bold;
                 for i, p in enumerate(self.players, start=self.offset)
             ]
         elif self.board_type == "war":
-            players = []
-            for player_tag, rows in itertools.groupby(sorted(self.players, key=lambda r: r['player_tag']), key=lambda r: r['player_tag']):
-                rows = list(rows)
-                by_star = {r['stars']: r for r in rows}
-
-                players.append(
-                    (
-                        self.show_clan and await self.get_img_src(rows[0]) or '',
-                        rows[0]['player_name'],
-                        sum(r['stars'] * r['star_count'] for r in rows if r['stars'] >= 0),
-                        sum(r['destruction_count'] for r in rows),
-                        by_star.get(3, {}).get('star_count', 0),
-                        by_star.get(2, {}).get('star_count', 0),
-                        # by_star.get(1, {}).get('stars', 0),
-                        # by_star.get(0, {}).get('stars', 0),
-                        by_star.get(-1, {}).get('star_count', 0),
-                    )
+            self.players = [
+                (
+                    str(i) + ".",
+                    self.show_clan and await self.get_img_src(p) or '',
+                    p['player_name'],
+                    p['stars'],
+                    p['destruction'],
+                    p['three_stars'],
+                    p['two_stars'],
+                    p['missed'],
                 )
-
-            self.players = [(str(index) + ".", *player) for index, player in enumerate(sorted(players, key=lambda r: (r[2], r[3]), reverse=True), start=self.offset)]
+                for i, p in enumerate(self.players, start=self.offset)
+            ]
 
         else:
             self.players = [
@@ -364,9 +471,25 @@ font-weight: bold;
                 for i, p in enumerate(self.players, start=self.offset)
             ]
 
+    def cache_key(self):
+        rows = [
+            sorted((k, v) for k, v in p.items() if not (k == "last_online" and "last_updated" in p.keys()))
+            for p in self.players
+        ]
+        settings = (self.board_type, self.title, self.image, self.selected_index, self.footer, self.offset)
+        return hashlib.sha256(repr((settings, sorted(self.encoding.items()), rows)).encode("utf-8")).hexdigest()
+
     async def make(self):
+        s = time.perf_counter()
+        data = await board_renders.get(self.cache_key(), self.build_and_encode, ttl=self.cache_ttl)
+        self.timings["render"] = time.perf_counter() - s - self.timings.get("icons", 0) - self.timings.get("html", 0)
+        image_bytes_histo.labels(self.board_type).observe(len(data))
+        return io.BytesIO(data)
+
+    async def build_and_encode(self):
         s = time.perf_counter()
         await self.parse_players()
+        self.timings["icons"] = time.perf_counter() - s
         self.add_style()
         self.add_body()
         self.add_title()
@@ -379,19 +502,157 @@ font-weight: bold;
         if not self.board_type == 'legend':
             self.add_footer()
         self.end_html()
+        self.timings["html"] = time.perf_counter() - s - self.timings["icons"]
+        return await self.encode()
+
+    async def encode(self):
+        assets = [("badge.png", await self.read_asset("assets/reddit badge.png"))]
+        if not self.image:
+            assets.append(("background.png", await self.read_asset(backgrounds.get(self.board_type, backgrounds["donation"]))))
+
+        encode_start = time.perf_counter()
+        data = await self.screenshot(assets)
+        # a lossy format can usually get under budget just by dropping quality; after that we shrink the image.
+        while len(data) > BOARD_IMAGE_BUDGET:
+            if self.encoding["format"] != "png" and self.encoding["quality"] > BOARD_IMAGE_MIN_QUALITY:
+                self.encoding["quality"] = max(BOARD_IMAGE_MIN_QUALITY, self.encoding["quality"] - 15)
+            elif self.encoding["scale"] > BOARD_IMAGE_MIN_SCALE:
+                self.encoding["scale"] = max(BOARD_IMAGE_MIN_SCALE, round(self.encoding["scale"] * 0.75, 2))
+            else:
+                log.info("%s board is %s bytes, over budget at the lowest quality", self.board_type, len(data))
+                break
+            data = await self.screenshot(assets)
+
+        encode_histo.labels(self.board_type).observe(time.perf_counter() - encode_start)
+        return data
+
+    @property
+    def filename(self):
+        return f"{self.board_type}board.{self.encoding['format']}"
+
+    @staticmethod
+    async def read_asset(path):
+        def read():
+            with open(path, "rb") as fp:
+                return fp.read()
+        return await asyncio.get_running_loop().run_in_executor(None, read)
+
+    async def screenshot(self, assets):
+        html = self.html
+        if self.encoding["scale"] != 1.0:
+            html = html.replace("<style>", "<style>\nhtml { zoom: " + str(self.encoding["scale"]) + "; }", 1)
 
         files = [
-            ('file', ("index.html", io.BytesIO(self.html.encode("utf-8")))),
-            ('file', ("badge.png", open("assets/reddit badge.png", "rb"))),
+            ('file', ("index.html", io.BytesIO(html.encode("utf-8")))),
+            *[('file', (name, io.BytesIO(content))) for name, content in assets],
             *[('file', (k + ".png", io.BytesIO(v))) for k, v in self.emoji_data.items()]
         ]
-        if not self.image:
-            files.append(('file', ("background.png", open(backgrounds.get(self.board_type, backgrounds["donation"]), "rb"))))
-
-        data = {'optimizeForSpeed': 'true', 'skipNetworkIdleEvent': 'true'}
+        data = {'optimizeForSpeed': 'true', 'skipNetworkIdleEvent': 'true', 'format': self.encoding["format"]}
+        if self.encoding["format"] != "png":
+            data['quality'] = str(self.encoding["quality"])
 
+        encode_attempts.labels(self.board_type).inc()
         res = await self.session.post("http://localhost:3000/forms/chromium/screenshot/html", files=files, data=data)
-        return io.BytesIO(res.read())
+        res.raise_for_status()
+        return res.read()
+
+
+class BoardScheduler:
+    """Hands out board render slots.
+
+    Interactive updates have their own lane which is always served first, and ``interactive_slots`` slots are
+    never given to background updates. Background updates are weighted fair queued by guild, so a guild with
+    dozens of boards gets its turn alongside everyone else instead of ahead of them.
+    """
+    def __init__(self, slots=BOARD_RENDER_SLOTS, interactive_slots=BOARD_INTERACTIVE_SLOTS, weights=None):
+        self.slots = slots
+        self.interactive_slots = interactive_slots
+        self.weights = weights or {}  # guild id: weight, default 1
+
+        self.active = 0
+        self.active_background = 0
+        self._interactive = deque()
+        self._background = []  # heap of (finish tag, sequence, guild id, future)
+        self._finish_tags = {}  # guild id: finish tag of its last queued update
+        self._guild_queued = {}  # guild id: number of its updates in the background queue
+        self._virtual_time = 0.0
+        self._sequence = 0
+
+    def queued(self, lane):
+        # cancelled updates stay queued until they're reached, but they aren't waiting.
+        if lane == "interactive":
+            return sum(not future.done() for future in self._interactive)
+        return sum(not entry[-1].done() for entry in self._background)
+
+    def idle(self):
+        """Whether there's a background slot free and nothing waiting for one."""
+        return not self._interactive and not self._background and self.active_background < self.slots - self.interactive_slots
+
+    def _enqueue(self, guild_id, interactive):
+        future = asyncio.get_running_loop().create_future()
+        if interactive:
+            self._interactive.append(future)
+            return future
+
+        start = max(self._virtual_time, self._finish_tags.get(guild_id, 0.0))
+        finish = self._finish_tags[guild_id] = start + 1 / self.weights.get(guild_id, 1)
+        self._guild_queued[guild_id] = self._guild_queued.get(guild_id, 0) + 1
+        self._sequence += 1
+        heapq.heappush(self._background, (finish, self._sequence, guild_id, future))
+        return future
+
+    def _dequeued(self, guild_id):
+        # a guild with nothing queued starts again from the virtual time, so it doesn't need a finish tag.
+        self._guild_queued[guild_id] -= 1
+        if not self._guild_queued[guild_id]:
+            del self._guild_queued[guild_id]
+            del self._finish_tags[guild_id]
+
+    def _dispatch(self):
+        while self.active < self.slots:
+            if self._interactive:
+                future = self._interactive.popleft()
+                if future.done():
+                    continue  # cancelled while waiting
+                future.set_result(False)
+            elif self._background and self.active_background < self.slots - self.interactive_slots:
+                finish, _, guild_id, future = heapq.heappop(self._background)
+                self._dequeued(guild_id)
+                if future.done():
+                    continue
+                self._virtual_time = finish
+                self.active_background += 1
+                future.set_result(True)
+            else:
+                return
+            self.active += 1
+
+    async def run(self, func, *, guild_id=None, interactive=False):
+        """Run ``await func()`` once a slot is free, and return its result."""
+        lane = "interactive" if interactive else "background"
+        start = time.perf_counter()
+
+        future = self._enqueue(guild_id, interactive)
+        self._dispatch()
+        try:
+            is_background = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # we were given a slot just as we were cancelled, so give it back.
+                self._release(future.result())
+            raise
+
+        queue_wait_histo.labels(lane).observe(time.perf_counter() - start)
+        try:
+            return await func()
+        finally:
+            self._release(is_background)
+
+    def _release(self, is_background):
+        self.active -= 1
+        if is_background:
+            self.active_background -= 1
+        self._dispatch()
 
 
 class SyncBoards:
@@ -411,14 +672,29 @@ class SyncBoards:
         self.webhooks = None
         self.fake_clan_guilds = fake_clan_guilds or set()
 
-        self.throttler = coc.BasicThrottler(1)
+        self.scheduler = BoardScheduler()
+        for lane in ("interactive", "background"):
+            queue_depth_gauge.labels(lane).set_function(lambda lane=lane: self.scheduler.queued(lane))
+        self.initialised = False
+
+        self.listener = None
+        self.board_queue = asyncio.Queue()
+        self._debounced = {}  # board id: asyncio.TimerHandle, or None if it's already in the queue
+        self._last_board_run = {}  # board id: time.monotonic() of the last update
+        self._queue_task = None
+        self._board_tasks = set()
+        self.closing = False
+        self.global_board_synced_to = None  # players.last_updated the global top k is refreshed up to
+        self.rpc_runner = None
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
 
         self.reset_season_id.add_exception_type(Exception)
         self.reset_season_id.start()
 
         self.start_loops = start_loop
         if start_loop:
-            for task in (self.update_board_loops, self.flush_saved_board_icons):
+            for task in (self.flush_saved_board_icons, self.reclaim_expired_boards, self.rebuild_global_board,
+                         self.refresh_global_board):
                 task.add_exception_type(Exception)
                 task.start()
 
@@ -426,21 +702,79 @@ class SyncBoards:
         self.legend_board_reset.start()
 
     async def on_init(self):
-        self.webhooks = itertools.cycle(
-            discord.Webhook.partial(
-                payload['id'], payload['token'], session=self.aiohttp_session
-            ) for payload in await self.bot.http.guild_webhooks(691779140059267084)
-        )
+        if LOG_BOARD_PERF:
+            try:
+                webhooks = [
+                    discord.Webhook.partial(
+                        payload['id'], payload['token'], session=self.aiohttp_session
+                    ) for payload in await self.bot.http.guild_webhooks(691779140059267084)
+                ]
+                self.webhooks = webhooks and itertools.cycle(webhooks)
+            except discord.HTTPException:
+                log.exception("failed to fetch board perf log webhooks")
 
         await self.set_season_id()
+        self.initialised = True
+
+        if self.start_loops:
+            await self.start_rpc_server()
+            await self.start_listener()
+            self._queue_task = asyncio.create_task(self.board_queue_worker())
+
+    async def start_rpc_server(self):
+        app = aiohttp.web.Application()
+        app.router.add_post("/boards/update", self.on_rpc_update_board)
+        self.rpc_runner = aiohttp.web.AppRunner(app, access_log=None)
+        await self.rpc_runner.setup()
+        try:
+            await aiohttp.web.TCPSite(self.rpc_runner, BOARD_RPC_HOST, BOARD_RPC_PORT).start()
+        except OSError:
+            log.info("board rpc port %s is in use, not serving interactive board updates", BOARD_RPC_PORT)
+            await self.rpc_runner.cleanup()
+            self.rpc_runner = None
+        else:
+            log.info("serving interactive board updates on %s:%s", BOARD_RPC_HOST, BOARD_RPC_PORT)
+
+    async def on_rpc_update_board(self, request):
+        payload = await request.json()
+        config = BoardConfig(bot=self.bot, record=payload["config"])
+        try:
+            await self.run_interactive(config, divert_to=payload.get("divert_to"))
+        except Exception as exc:
+            log.exception("interactive board update for %s failed", config.channel_id)
+            return aiohttp.web.json_response({"error": str(exc)}, status=500)
+        return aiohttp.web.json_response({"channel_id": config.channel_id})
+
+    def create_task(self, coro):
+        # keep a reference so the task isn't garbage collected before it's done, and cancel it on close.
+        task = asyncio.create_task(coro)
+        self._board_tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def _on_task_done(self, task):
+        self._board_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            log.error("board task failed", exc_info=task.exception())
 
     async def close(self):
+        self.closing = True
+        if self.rpc_runner:
+            await self.rpc_runner.cleanup()
+        if self._queue_task:
+            self._queue_task.cancel()
+        for task in self._board_tasks:
+            task.cancel()
+        if self.listener and not self.listener.is_closed():
+            await self.listener.close()
         if not self.session.is_closed:
             await self.session.aclose()
 
     async def set_season_id(self):
         fetch = await self.pool.fetchrow("SELECT id FROM seasons WHERE start < now() ORDER BY start DESC;")
         self.season_id = fetch['id']
+        # past seasons are rendered from snapshots, which don't need page boundaries.
+        await self.pool.execute("DELETE FROM board_page_keys WHERE season_id < $1", self.season_id)
 
     async def get_season_meta(self, season_id):
         try:
@@ -457,34 +791,227 @@ class SyncBoards:
         await asyncio.sleep((datetime.utcnow() - next_season).total_seconds() + 1)  # allow some buffer
         await self.set_season_id()
 
-    @tasks.loop(seconds=5.0)
-    async def update_board_loops(self):
-        log.info("starting loop to update boards")
-        if not self.webhooks:
-            log.info("no webhooks, skipping")
+    async def start_listener(self):
+        self.listener = await asyncpg.connect(creds.postgres)
+        self.listener.add_termination_listener(self.on_listener_terminated)
+        await self.listener.add_listener("board_update", self.on_board_notify)
+        await self.listener.add_listener("clans_update", self.on_clans_notify)
+
+        # pick up anything that was marked while we weren't listening.
+        query = """SELECT id FROM boards 
+                   WHERE toggle=True 
+                   AND ((need_to_update=True AND claim_expires IS NULL) OR claim_expires < now())
+                """
+        fetch = await self.pool.fetch(query)
+        log.info("listening for board updates as %s, %s boards already waiting", self.worker_id, len(fetch))
+        for row in fetch:
+            self.queue_board(row['id'])
+
+        await self.set_fake_clan_guilds()
+
+    def on_listener_terminated(self, connection):
+        if self.closing:
             return
+        log.warning("board update listener connection closed, reconnecting")
+        self.create_task(self.reconnect_listener())
+
+    async def reconnect_listener(self):
+        while True:
+            try:
+                await self.start_listener()
+            except (OSError, asyncpg.PostgresError):
+                log.exception("failed to reconnect board update listener")
+                await asyncio.sleep(5)
+            else:
+                return
+
+    def on_board_notify(self, connection, pid, channel, payload):
+        self.queue_board(int(payload))
 
+    def on_clans_notify(self, connection, pid, channel, payload):
+        self.create_task(self.set_fake_clan_guilds())
+
+    async def set_fake_clan_guilds(self):
         try:
-            fetch = await self.pool.fetch("UPDATE boards SET need_to_update=False WHERE need_to_update=True AND toggle=True RETURNING *")
-            self.fake_clan_guilds = {row['guild_id'] for row in await self.pool.fetch("SELECT DISTINCT guild_id FROM clans WHERE fake_clan=True")}
-            log.info("updating %s boards", len(fetch))
+            fetch = await self.pool.fetch("SELECT DISTINCT guild_id FROM clans WHERE fake_clan=True")
         except Exception as exc:
-            log.exception("failed to fetch boards that need to be updated...", exc_info=exc)
+            log.exception("failed to fetch fake clan guilds", exc_info=exc)
+        else:
+            self.fake_clan_guilds = {row['guild_id'] for row in fetch}
 
-        current_tasks = []
-        for n in fetch:
-            config = BoardConfig(bot=self.bot, record=n)
-            current_tasks.append(asyncio.create_task(self.run_board(config)))
+    def queue_board(self, board_id):
+        if board_id in self._debounced:
+            return  # an update is already pending, so this one gets coalesced into it.
 
-        res = await asyncio.gather(*current_tasks)
+        delay = self._last_board_run.get(board_id, 0) + BOARD_UPDATE_DEBOUNCE - time.monotonic()
+        if delay <= 0:
+            self._debounced[board_id] = None
+            self.board_queue.put_nowait(board_id)
+        else:
+            self._debounced[board_id] = asyncio.get_running_loop().call_later(
+                delay, self.board_queue.put_nowait, board_id
+            )
 
-    async def run_board(self, config):
+    async def board_queue_worker(self):
+        while True:
+            board_ids = [await self.board_queue.get()]
+            while not self.board_queue.empty():
+                board_ids.append(self.board_queue.get_nowait())
+
+            now = time.monotonic()
+            # a board last run more than BOARD_UPDATE_DEBOUNCE ago isn't debounced, so it doesn't need an entry.
+            self._last_board_run = {
+                board_id: ran for board_id, ran in self._last_board_run.items() if now - ran < BOARD_UPDATE_DEBOUNCE
+            }
+            for board_id in board_ids:
+                self._debounced.pop(board_id, None)
+                self._last_board_run[board_id] = now
+
+            # boards are only claimed once they're given a render slot, so a long background queue
+            # doesn't sit on claims (and let their leases expire) while it waits.
+            try:
+                fetch = await self.pool.fetch("SELECT id, guild_id FROM boards WHERE id = ANY($1::INTEGER[])", board_ids)
+            except Exception as exc:
+                log.exception("failed to fetch %s queued boards, retrying", len(board_ids), exc_info=exc)
+                # they've just been run, so these are debounced rather than retried straight away.
+                for board_id in board_ids:
+                    self.queue_board(board_id)
+                continue
+
+            for row in fetch:
+                self.create_task(
+                    self.scheduler.run(lambda board_id=row['id']: self.claim_and_run_board(board_id), guild_id=row['guild_id'])
+                )
+
+    async def claim_and_run_board(self, board_id):
+        configs = await self.claim_boards([board_id])
+        for config in configs:
+            await self.run_board(config)
+
+    async def claim_boards(self, board_ids):
+        # SKIP LOCKED means if another worker is claiming the same board right now we just leave it to them.
+        query = """UPDATE boards 
+                   SET need_to_update = False, 
+                       claimed_by = $2, 
+                       claim_expires = now() + $3 * interval '1 second',
+                       last_refresh = now()
+                   WHERE id IN (
+                       SELECT id FROM boards
+                       WHERE id = ANY($1::INTEGER[])
+                       AND toggle = True
+                       AND ((need_to_update = True AND claim_expires IS NULL) OR claim_expires < now())
+                       FOR UPDATE SKIP LOCKED
+                   )
+                   RETURNING *
+                """
+        try:
+            fetch = await self.pool.fetch(query, board_ids, self.worker_id, BOARD_CLAIM_LEASE)
+        except Exception as exc:
+            log.exception("failed to claim boards that need to be updated...", exc_info=exc)
+            return []
+
+        return [BoardConfig(bot=self.bot, record=row) for row in fetch]
+
+    async def claim_board(self, config):
+        """Claim a board for an interactive update, waiting for any other claim on it to be released."""
+        query = """UPDATE boards 
+                   SET claimed_by = $2, 
+                       claim_expires = now() + $3 * interval '1 second' 
+                   WHERE id = $1 
+                   AND (claim_expires IS NULL OR claim_expires < now())
+                   RETURNING id
+                """
+        deadline = time.monotonic() + BOARD_INTERACTIVE_CLAIM_WAIT
+        while not await self.pool.fetchval(query, config.id, self.worker_id, BOARD_CLAIM_LEASE):
+            if time.monotonic() > deadline:
+                raise asyncio.TimeoutError(f"board {config.id} is still being updated by another worker")
+            await asyncio.sleep(BOARD_CLAIM_POLL)
+
+    async def release_board(self, config):
+        # setting need_to_update to itself fires the notify trigger again if the board was marked while we had it.
+        query = """UPDATE boards 
+                   SET claimed_by = NULL, 
+                       claim_expires = NULL, 
+                       need_to_update = need_to_update 
+                   WHERE id = $1 
+                   AND claimed_by = $2
+                """
         try:
-            async with self.throttler:
+            await self.pool.execute(query, config.id, self.worker_id)
+        except Exception as exc:
+            log.exception("failed to release board %s", config.id, exc_info=exc)
+
+    @tasks.loop(seconds=BOARD_CLAIM_LEASE)
+    async def reclaim_expired_boards(self):
+        fetch = await self.pool.fetch("SELECT id, claimed_by FROM boards WHERE claim_expires < now() AND toggle=True")
+        for row in fetch:
+            log.info("board %s claim by %s expired, retrying", row['id'], row['claimed_by'])
+            self.queue_board(row['id'])
+
+    async def renew_claim(self, config):
+        query = """UPDATE boards 
+                   SET claim_expires = now() + $3 * interval '1 second' 
+                   WHERE id = $1 
+                   AND claimed_by = $2
+                """
+        while True:
+            await asyncio.sleep(BOARD_CLAIM_RENEW)
+            try:
+                await self.pool.execute(query, config.id, self.worker_id, BOARD_CLAIM_LEASE)
+            except Exception as exc:
+                log.exception("failed to renew claim on board %s", config.id, exc_info=exc)
+
+    @contextlib.asynccontextmanager
+    async def hold_claim(self, config):
+        # keep the claim alive while we're rendering, so a slow board isn't reclaimed and rendered twice.
+        heartbeat = asyncio.create_task(self.renew_claim(config))
+        try:
+            yield
+        finally:
+            heartbeat.cancel()
+            await self.release_board(config)
+
+    async def run_board(self, config):
+        async with self.hold_claim(config):
+            try:
                 log.info("updating board for channel: %s, title: %s", config.channel_id, config.title)
                 await self.update_board(config)
-        except:
-            log.exception("board error.... CHANNEL ID: %s", config.channel_id)
+            except (asyncpg.PostgresError, OSError):
+                failure_counter.labels("database", config.type).inc()
+                log.exception("board error.... CHANNEL ID: %s", config.channel_id)
+            except:
+                log.exception("board error.... CHANNEL ID: %s", config.channel_id)
+
+    async def run_interactive(self, config, **kwargs):
+        """Update a board someone is waiting on, ahead of any background updates."""
+        def run():
+            return self.scheduler.run(lambda: self.update_board(config, **kwargs), guild_id=config.guild_id, interactive=True)
+
+        if kwargs.get("divert_to"):
+            # diverted boards are sent as a new message, so they can't clash with an update of the board itself.
+            await run()
+            return
+
+        # the same claim as a background update, so the two can't render the board at once.
+        await self.claim_board(config)
+        async with self.hold_claim(config):
+            await run()
+        self.prefetch_adjacent_pages(config)
+
+    def prefetch_adjacent_pages(self, config):
+        """Render the pages either side of the one on screen into the render cache, if the renderer is idle.
+
+        If someone presses next or previous, the page usually hasn't changed and is served from the cache.
+        """
+        for page in (config.page + 1, config.page - 1):
+            if page < 1 or not self.scheduler.idle():
+                continue
+
+            adjacent = copy.copy(config)
+            adjacent.page = page
+            self.create_task(
+                self.scheduler.run(lambda c=adjacent: self.update_board(c, prefetch=True), guild_id=config.guild_id)
+            )
 
     async def set_new_message(self, config):
         try:
@@ -520,10 +1047,75 @@ class SyncBoards:
 
         return config_per_page
 
-    async def update_board(self, config, update_global=False, divert_to=None):
+    async def get_page_boundary(self, config, season_id, since=None):
+        """Get the sort key values of the last row on the page before ``config.page`` if we know them, and the
+        board's generation.
+
+        The generation is when the board was last claimed for a refresh, which is when its data last changed. A
+        boundary is only used if it was found in the current generation, and since ``since``, otherwise rows could
+        have moved past it.
+        """
+        query = """SELECT boards.last_refresh, board_page_keys.last_key 
+                   FROM boards 
+                   LEFT JOIN board_page_keys 
+                   ON board_page_keys.channel_id = boards.channel_id 
+                   AND board_page_keys.type = boards.type 
+                   AND board_page_keys.season_id = $3 
+                   AND board_page_keys.sort_by = $4 
+                   AND board_page_keys.page = $5
+                   AND board_page_keys.generation IS NOT DISTINCT FROM boards.last_refresh
+                   AND board_page_keys.written >= COALESCE($6::timestamp AT TIME ZONE 'UTC', '-infinity')
+                   WHERE boards.channel_id = $1 
+                   AND boards.type = $2
+                """
+        fetch = await self.pool.fetchrow(
+            query, config.channel_id, config.type, season_id, config.sort_by, config.page - 1, since
+        )
+        if not fetch:
+            return None, None
+        return fetch['last_key'], fetch['last_refresh']
+
+    def get_page_window(self, config, boundary, offset):
+        """Get the LIMIT and OFFSET to fetch a page with, and how many rows before the page that includes.
+
+        Without a boundary the page is found with OFFSET, and the last row of the page before it is fetched too, so
+        that page's boundary is found again for this generation of the board.
+        """
+        per_page = self.get_next_per_page(config.page, config.per_page)
+        if boundary or not offset:
+            return per_page, 0, 0
+        return per_page + 1, offset - 1, 1
+
+    async def set_page_boundaries(self, config, season_id, generation, fetch, before, get_values):
+        """Save the boundaries found by fetching a page, and return the rows on the page."""
+        if before and fetch:
+            await self.set_page_boundary(config, season_id, generation, get_values(fetch[0]), page=config.page - 1)
+            fetch = fetch[before:]
+        if fetch:
+            await self.set_page_boundary(config, season_id, generation, get_values(fetch[-1]))
+        return fetch
+
+    async def set_page_boundary(self, config, season_id, generation, values, page=None):
+        query = """INSERT INTO board_page_keys (channel_id, type, season_id, sort_by, page, last_key, generation) 
+                   VALUES ($1, $2, $3, $4, $5, $6, $7) 
+                   ON CONFLICT (channel_id, type, season_id, sort_by, page) 
+                   DO UPDATE SET last_key = excluded.last_key, generation = excluded.generation, written = excluded.written
+                """
+        page = page or config.page
+        if values is None:
+            await self.pool.execute(
+                "DELETE FROM board_page_keys WHERE channel_id = $1 AND type = $2 AND season_id = $3 AND sort_by = $4 AND page = $5",
+                config.channel_id, config.type, season_id, config.sort_by, page
+            )
+        else:
+            await self.pool.execute(
+                query, config.channel_id, config.type, season_id, config.sort_by, page, values, generation
+            )
+
+    async def update_board(self, config, update_global=False, divert_to=None, players=None, prefetch=False):
         if config.channel_id == GLOBAL_BOARDS_CHANNEL_ID and not update_global:
             return
-        if not config.message_id and not divert_to:
+        if not config.message_id and not divert_to and not prefetch:
             config = await self.set_new_message(config)
             if not config:
                 return
@@ -535,6 +1127,7 @@ class SyncBoards:
             # default season id is null, which means historical will make it go negative, so just take it from current id.
             season_id = self.season_id + season_id
 
+        historical = False
         offset = 0
         for i in range(1, config.page):
             offset += self.get_next_per_page(i, config.per_page)
@@ -544,55 +1137,69 @@ class SyncBoards:
         #        "(players.fake_clan_tag IS NOT NULL AND clans.clan_tag = players.fake_clan_tag))" \
         #     if fake_clan_in_server else "clans.clan_tag = players.clan_tag"
 
-        if config.channel_id == GLOBAL_BOARDS_CHANNEL_ID:
-            query = f"""SELECT DISTINCT player_name,
-                                        players.clan_tag,
-                                        clans.emoji,
-                                        donations,
-                                        received,
-                                        trophies,
-                                        now() - last_updated AS "last_online",
-                                        CASE WHEN received = 0 THEN cast(donations as decimal)
-                                             ELSE cast(donations as decimal) / received
-                                        END ratio,
-                                        trophies - start_trophies AS "gain"
-                       FROM players
-                       INNER JOIN clans
-                       ON clans.clan_tag = players.clan_tag
-                       WHERE season_id = $1
-                       ORDER BY {'donations' if config.sort_by == 'donation' else config.sort_by} DESC
-                       NULLS LAST
-                       LIMIT $2
-                       OFFSET $3
+        if players is not None:
+            # the caller has already fetched the rows for this board, e.g. the legend archive.
+            fetch = players
+        elif config.channel_id == GLOBAL_BOARDS_CHANNEL_ID:
+            # the global board reads from the precomputed top k, so it never sorts every player in the season.
+            keys = board_players_sorting.get(config.sort_by, board_players_sorting["donations"])
+            boundary, generation = await self.get_page_boundary(config, season_id)
+            limit, skip, before = self.get_page_window(config, boundary, offset)
+            query = f"""SELECT player_name,
+                               player_tag,
+                               clan_tag,
+                               emoji,
+                               donations,
+                               received,
+                               trophies,
+                               last_updated,
+                               now() - last_updated AS "last_online",
+                               ratio,
+                               gain
+                        FROM global_board_players
+                        WHERE sort_by = $1
+                        AND season_id = $2
+                        {boundary and "AND " + get_keyset_condition(keys, 5) or ""}
+                        ORDER BY {get_order_by(keys)}
+                        LIMIT $3
+                        OFFSET $4
                     """
             fetch = await self.pool.fetch(
                 query,
+                keys[0][0],
                 season_id,
-                self.get_next_per_page(config.page, config.per_page),
-                offset
+                limit,
+                skip,
+                *(boundary or ()),
+            )
+            fetch = await self.set_page_boundaries(
+                config, season_id, generation, fetch, before, lambda row: get_keyset_values(keys, row)
             )
         elif config.type == "legend":
+            keys = legend_sorting.get(config.sort_by, legend_sorting["finishing"])
+            # boundaries from a previous legend day are for different rows.
+            boundary, generation = await self.get_page_boundary(config, season_id, since=self.legend_day)
+            limit, skip, before = self.get_page_window(config, boundary, offset)
             query = f"""
                         WITH cte AS (
-                            SELECT DISTINCT player_tag, player_name 
-                            FROM players 
-                            INNER JOIN clans 
-                            ON clans.clan_tag = players.clan_tag
-                            WHERE clans.channel_id = $1
+                            SELECT player_tag, player_name 
+                            FROM board_players 
+                            WHERE channel_id = $1
                             AND season_id = $5
                         ),
                         cte2 AS (
                             SELECT emoji, clan_tag FROM clans WHERE channel_id=$1
                         )
-                        SELECT DISTINCT cte.player_name, legend_days.clan_tag, cte2.emoji, starting, gain, loss, finishing, legend_days.attacks, legend_days.defenses
+                        SELECT cte.player_name, legend_days.player_tag, legend_days.clan_tag, cte2.emoji, starting, gain, loss, finishing, legend_days.attacks, legend_days.defenses,
+                               {keys[0][0]} AS sort_key
                         FROM legend_days 
                         INNER JOIN cte
                         ON cte.player_tag = legend_days.player_tag
                         INNER JOIN cte2 
                         ON legend_days.clan_tag = cte2.clan_tag
                         WHERE day = $2
-                        ORDER BY {config.sort_by} DESC
-                        NULLS LAST
+                        {boundary and "AND " + get_keyset_condition(keys, 6) or ""}
+                        ORDER BY {get_order_by(keys)}
                         LIMIT $3
                         OFFSET $4
                     """
@@ -600,47 +1207,45 @@ class SyncBoards:
                 query,
                 config.channel_id,
                 self.legend_day,
-                self.get_next_per_page(config.page, config.per_page),
-                offset,
+                limit,
+                skip,
                 season_id,
+                *(boundary or ()),
+            )
+            fetch = await self.set_page_boundaries(
+                config, season_id, generation, fetch, before, lambda row: [str(row['sort_key']), row['player_tag']]
             )
         elif config.type == "war":
+            keys = war_sorting.get(config.sort_by, war_sorting["stars"])
+            boundary, generation = await self.get_page_boundary(config, season_id)
+            limit, skip, before = self.get_page_window(config, boundary, offset)
+            # board_players has one row per player in the channel, so it's a primary key lookup per player.
+            # past seasons are filled in when the season is snapshotted.
             query = f"""
-                    WITH cte AS (
-                            SELECT DISTINCT player_tag, player_name 
-                            FROM players 
-                            INNER JOIN clans 
-                            ON clans.clan_tag = players.clan_tag
-                            WHERE clans.channel_id = $1
-                            AND players.season_id = $2
-                    ),
-                    cte2 AS (
-                        SELECT emoji, clan_tag FROM clans WHERE channel_id=$1
-                    )
-                    SELECT COUNT(*) as star_count, SUM(destruction) as destruction_count, cte.player_tag, cte.player_name, stars, cte2.emoji, war_attacks.clan_tag
-                    FROM war_attacks 
-                    INNER JOIN cte 
-                    ON cte.player_tag = war_attacks.player_tag 
-                    INNER JOIN seasons 
-                    ON start < load_time 
-                    AND load_time < finish
-                    LEFT JOIN cte2
-                    ON cte2.clan_tag = war_attacks.clan_tag
-                    WHERE seasons.id = $2
-                    GROUP BY cte.player_tag, cte.player_name, stars, cte2.emoji, war_attacks.clan_tag
-                    UNION ALL
-                    SELECT SUM(attacks_missed) as star_count, 0 as destruction_count, cte.player_tag, cte.player_name, -1 as stars, cte2.emoji, war_missed_attacks.clan_tag
-                    FROM war_missed_attacks
-                    INNER JOIN cte 
-                    ON cte.player_tag = war_missed_attacks.player_tag
-                    INNER JOIN seasons 
-                    ON start < load_time 
-                    AND load_time < finish
-                    LEFT JOIN cte2 
-                    ON cte2.clan_tag = war_missed_attacks.clan_tag
-                    WHERE seasons.id = $2
-                    GROUP BY cte.player_tag, cte.player_name, cte2.emoji, war_missed_attacks.clan_tag
-                    ORDER BY star_count DESC, destruction_count DESC
+                    SELECT *
+                    FROM (
+                        SELECT board_players.player_name,
+                               war_season_stats.player_tag,
+                               MIN(war_season_stats.clan_tag) AS clan_tag,
+                               MIN(clans.emoji) AS emoji,
+                               SUM(war_season_stats.stars) AS stars,
+                               SUM(war_season_stats.destruction) AS destruction,
+                               SUM(war_season_stats.three_stars) AS three_stars,
+                               SUM(war_season_stats.two_stars) AS two_stars,
+                               SUM(war_season_stats.missed) AS missed
+                        FROM war_season_stats
+                        INNER JOIN clans
+                        ON clans.clan_tag = war_season_stats.clan_tag
+                        AND clans.channel_id = $1
+                        INNER JOIN board_players
+                        ON board_players.channel_id = $1
+                        AND board_players.season_id = $2
+                        AND board_players.player_tag = war_season_stats.player_tag
+                        WHERE war_season_stats.season_id = $2
+                        GROUP BY board_players.player_name, war_season_stats.player_tag
+                    ) AS war
+                    {boundary and "WHERE " + get_keyset_condition(keys, 5) or ""}
+                    ORDER BY {get_order_by(keys)}
                     LIMIT $3
                     OFFSET $4
             """
@@ -648,39 +1253,103 @@ class SyncBoards:
                 query,
                 config.channel_id,
                 season_id,
-                self.get_next_per_page(config.page, config.per_page),
-                offset
+                limit,
+                skip,
+                *(boundary or ()),
+            )
+            fetch = await self.set_page_boundaries(
+                config, season_id, generation, fetch, before, lambda row: get_keyset_values(keys, row)
+            )
+        elif season_id == self.season_id:
+            keys = board_players_sorting.get(config.sort_by, board_players_sorting["donations"])
+            boundary, generation = await self.get_page_boundary(config, season_id)
+            limit, skip, before = self.get_page_window(config, boundary, offset)
+            query = f"""SELECT player_name,
+                               player_tag,
+                               clan_tag,
+                               fake_clan_tag,
+                               emoji,
+                               donations,
+                               received,
+                               trophies,
+                               last_updated,
+                               now() - last_updated AS "last_online",
+                               ratio,
+                               gain
+                        FROM board_players
+                        WHERE channel_id = $1
+                        AND season_id = $2
+                        {boundary and "AND " + get_keyset_condition(keys, 5) or ""}
+                        ORDER BY {get_order_by(keys)}
+                        LIMIT $3
+                        OFFSET $4
+                    """
+            fetch = await self.pool.fetch(
+                query,
+                config.channel_id,
+                season_id,
+                limit,
+                skip,
+                *(boundary or ()),
+            )
+            fetch = await self.set_page_boundaries(
+                config, season_id, generation, fetch, before, lambda row: get_keyset_values(keys, row)
             )
         else:
-            query = f"""SELECT DISTINCT player_name,
-                                        players.clan_tag,
-                                        players.fake_clan_tag,
-                                        clans.emoji,
-                                        donations,
-                                        received,
-                                        trophies,
-                                        now() - last_updated AS "last_online",
-                                        CASE WHEN received = 0 THEN cast(donations as decimal)
-                                             ELSE cast(donations as decimal) / received
-                                        END ratio,
-                                        trophies - start_trophies AS "gain"
-                       FROM players
-                       INNER JOIN clans
-                       ON clans.clan_tag = players.clan_tag
-                       WHERE clans.channel_id = $1
+            # past seasons are rendered from the snapshot taken when the season ended, if there is one.
+            query = """SELECT player_name, player_tag, clan_tag, fake_clan_tag, emoji, donations, received,
+                              trophies, last_online, ratio, gain
+                       FROM board_season_snapshots
+                       WHERE channel_id = $1
                        AND season_id = $2
-                       ORDER BY {'donations' if config.sort_by == 'donation' else config.sort_by} DESC
-                       NULLS LAST
-                       LIMIT $3
-                       OFFSET $4
+                       AND sort_by = $3
+                       AND rank > $4
+                       ORDER BY rank
+                       LIMIT $5
                     """
             fetch = await self.pool.fetch(
                 query,
                 config.channel_id,
                 season_id,
+                config.sort_by if config.sort_by in board_players_sorting else "donations",
+                offset,
                 self.get_next_per_page(config.page, config.per_page),
-                offset
             )
+            historical = bool(fetch) or await self.pool.fetchval(
+                "SELECT EXISTS(SELECT 1 FROM board_season_snapshots WHERE channel_id = $1 AND season_id = $2)",
+                config.channel_id,
+                season_id,
+            )
+            if not historical:
+                query = f"""SELECT DISTINCT player_name,
+                                            players.clan_tag,
+                                            players.fake_clan_tag,
+                                            clans.emoji,
+                                            donations,
+                                            received,
+                                            trophies,
+                                            now() - last_updated AS "last_online",
+                                            CASE WHEN received = 0 THEN cast(donations as decimal)
+                                                 ELSE cast(donations as decimal) / received
+                                            END ratio,
+                                            trophies - start_trophies AS "gain"
+                           FROM players
+                           INNER JOIN clans
+                           ON clans.clan_tag = players.clan_tag
+                           WHERE clans.channel_id = $1
+                           AND season_id = $2
+                           ORDER BY {'donations' if config.sort_by == 'donation' else config.sort_by} DESC
+                           NULLS LAST
+                           LIMIT $3
+                           OFFSET $4
+                        """
+                fetch = await self.pool.fetch(
+                    query,
+                    config.channel_id,
+                    season_id,
+                    self.get_next_per_page(config.page, config.per_page),
+                    offset
+                )
 
         if not fetch:
             return  # nothing to do/add
@@ -698,8 +1367,20 @@ class SyncBoards:
             board_type=config.type,
             session=self.session,
             coc_client=self.coc_client,
+            # a snapshot never changes, so neither does its image.
+            cache_ttl=historical and float('inf') or None,
         )
-        render = await table.make()
+        if prefetch:
+            await table.make()
+            return
+
+        try:
+            render = await table.make()
+        except httpx.HTTPError:
+            failure_counter.labels("renderer", config.type).inc()
+            raise
+
+        timings = {"query": s1 - start, **table.timings}
         s2 = (time.perf_counter() - s1)*1000
         overall = (time.perf_counter() - start)*1000
 
@@ -710,7 +1391,7 @@ class SyncBoards:
         if divert_to:
             log.info('diverting board to %s channel_id', divert_to)
             try:
-                params = discord.http.handle_message_parameters(file=discord.File(render, f'{config.type}board.png'))
+                params = discord.http.handle_message_parameters(file=discord.File(render, table.filename))
                 await self.bot.http.send_message(channel_id=divert_to, params=params)
             except Exception as e:
                 log.info('failed to send legend log to channel %s: %s', config.channel_id, e)
@@ -721,26 +1402,32 @@ class SyncBoards:
         counter.inc()
         render_histo.observe(s2/1000)
 
-        logged_board_message = await next(self.webhooks).send(
-            perf_log, file=discord.File(render, f'{config.type}board.png'), wait=True
-        )
+        if self.webhooks:
+            self.create_task(self.send_perf_log(perf_log))
+
+        filename = table.filename
         embed = discord.Embed(timestamp=discord.utils.utcnow())
-        embed.set_image(url=logged_board_message.attachments[0].url)
+        embed.set_image(url=f"attachment://{filename}")
         embed.set_footer(text="Last Updated", icon_url="https://cdn.discordapp.com/avatars/427301910291415051/8fd702a4bbec20941c72bc651279c05c.webp?size=1024")
 
+        s3 = time.perf_counter()
         try:
+            # passing the file as the message's only attachment replaces the previous render.
             params = discord.http.handle_message_parameters(
                 content=None,
                 embed=embed,
+                attachments=[discord.File(render, filename)],
             )
             await self.bot.http.edit_message(config.channel_id, config.message_id, params=params)
         except discord.NotFound:
+            failure_counter.labels("not_found", config.type).inc()
             await self.set_new_message(config)
-        except discord.HTTPException:
+        except discord.HTTPException as exc:
+            failure_counter.labels("forbidden" if isinstance(exc, discord.Forbidden) else "http", config.type).inc()
             await self.pool.execute("UPDATE boards SET toggle = FALSE WHERE channel_id = $1", config.channel_id)
 
             params = discord.http.handle_message_parameters(
-                content="Please enable `Embed Links` permission for me to update your board.",
+                content="Please enable `Embed Links` and `Attach Files` permissions for me to update your board.",
             )
             await self.bot.http.edit_message(
                 config.channel_id,
@@ -748,17 +1435,82 @@ class SyncBoards:
                 params=params
             )
         except:
+            failure_counter.labels("other", config.type).inc()
             log.exception('trying to send board for %s', config.channel_id)
+        timings["publish"] = time.perf_counter() - s3
+
+        for stage, seconds in timings.items():
+            stage_histo.labels(stage, config.type).observe(seconds)
+        if BOARD_TRACE_LOG:
+            trace_log.info(
+                "board %s (%s, channel %s, page %s): %s",
+                config.id, config.type, config.channel_id, config.page,
+                ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items()),
+            )
 
         overall_histo.observe(time.perf_counter() - start)
 
+    async def send_perf_log(self, perf_log):
+        s = time.perf_counter()
+        try:
+            await next(self.webhooks).send(perf_log)
+        except discord.HTTPException as e:
+            log.info('failed to send board perf log: %s', e)
+        stage_histo.labels("perf_log", "all").observe(time.perf_counter() - s)
+
     @tasks.loop(hours=1.0)
     async def flush_saved_board_icons(self):
         try:
-            shutil.rmtree('assets/board_icons')
-            os.makedirs('assets/board_icons')
+            removed = await board_icons.prune()
         except:
-            log.exception('failed to flush saved board icons')
+            log.exception('failed to prune saved board icons')
+        else:
+            log.info('pruned %s expired board icons, %s cached in memory', removed, len(board_icons))
+
+    @tasks.loop(seconds=GLOBAL_BOARD_REBUILD_INTERVAL)
+    async def rebuild_global_board(self):
+        # the global top k is kept up to date by refresh_global_board, but players dropping out of it leave gaps
+        # that only a rebuild fills. The advisory lock means only one syncboards process does it.
+        start = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                locked = await conn.fetchval("SELECT pg_try_advisory_xact_lock(hashtext('global_board_players'))")
+                if not locked:
+                    return
+                synced_to = await conn.fetchval("SELECT localtimestamp")
+                await conn.execute("SELECT rebuild_global_board_players($1, $2)", self.season_id, GLOBAL_BOARD_TOP_K)
+
+        self.global_board_synced_to = synced_to
+        log.info("rebuilt global board top %s in %ss", GLOBAL_BOARD_TOP_K, time.perf_counter() - start)
+
+    @tasks.loop(seconds=GLOBAL_BOARD_REFRESH_INTERVAL)
+    async def refresh_global_board(self):
+        # players.last_updated is bumped whenever the syncer sees a player change. if we haven't synced yet,
+        # anything older than the last rebuild is already in the top k.
+        query = """SELECT refresh_global_board_players(
+                       array(
+                           SELECT player_tag 
+                           FROM players 
+                           WHERE season_id = $1 
+                           AND last_updated >= COALESCE($2, localtimestamp - $3 * interval '1 second')
+                       ),
+                       $1,
+                       $4
+                   )
+                """
+        start = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                locked = await conn.fetchval("SELECT pg_try_advisory_xact_lock(hashtext('global_board_players'))")
+                if not locked:
+                    return
+                synced_to = await conn.fetchval("SELECT localtimestamp")
+                await conn.execute(
+                    query, self.season_id, self.global_board_synced_to, GLOBAL_BOARD_REBUILD_INTERVAL, GLOBAL_BOARD_TOP_K
+                )
+
+        self.global_board_synced_to = synced_to
+        stage_histo.labels("global_refresh", "global").observe(time.perf_counter() - start)
 
     @tasks.loop(seconds=5.0)
     async def legend_board_reset(self):
@@ -777,36 +1529,109 @@ class SyncBoards:
             if not self.start_loops:
                 return
 
-            fetch = await self.pool.fetch("SELECT * FROM boards WHERE toggle=True AND type='legend' AND divert_to_channel_id is not null")
-            log.info("Legend board archiving for %s boards", len(fetch))
-            for row in fetch:
+            closed_day = self.legend_day
+            self.legend_day = tomorrow
+
+            # only one syncboards process resets and archives the legend boards.
+            async with self.pool.acquire() as conn:
+                locked = await conn.fetchval("SELECT pg_try_advisory_lock(hashtext('legend_board_reset'))")
+                if not locked:
+                    log.info("legend boards are being reset by another process")
+                    return
                 try:
-                    config = BoardConfig(record=row, bot=self.bot)
-                    # we just want to fool the update function to show all the players.
-                    config.page = 1
-                    config.per_page = 200
-                    config.sort_by = 'finishing'
+                    # start the new day before archiving, so live boards and the syncer aren't held up by the archive.
+                    query = """INSERT INTO legend_days (player_tag, day, starting, gain, loss, finishing) 
+                               SELECT player_tag, $1, trophies, 0, 0, trophies
+                               FROM players
+                               WHERE season_id = $2
+                               AND league_id = 29000022
+                               ON CONFLICT (player_tag, day)
+                               DO NOTHING;
+                            """
+                    try:
+                        await conn.execute(query, tomorrow, self.season_id)
+                        await conn.execute("DELETE FROM board_page_keys WHERE type = 'legend'")
+                    except:
+                        log.exception('resetting legend players trophies')
+
+                    await self.archive_legend_boards(closed_day)
+                finally:
+                    await conn.execute("SELECT pg_advisory_unlock(hashtext('legend_board_reset'))")
+
+        except:
+            log.exception('resetting legend boards')
+
+    async def archive_legend_boards(self, day):
+        start = time.perf_counter()
+        boards = await self.pool.fetch("SELECT * FROM boards WHERE toggle=True AND type='legend' AND divert_to_channel_id is not null")
+        if not boards:
+            return
 
-                    await self.update_board(config, divert_to=row['divert_to_channel_id'] or config.channel_id)
+        # mark each board's day as archived first, so it's only ever posted once however many processes get here.
+        query = """INSERT INTO legend_board_archives (channel_id, day) 
+                   SELECT unnest($1::bigint[]), $2 
+                   ON CONFLICT (channel_id, day) 
+                   DO NOTHING 
+                   RETURNING channel_id
+                """
+        claimed = {row['channel_id'] for row in await self.pool.fetch(query, [row['channel_id'] for row in boards], day)}
+        boards = [row for row in boards if row['channel_id'] in claimed]
+        if not boards:
+            log.info("Legend boards for %s have already been archived", day)
+            return
 
+        # snapshot the closed day for every board at once, rather than a query per board.
+        query = """SELECT board_players.channel_id,
+                          board_players.player_name,
+                          legend_days.player_tag,
+                          legend_days.clan_tag,
+                          clans.emoji,
+                          starting,
+                          gain,
+                          loss,
+                          finishing,
+                          legend_days.attacks,
+                          legend_days.defenses
+                   FROM legend_days
+                   INNER JOIN board_players
+                   ON board_players.player_tag = legend_days.player_tag
+                   AND board_players.season_id = $2
+                   AND board_players.channel_id = ANY($3::bigint[])
+                   INNER JOIN clans
+                   ON clans.channel_id = board_players.channel_id
+                   AND clans.clan_tag = legend_days.clan_tag
+                   WHERE day = $1
+                   ORDER BY finishing DESC NULLS LAST
+                """
+        fetch = await self.pool.fetch(query, day, self.season_id, [row['channel_id'] for row in boards])
+        players = {}
+        for row in fetch:
+            players.setdefault(row['channel_id'], []).append(row)
+
+        log.info("Legend board archiving for %s boards, %s players", len(boards), len(fetch))
+        semaphore = asyncio.Semaphore(LEGEND_ARCHIVE_CONCURRENCY)
+
+        async def archive(row):
+            config = BoardConfig(record=row, bot=self.bot)
+            config.page = 1
+            config.sort_by = 'finishing'
+            async with semaphore:
+                try:
+                    await self.update_board(
+                        config,
+                        divert_to=row['divert_to_channel_id'] or config.channel_id,
+                        players=players.get(config.channel_id, [])[:200],
+                    )
                 except (discord.Forbidden, discord.NotFound, discord.HTTPException):
-                    continue
+                    pass
+                except:
+                    log.exception('archiving legend board for %s', config.channel_id)
 
-            query = """INSERT INTO legend_days (player_tag, day, starting, gain, loss, finishing) 
-                       SELECT player_tag, $1, trophies, 0, 0, trophies
-                       FROM players
-                       WHERE season_id = $2
-                       AND league_id = 29000022
-                       ON CONFLICT (player_tag, day)
-                       DO NOTHING;
-                    """
-            try:
-                await self.pool.execute(query, tomorrow, self.season_id)
-            except:
-                log.exception('resetting legend players trophies')
+        await asyncio.gather(*(archive(row) for row in boards))
 
-        except:
-            log.exception('resetting legend boards')
+        duration = time.perf_counter() - start
+        legend_archive_gauge.set(duration)
+        log.info("Legend board archiving for %s boards took %ss", len(boards), duration)
 
 
 async def main():
@@ -823,7 +1648,7 @@ async def main():
 
     # async with stateless_bot:
 
-    await start_http_server(port=8001)
+    await start_http_server(port=int(sys.argv[1]) if len(sys.argv) > 1 else BOARD_METRICS_PORT)
 
     client = coc.Client(key_names="donbot_syncer")
     await client.login(creds.email, creds.password)
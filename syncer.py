@@ -23,6 +23,7 @@ from bot import setup_db
 from cogs.utils.donationtrophylogs import SlimDonationEvent2, SlimTrophyEvent, get_basic_log, get_detailed_log, format_trophy_log_message, get_events_fmt
 from cogs.utils.db_objects import LogConfig
 from cogs.utils.formatters import LineWrapper
+from cogs.utils.profiles import UPSERT_PLAYER_PROFILES, profile_record, save_achievement_info
 
 
 log = logging.getLogger(__name__)
@@ -48,6 +49,12 @@ bot = commands.Bot(command_prefix="+", intents=intents)
 EVENTS_BEFORE_REFRESHING_BOARD = 10
 EVENTS_BEFORE_REFRESHING_LEGEND_BOARD = 3
 
+# player profiles for the stats commands are refreshed this many at a time, once a minute,
+# for players in guilds that have used a command recently.
+PLAYER_PROFILE_BATCH = 300
+PLAYER_PROFILE_MAX_AGE = datetime.timedelta(hours=6)
+PLAYER_PROFILE_ACTIVE_FOR = datetime.timedelta(days=14)
+
 
 class Syncer:
     def __init__(self, pool, coc_client):
@@ -110,6 +117,9 @@ class Syncer:
 
         self.load_wars.start()
 
+        self.refresh_player_profiles.add_exception_type(Exception)
+        self.refresh_player_profiles.start()
+
     # @coc_client.event
     @coc.ClientEvents.event_error()
     async def on_event_error(self, exception):
@@ -161,6 +171,14 @@ class Syncer:
 
         await self.safe_send(594286547449282587, "Syncer has added players :ok_hand:")
 
+        # last season's boards won't change any more, so historical boards can be rendered from a snapshot.
+        try:
+            await self.pool.execute("SELECT snapshot_board_season($1)", self.season_id - 1)
+        except:
+            log.exception("failed to snapshot boards for season %s", self.season_id - 1)
+        else:
+            await self.safe_send(594286547449282587, "Syncer has saved last season's boards :ok_hand:")
+
     async def add_temp_events(self, log_type, channel_id, fmt):
         query = """INSERT INTO tempevents (channel_id, fmt, type) VALUES ($1, $2, $3)"""
         await self.pool.execute(query, channel_id, fmt, log_type)
@@ -867,6 +885,38 @@ class Syncer:
         await self.pool.execute(query, to_insert)
         log.info(f'Loop for event updates finished. Took {(time.perf_counter() - start)*1000}ms')
 
+    @tasks.loop(minutes=1)
+    async def refresh_player_profiles(self):
+        query = """SELECT player_tag
+                   FROM (
+                       SELECT DISTINCT players.player_tag, player_profiles.updated
+                       FROM players
+                       INNER JOIN clans
+                       ON clans.clan_tag = players.clan_tag
+                       LEFT JOIN player_profiles
+                       ON player_profiles.player_tag = players.player_tag
+                       WHERE players.season_id = $1
+                       AND clans.guild_id IN (SELECT DISTINCT guild_id FROM commands WHERE used > now() - $2::interval)
+                       AND (player_profiles.updated IS NULL OR player_profiles.updated < now() - $3::interval)
+                   ) AS stale
+                   ORDER BY updated NULLS FIRST
+                   LIMIT $4
+                """
+        fetch = await self.pool.fetch(query, self.season_id, PLAYER_PROFILE_ACTIVE_FOR, PLAYER_PROFILE_MAX_AGE, PLAYER_PROFILE_BATCH)
+        if not fetch:
+            return
+
+        start = time.perf_counter()
+        to_insert = []
+        async for player in self.coc_client.get_players((n[0] for n in fetch), update_cache=False):
+            to_insert.append(profile_record(player))
+            await asyncio.sleep(0.05)
+
+        if to_insert:
+            await self.pool.execute(UPSERT_PLAYER_PROFILES, to_insert)
+            await save_achievement_info(self.pool)
+        log.debug('refreshed %s player profiles in %sms', len(to_insert), (time.perf_counter() - start) * 1000)
+
     #
     # async def on_clan_member_league_change(old_league, new_league, player, clan):
     #     if old_league.id > new_league.id:
@@ -951,6 +1001,7 @@ class Syncer:
             member.legend_statistics and member.legend_statistics.legend_trophies or 0
         )
         log.debug(f"ran player joined for player {member} of clan {clan}")
+        await self.notify_clan_members(clan.tag)
         return
         player = await self.coc_client.get_player(member.tag)
         player_query = """INSERT INTO players (
@@ -1048,6 +1099,11 @@ class Syncer:
     async def on_clan_member_leave(self, member, clan):
         query = "UPDATE players SET clan_tag = null where player_tag = $1 AND season_id = $2"
         await self.pool.execute(query, member.tag, self.season_id)
+        await self.notify_clan_members(clan.tag)
+
+    async def notify_clan_members(self, clan_tag):
+        # the bot caches clans (and their members) for name lookups, this lets it know they're out of date.
+        await self.pool.execute("SELECT pg_notify('clan_members', $1)", clan_tag)
 
     # @tasks.loop(seconds=60.0)
     # async def update_clan_tags(self):
@@ -413,75 +413,1055 @@ end;
 $function$
 ;
 
-CREATE OR REPLACE FUNCTION public.get_activity_to_sync()
-RETURNS TABLE (
-    player_tag TEXT,
-    clan_tag TEXT,
-    timer TIMESTAMP,
-    num_events INTEGER,
-    "hour" DOUBLE PRECISION
-)
-LANGUAGE plpgsql
+-- one row per sync_activity() run. the last run's synced_to is where the next one starts from.
+CREATE TABLE activity_sync_runs (
+    id serial PRIMARY KEY,
+
+    started TIMESTAMP NOT NULL,
+    synced_from TIMESTAMP,
+    synced_to TIMESTAMP NOT NULL,
+    events_processed INTEGER NOT NULL,
+    rows_inserted INTEGER NOT NULL,
+    duration INTERVAL NOT NULL
+);
+create index donationevents_time_idx on donationevents (time);
+create index trophyevents_time_idx on trophyevents (time);
+
+CREATE OR REPLACE FUNCTION public.sync_activity()
+ RETURNS activity_sync_runs
+ LANGUAGE plpgsql
+AS $function$
+declare
+    run activity_sync_runs;
+    started TIMESTAMP := clock_timestamp();
+    watermark TIMESTAMP;
+    -- only whole hours are synced, so an hour is never split between two runs.
+    upto TIMESTAMP := date_trunc('HOUR', now());
+    events INTEGER;
+    inserted INTEGER;
+begin
+    PERFORM pg_advisory_xact_lock(hashtext('sync_activity'));
+
+    SELECT synced_to INTO watermark FROM activity_sync_runs ORDER BY id DESC LIMIT 1;
+
+    WITH g_clans AS (
+        SELECT DISTINCT clans.clan_tag
+        FROM clans
+        INNER JOIN guilds
+        ON clans.guild_id = guilds.guild_id
+        WHERE guilds.activity_sync = TRUE
+    ),
+    donations AS (
+        SELECT donationevents.player_tag,
+               donationevents.clan_tag,
+               date_trunc('HOUR', "time") AS "timer",
+               COUNT(*) AS "counter"
+        FROM donationevents
+        INNER JOIN g_clans ON g_clans.clan_tag = donationevents.clan_tag
+        WHERE donationevents."time" >= COALESCE(watermark, '-infinity')
+        AND donationevents."time" < upto
+        GROUP BY timer, donationevents.player_tag, donationevents.clan_tag
+    ),
+    trophies AS (
+        SELECT trophyevents.player_tag,
+               trophyevents.clan_tag,
+               date_trunc('HOUR', "time") AS "timer",
+               COUNT(*) AS "counter"
+        FROM trophyevents
+        INNER JOIN g_clans ON g_clans.clan_tag = trophyevents.clan_tag
+        WHERE trophyevents.league_id = 29000022
+        AND trophyevents.trophy_change > 0
+        AND trophyevents."time" >= COALESCE(watermark, '-infinity')
+        AND trophyevents."time" < upto
+        GROUP BY timer, trophyevents.player_tag, trophyevents.clan_tag
+    ),
+    combined AS (
+        SELECT COALESCE(donations.player_tag, trophies.player_tag) AS player_tag,
+               COALESCE(donations.clan_tag, trophies.clan_tag) AS clan_tag,
+               COALESCE(donations.timer, trophies.timer) AS timer,
+               COALESCE(donations.counter, 0) + COALESCE(trophies.counter, 0) AS num_events
+        FROM donations
+        FULL JOIN trophies
+        ON donations.player_tag = trophies.player_tag
+        AND donations.clan_tag = trophies.clan_tag
+        AND donations.timer = trophies.timer
+    ),
+    inserted_rows AS (
+        -- hours syncer already recorded live are left alone
+        INSERT INTO activity_query (player_tag, clan_tag, hour_time, counter, hour_digit)
+        SELECT player_tag, clan_tag, timer, num_events, date_part('HOUR', timer)
+        FROM combined
+        ON CONFLICT DO NOTHING
+        RETURNING 1
+    )
+    SELECT (SELECT COALESCE(SUM(num_events), 0) FROM combined), (SELECT COUNT(*) FROM inserted_rows)
+    INTO events, inserted;
+
+    INSERT INTO activity_sync_runs (started, synced_from, synced_to, events_processed, rows_inserted, duration)
+    VALUES (started, watermark, upto, events, inserted, clock_timestamp() - started)
+    RETURNING * INTO run;
+
+    return run;
+end;
+$function$
+;
+
+-- board update notifications. syncboards LISTENs on these instead of polling the boards table.
+CREATE OR REPLACE FUNCTION public.notify_board_update()
+ RETURNS trigger
+ LANGUAGE plpgsql
 AS $function$
 begin
-    CREATE TABLE tempdonationstats (
-        player_tag TEXT,
-        clan_tag TEXT,
-        timer TIMESTAMP,
-        counter INTEGER
+    if NEW.toggle then
+        perform pg_notify('board_update', NEW.id::text);
+    end if;
+    return NEW;
+end;
+$function$
+;
+
+CREATE TRIGGER board_update_notify
+AFTER INSERT OR UPDATE OF need_to_update, toggle ON boards
+FOR EACH ROW
+WHEN (NEW.need_to_update = TRUE)
+EXECUTE FUNCTION public.notify_board_update();
+
+-- statement level, so adding or removing a batch of clans sends one notification per guild, not per clan.
+CREATE OR REPLACE FUNCTION public.notify_clans_update()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+declare
+    guild BIGINT;
+begin
+    FOR guild IN SELECT DISTINCT guild_id FROM changed_clans LOOP
+        perform pg_notify('clans_update', guild::text);
+    END LOOP;
+    return NULL;
+end;
+$function$
+;
+
+CREATE TRIGGER clans_update_notify_insert
+AFTER INSERT ON clans
+REFERENCING NEW TABLE AS changed_clans
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.notify_clans_update();
+
+CREATE TRIGGER clans_update_notify_update
+AFTER UPDATE ON clans
+REFERENCING NEW TABLE AS changed_clans
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.notify_clans_update();
+
+CREATE TRIGGER clans_update_notify_delete
+AFTER DELETE ON clans
+REFERENCING OLD TABLE AS changed_clans
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.notify_clans_update();
+
+-- board work queue leases, so more than one syncboards process can render boards.
+alter table boards add column claimed_by text;
+alter table boards add column claim_expires timestamptz;
+create index boards_need_to_update_idx on boards (id) where need_to_update = true;
+create index boards_claim_expires_idx on boards (claim_expires) where claim_expires is not null;
+
+-- per-channel leaderboard rows for donation and trophy boards.
+-- one row per (channel, season, player), with an index per sort key so a board page is a range read
+-- rather than a sort of every player in the channel. kept up to date by the triggers below.
+create table board_players (
+    channel_id bigint,
+    season_id integer,
+    player_tag text,
+    player_name text,
+    clan_tag text,
+    fake_clan_tag text,
+    emoji text,
+    donations integer not null default 0,
+    received integer not null default 0,
+    ratio decimal not null default 0,
+    trophies integer not null default 0,
+    gain integer not null default 0,
+    last_updated timestamp,
+    primary key (channel_id, season_id, player_tag)
+);
+create index board_players_player_tag_idx on board_players (player_tag, season_id);
+create index board_players_donations_idx on board_players (channel_id, season_id, donations desc, player_tag);
+create index board_players_received_idx on board_players (channel_id, season_id, received desc, player_tag);
+create index board_players_ratio_idx on board_players (channel_id, season_id, ratio desc, player_tag);
+create index board_players_trophies_idx on board_players (channel_id, season_id, trophies desc, player_tag);
+create index board_players_gain_idx on board_players (channel_id, season_id, gain desc, player_tag);
+create index board_players_last_updated_idx on board_players (channel_id, season_id, last_updated desc nulls last, player_name desc, player_tag);
+
+CREATE OR REPLACE FUNCTION public.refresh_board_players(tags TEXT[], season INTEGER)
+ RETURNS void
+ LANGUAGE plpgsql
+AS $function$
+begin
+    DELETE FROM board_players
+    WHERE board_players.player_tag = ANY(tags)
+    AND board_players.season_id = season
+    AND NOT EXISTS (
+        SELECT 1
+        FROM players
+        INNER JOIN clans
+        ON clans.clan_tag = players.clan_tag
+        WHERE players.player_tag = board_players.player_tag
+        AND players.season_id = season
+        AND clans.channel_id = board_players.channel_id
     );
 
-    CREATE TABLE temptrophystats (
-        player_tag TEXT,
-        clan_tag TEXT,
-        timer TIMESTAMP,
-        counter INTEGER
+    INSERT INTO board_players (channel_id, season_id, player_tag, player_name, clan_tag, fake_clan_tag, emoji,
+                               donations, received, ratio, trophies, gain, last_updated)
+    SELECT DISTINCT ON (clans.channel_id, players.player_tag)
+           clans.channel_id,
+           players.season_id,
+           players.player_tag,
+           players.player_name,
+           players.clan_tag,
+           players.fake_clan_tag,
+           clans.emoji,
+           COALESCE(players.donations, 0),
+           COALESCE(players.received, 0),
+           CASE WHEN COALESCE(players.received, 0) = 0 THEN cast(COALESCE(players.donations, 0) as decimal)
+                ELSE cast(COALESCE(players.donations, 0) as decimal) / players.received
+           END,
+           COALESCE(players.trophies, 0),
+           COALESCE(players.trophies, 0) - COALESCE(players.start_trophies, 0),
+           players.last_updated
+    FROM players
+    INNER JOIN clans
+    ON clans.clan_tag = players.clan_tag
+    WHERE players.player_tag = ANY(tags)
+    AND players.season_id = season
+    ON CONFLICT (channel_id, season_id, player_tag)
+    DO UPDATE SET player_name = excluded.player_name,
+                  clan_tag = excluded.clan_tag,
+                  fake_clan_tag = excluded.fake_clan_tag,
+                  emoji = excluded.emoji,
+                  donations = excluded.donations,
+                  received = excluded.received,
+                  ratio = excluded.ratio,
+                  trophies = excluded.trophies,
+                  gain = excluded.gain,
+                  last_updated = excluded.last_updated;
+end;
+$function$
+;
+
+CREATE OR REPLACE FUNCTION public.rebuild_board_players(channel BIGINT, season INTEGER)
+ RETURNS void
+ LANGUAGE plpgsql
+AS $function$
+begin
+    DELETE FROM board_players WHERE channel_id = channel AND season_id = season;
+    PERFORM public.refresh_board_players(
+        array(
+            SELECT DISTINCT players.player_tag
+            FROM players
+            INNER JOIN clans
+            ON clans.clan_tag = players.clan_tag
+            WHERE clans.channel_id = channel
+            AND players.season_id = season
+        ),
+        season
     );
+end;
+$function$
+;
 
-    CREATE TABLE g_clans (clan_tag TEXT);
-
-    INSERT INTO g_clans
-    SELECT distinct clans.clan_tag
-    FROM clans
-    INNER JOIN guilds
-    ON clans.guild_id = guilds.guild_id
-    WHERE guilds.activity_sync = TRUE;
-
-    INSERT INTO tempdonationstats
-    SELECT donationevents.player_tag,
-           donationevents.clan_tag,
-           date_trunc('HOUR', "time") AS "timer",
-           COUNT(*) AS "counter"
-    FROM donationevents
-    INNER JOIN g_clans ON g_clans.clan_tag = donationevents.clan_tag
-    GROUP BY timer, donationevents.player_tag, donationevents.clan_tag;
-
-    INSERT INTO temptrophystats
-    SELECT trophyevents.player_tag,
-           trophyevents.clan_tag,
-           date_trunc('HOUR', "time") AS "timer",
-           COUNT(*) AS "counter"
-    FROM trophyevents
-    INNER JOIN g_clans ON g_clans.clan_tag = trophyevents.clan_tag
-    WHERE trophyevents.league_id = 29000022
-    AND trophyevents.trophy_change > 0
-    GROUP BY timer, trophyevents.player_tag, trophyevents.clan_tag;
-
-    RETURN QUERY
-    SELECT tempdonationstats.player_tag,
-           tempdonationstats.clan_tag,
-           tempdonationstats.timer,
-           COALESCE(tempdonationstats.counter, 0) + COALESCE(temptrophystats.counter, 0) as "num_events",
-           date_part('hour', tempdonationstats.timer) as "hour"
-    FROM tempdonationstats
-    FULL JOIN temptrophystats
-    ON tempdonationstats.player_tag = temptrophystats.player_tag
-    AND tempdonationstats.clan_tag = temptrophystats.clan_tag
-    AND tempdonationstats.timer = temptrophystats.timer
-    GROUP BY tempdonationstats.player_tag, tempdonationstats.clan_tag, tempdonationstats.timer, "num_events", "hour";
-
-END;
+-- statement level, so the syncer's bulk inserts refresh every new player in one go.
+CREATE OR REPLACE FUNCTION public.board_players_players_changed()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+declare
+    season INTEGER;
+begin
+    FOR season IN SELECT DISTINCT season_id FROM changed_players LOOP
+        PERFORM public.refresh_board_players(
+            array(SELECT DISTINCT player_tag FROM changed_players WHERE season_id = season), season
+        );
+    END LOOP;
+    return NULL;
+end;
+$function$
+;
+
+CREATE TRIGGER board_players_insert
+AFTER INSERT ON players
+REFERENCING NEW TABLE AS changed_players
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.board_players_players_changed();
+
+-- the syncer updates every player it sees, so updates only refresh the players whose board columns changed.
+-- an UPDATE OF column list can't be used with transition tables, so the old and new rows are compared instead.
+-- last_updated changes on its own (the syncer's last online batches) are copied straight across.
+CREATE OR REPLACE FUNCTION public.board_players_players_updated()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+declare
+    season INTEGER;
+    tags TEXT[];
+begin
+    FOR season, tags IN
+        SELECT changed.season_id, array_agg(DISTINCT changed.player_tag)
+        FROM (
+            SELECT n.season_id, n.player_tag
+            FROM new_players AS n
+            INNER JOIN old_players AS o
+            ON o.id = n.id
+            WHERE (n.player_tag, n.season_id, n.player_name, n.clan_tag, n.fake_clan_tag,
+                   n.donations, n.received, n.trophies, n.start_trophies)
+            IS DISTINCT FROM (o.player_tag, o.season_id, o.player_name, o.clan_tag, o.fake_clan_tag,
+                              o.donations, o.received, o.trophies, o.start_trophies)
+            UNION
+            -- a player moved to another season or tag has to be removed from the old one.
+            SELECT o.season_id, o.player_tag
+            FROM new_players AS n
+            INNER JOIN old_players AS o
+            ON o.id = n.id
+            WHERE (n.player_tag, n.season_id) IS DISTINCT FROM (o.player_tag, o.season_id)
+        ) AS changed
+        GROUP BY changed.season_id
+    LOOP
+        PERFORM public.refresh_board_players(tags, season);
+    END LOOP;
+
+    UPDATE board_players
+    SET last_updated = n.last_updated
+    FROM new_players AS n
+    INNER JOIN old_players AS o
+    ON o.id = n.id
+    WHERE n.last_updated IS DISTINCT FROM o.last_updated
+    AND board_players.player_tag = n.player_tag
+    AND board_players.season_id = n.season_id
+    AND board_players.last_updated IS DISTINCT FROM n.last_updated;
+
+    return NULL;
+end;
+$function$
+;
+
+CREATE TRIGGER board_players_update
+AFTER UPDATE ON players
+REFERENCING OLD TABLE AS old_players NEW TABLE AS new_players
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.board_players_players_updated();
+
+CREATE TRIGGER board_players_delete
+AFTER DELETE ON players
+REFERENCING OLD TABLE AS changed_players
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.board_players_players_changed();
+
+-- statement level, so adding or removing a batch of clans rebuilds each channel once. updates only rebuild the
+-- channels where a clan's tag, channel or emoji changed.
+CREATE OR REPLACE FUNCTION public.board_players_clans_changed()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+declare
+    season INTEGER;
+    channels BIGINT[];
+    channel BIGINT;
+begin
+    SELECT id INTO season FROM seasons WHERE start < now() ORDER BY start DESC LIMIT 1;
+    if TG_OP = 'INSERT' then
+        channels := array(SELECT DISTINCT channel_id FROM new_clans WHERE channel_id IS NOT NULL);
+    elsif TG_OP = 'DELETE' then
+        channels := array(SELECT DISTINCT channel_id FROM old_clans WHERE channel_id IS NOT NULL);
+    else
+        channels := array(
+            SELECT DISTINCT channel_id
+            FROM (
+                (SELECT clan_tag, channel_id, emoji FROM new_clans EXCEPT SELECT clan_tag, channel_id, emoji FROM old_clans)
+                UNION ALL
+                (SELECT clan_tag, channel_id, emoji FROM old_clans EXCEPT SELECT clan_tag, channel_id, emoji FROM new_clans)
+            ) AS changed
+            WHERE channel_id IS NOT NULL
+        );
+    end if;
+
+    FOREACH channel IN ARRAY channels LOOP
+        PERFORM public.rebuild_board_players(channel, season);
+    END LOOP;
+    return NULL;
+end;
+$function$
+;
+
+CREATE TRIGGER board_players_clans_insert
+AFTER INSERT ON clans
+REFERENCING NEW TABLE AS new_clans
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.board_players_clans_changed();
+
+CREATE TRIGGER board_players_clans_update
+AFTER UPDATE ON clans
+REFERENCING OLD TABLE AS old_clans NEW TABLE AS new_clans
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.board_players_clans_changed();
+
+CREATE TRIGGER board_players_clans_delete
+AFTER DELETE ON clans
+REFERENCING OLD TABLE AS old_clans
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.board_players_clans_changed();
+
+-- initial build for the current season
+SELECT public.rebuild_board_players(channel_id, (SELECT id FROM seasons WHERE start < now() ORDER BY start DESC LIMIT 1))
+FROM (SELECT DISTINCT channel_id FROM clans) AS x;
+
+-- the sort key of the last row on each board page, so the next page can seek past it instead of using OFFSET.
+-- a key is only used in the generation it was found in, which is when the board was last claimed for a refresh
+-- (boards.last_refresh).
+create table board_page_keys (
+    channel_id bigint,
+    type text,
+    season_id integer,
+    sort_by text,
+    page integer,
+    last_key jsonb,
+    generation timestamptz,
+    written timestamptz not null default now(),
+    primary key (channel_id, type, season_id, sort_by, page),
+    foreign key (channel_id, type) references boards (channel_id, type) on update cascade on delete cascade
+);
+alter table boards add column last_refresh timestamptz;
+
+-- one row per player per season, with everything a leaderboard shows.
+CREATE OR REPLACE VIEW global_player_stats AS
+SELECT DISTINCT ON (players.season_id, players.player_tag)
+       players.season_id,
+       players.player_tag,
+       players.player_name,
+       players.clan_tag,
+       clans.emoji,
+       COALESCE(players.donations, 0) AS donations,
+       COALESCE(players.received, 0) AS received,
+       CASE WHEN COALESCE(players.received, 0) = 0 THEN cast(COALESCE(players.donations, 0) as decimal)
+            ELSE cast(COALESCE(players.donations, 0) as decimal) / players.received
+       END AS ratio,
+       COALESCE(players.trophies, 0) AS trophies,
+       COALESCE(players.trophies, 0) - COALESCE(players.start_trophies, 0) AS gain,
+       players.last_updated
+FROM players
+INNER JOIN clans
+ON clans.clan_tag = players.clan_tag;
+
+-- the top k players across every tracked clan, for each leaderboard sort key (sort_by is the column name).
+create table global_board_players (
+    sort_by text,
+    season_id integer,
+    player_tag text,
+    player_name text,
+    clan_tag text,
+    emoji text,
+    donations integer not null default 0,
+    received integer not null default 0,
+    ratio decimal not null default 0,
+    trophies integer not null default 0,
+    gain integer not null default 0,
+    last_updated timestamp,
+    primary key (sort_by, season_id, player_tag)
+);
+
+-- incrementally keeps the top k up to date for players that changed. syncboards runs it every minute for the
+-- players updated since its last run. A player that drops out of the top k can leave a gap that is only filled
+-- by the next rebuild_global_board_players.
+CREATE OR REPLACE FUNCTION public.refresh_global_board_players(tags TEXT[], season INTEGER, k INTEGER DEFAULT 500)
+ RETURNS void
+ LANGUAGE plpgsql
+AS $function$
+declare
+    key TEXT;
+    order_by TEXT;
+begin
+    -- these are the ORDER BYs of syncboards.board_players_sorting, so the top k is the rows the board shows.
+    FOR key, order_by IN SELECT * FROM (VALUES
+        ('donations', 'donations DESC, player_tag'),
+        ('received', 'received DESC, player_tag'),
+        ('ratio', 'ratio DESC, player_tag'),
+        ('trophies', 'trophies DESC, player_tag'),
+        ('gain', 'gain DESC, player_tag'),
+        ('last_updated', 'last_updated DESC NULLS LAST, player_name DESC, player_tag')
+    ) AS sorts LOOP
+        DELETE FROM global_board_players WHERE sort_by = key AND season_id = season AND player_tag = ANY(tags);
+
+        EXECUTE format($query$
+            INSERT INTO global_board_players (sort_by, season_id, player_tag, player_name, clan_tag, emoji,
+                                              donations, received, ratio, trophies, gain, last_updated)
+            SELECT $1, season_id, player_tag, player_name, clan_tag, emoji,
+                   donations, received, ratio, trophies, gain, last_updated
+            FROM global_player_stats AS candidates
+            WHERE player_tag = ANY($2)
+            AND season_id = $3
+            AND candidates.%1$I IS NOT NULL
+            AND (
+                (SELECT count(*) FROM global_board_players WHERE sort_by = $1 AND season_id = $3) < $4
+                OR candidates.%1$I >= (SELECT min(%1$I) FROM global_board_players WHERE sort_by = $1 AND season_id = $3)
+            )
+        $query$, key) USING key, tags, season, k;
+
+        EXECUTE format($query$
+            DELETE FROM global_board_players
+            WHERE sort_by = $1
+            AND season_id = $2
+            AND player_tag IN (
+                SELECT player_tag FROM global_board_players
+                WHERE sort_by = $1 AND season_id = $2
+                ORDER BY %s
+                OFFSET $3
+            )
+        $query$, order_by) USING key, season, k;
+    END LOOP;
+end;
+$function$
+;
+
+CREATE OR REPLACE FUNCTION public.rebuild_global_board_players(season INTEGER, k INTEGER DEFAULT 500)
+ RETURNS void
+ LANGUAGE plpgsql
+AS $function$
+declare
+    key TEXT;
+    order_by TEXT;
+begin
+    DELETE FROM global_board_players WHERE season_id = season;
+    -- these are the ORDER BYs of syncboards.board_players_sorting, so the top k is the rows the board shows.
+    FOR key, order_by IN SELECT * FROM (VALUES
+        ('donations', 'donations DESC, player_tag'),
+        ('received', 'received DESC, player_tag'),
+        ('ratio', 'ratio DESC, player_tag'),
+        ('trophies', 'trophies DESC, player_tag'),
+        ('gain', 'gain DESC, player_tag'),
+        ('last_updated', 'last_updated DESC NULLS LAST, player_name DESC, player_tag')
+    ) AS sorts LOOP
+        EXECUTE format($query$
+            INSERT INTO global_board_players (sort_by, season_id, player_tag, player_name, clan_tag, emoji,
+                                              donations, received, ratio, trophies, gain, last_updated)
+            SELECT $1, season_id, player_tag, player_name, clan_tag, emoji,
+                   donations, received, ratio, trophies, gain, last_updated
+            FROM global_player_stats
+            WHERE season_id = $2
+            AND %1$I IS NOT NULL
+            ORDER BY %2$s
+            LIMIT $3
+        $query$, key, order_by) USING key, season, k;
+    END LOOP;
+end;
 $function$
 ;
 
-CREATE OR REPLACE FUNCTION "public".get_donationlog_channels()
+SELECT public.rebuild_global_board_players((SELECT id FROM seasons WHERE start < now() ORDER BY start DESC LIMIT 1));
+
+-- war totals per player per clan per season, kept up to date as war results are saved so war boards don't
+-- have to aggregate every attack in the season.
+create table war_season_stats (
+    season_id integer,
+    clan_tag text,
+    player_tag text,
+    stars integer not null default 0,
+    destruction decimal not null default 0,
+    three_stars integer not null default 0,
+    two_stars integer not null default 0,
+    attacks integer not null default 0,
+    missed integer not null default 0,
+    primary key (season_id, clan_tag, player_tag)
+);
+create index war_season_stats_clan_idx on war_season_stats (clan_tag, season_id, stars desc, destruction desc);
+-- war boards find their clans by channel, then their players in board_players by primary key.
+create index clans_channel_id_idx on clans (channel_id, clan_tag);
+
+CREATE OR REPLACE FUNCTION public.war_season_stats_attacks_inserted()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+begin
+    INSERT INTO war_season_stats (season_id, clan_tag, player_tag, stars, destruction, three_stars, two_stars, attacks)
+    SELECT seasons.id,
+           new_attacks.clan_tag,
+           new_attacks.player_tag,
+           SUM(new_attacks.stars),
+           SUM(new_attacks.destruction),
+           COUNT(*) FILTER (WHERE new_attacks.stars = 3),
+           COUNT(*) FILTER (WHERE new_attacks.stars = 2),
+           COUNT(*)
+    FROM new_attacks
+    INNER JOIN seasons
+    ON seasons.start < new_attacks.load_time
+    AND new_attacks.load_time < seasons.finish
+    GROUP BY seasons.id, new_attacks.clan_tag, new_attacks.player_tag
+    ON CONFLICT (season_id, clan_tag, player_tag)
+    DO UPDATE SET stars = war_season_stats.stars + excluded.stars,
+                  destruction = war_season_stats.destruction + excluded.destruction,
+                  three_stars = war_season_stats.three_stars + excluded.three_stars,
+                  two_stars = war_season_stats.two_stars + excluded.two_stars,
+                  attacks = war_season_stats.attacks + excluded.attacks;
+    return NULL;
+end;
+$function$
+;
+
+CREATE TRIGGER war_season_stats_attacks
+AFTER INSERT ON war_attacks
+REFERENCING NEW TABLE AS new_attacks
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.war_season_stats_attacks_inserted();
+
+CREATE OR REPLACE FUNCTION public.war_season_stats_missed_inserted()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+begin
+    INSERT INTO war_season_stats (season_id, clan_tag, player_tag, missed)
+    SELECT seasons.id, new_missed.clan_tag, new_missed.player_tag, SUM(new_missed.attacks_missed)
+    FROM new_missed
+    INNER JOIN seasons
+    ON seasons.start < new_missed.load_time
+    AND new_missed.load_time < seasons.finish
+    GROUP BY seasons.id, new_missed.clan_tag, new_missed.player_tag
+    ON CONFLICT (season_id, clan_tag, player_tag)
+    DO UPDATE SET missed = war_season_stats.missed + excluded.missed;
+    return NULL;
+end;
+$function$
+;
+
+CREATE TRIGGER war_season_stats_missed
+AFTER INSERT ON war_missed_attacks
+REFERENCING NEW TABLE AS new_missed
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.war_season_stats_missed_inserted();
+
+-- backfill from the wars already saved
+INSERT INTO war_season_stats (season_id, clan_tag, player_tag, stars, destruction, three_stars, two_stars, attacks)
+SELECT seasons.id, clan_tag, player_tag, SUM(stars), SUM(destruction),
+       COUNT(*) FILTER (WHERE stars = 3), COUNT(*) FILTER (WHERE stars = 2), COUNT(*)
+FROM war_attacks
+INNER JOIN seasons
+ON seasons.start < load_time
+AND load_time < seasons.finish
+GROUP BY seasons.id, clan_tag, player_tag;
+
+INSERT INTO war_season_stats (season_id, clan_tag, player_tag, missed)
+SELECT seasons.id, clan_tag, player_tag, SUM(attacks_missed)
+FROM war_missed_attacks
+INNER JOIN seasons
+ON seasons.start < load_time
+AND load_time < seasons.finish
+GROUP BY seasons.id, clan_tag, player_tag
+ON CONFLICT (season_id, clan_tag, player_tag)
+DO UPDATE SET missed = excluded.missed;
+
+-- the final top n rows of every donation/trophy board for each sort, written once a season is over.
+-- last_online is frozen at the end of the season so a historical board always renders the same.
+create table board_season_snapshots (
+    channel_id bigint,
+    season_id integer,
+    sort_by text,
+    rank integer,
+    player_tag text,
+    player_name text,
+    clan_tag text,
+    fake_clan_tag text,
+    emoji text,
+    donations integer,
+    received integer,
+    ratio decimal,
+    trophies integer,
+    gain integer,
+    last_online interval,
+    primary key (channel_id, season_id, sort_by, rank)
+);
+
+CREATE OR REPLACE FUNCTION public.snapshot_board_season(season INTEGER, n INTEGER DEFAULT 200)
+ RETURNS void
+ LANGUAGE plpgsql
+AS $function$
+declare
+    season_finish TIMESTAMP;
+    channel BIGINT;
+    sort_name TEXT;
+    order_by TEXT;
+begin
+    SELECT finish INTO season_finish FROM seasons WHERE id = season;
+
+    -- board_players only has past seasons for players that changed during them, so make sure it's complete.
+    FOR channel IN SELECT DISTINCT channel_id FROM clans LOOP
+        PERFORM public.rebuild_board_players(channel, season);
+    END LOOP;
+
+    DELETE FROM board_season_snapshots WHERE season_id = season;
+
+    -- these are the ORDER BYs of syncboards.board_players_sorting
+    FOR sort_name, order_by IN SELECT * FROM (VALUES
+        ('donations', 'donations DESC, player_tag'),
+        ('received', 'received DESC, player_tag'),
+        ('ratio', 'ratio DESC, player_tag'),
+        ('trophies', 'trophies DESC, player_tag'),
+        ('gain', 'gain DESC, player_tag'),
+        ('last_online ASC, player_name', 'last_updated DESC NULLS LAST, player_name DESC, player_tag')
+    ) AS sorts LOOP
+        EXECUTE format($query$
+            INSERT INTO board_season_snapshots (channel_id, season_id, sort_by, rank, player_tag, player_name, clan_tag,
+                                                fake_clan_tag, emoji, donations, received, ratio, trophies, gain, last_online)
+            SELECT channel_id, season_id, $1, rank, player_tag, player_name, clan_tag,
+                   fake_clan_tag, emoji, donations, received, ratio, trophies, gain, $2 - last_updated
+            FROM (
+                SELECT *, row_number() OVER (PARTITION BY channel_id ORDER BY %s) AS rank
+                FROM board_players
+                WHERE season_id = $3
+            ) AS ranked
+            WHERE rank <= $4
+        $query$, order_by) USING sort_name, season_finish, season, n;
+    END LOOP;
+end;
+$function$
+;
+
+-- the bot caches each guild's configuration and drops it when this fires.
+CREATE OR REPLACE FUNCTION public.notify_guild_config()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+begin
+    if TG_OP = 'DELETE' then
+        PERFORM pg_notify('guild_config', OLD.guild_id::text);
+    else
+        PERFORM pg_notify('guild_config', NEW.guild_id::text);
+        if TG_OP = 'UPDATE' and NEW.guild_id IS DISTINCT FROM OLD.guild_id then
+            PERFORM pg_notify('guild_config', OLD.guild_id::text);
+        end if;
+    end if;
+    return NULL;
+end;
+$function$
+;
+
+CREATE TRIGGER guilds_guild_config_notify
+AFTER INSERT OR UPDATE OR DELETE ON guilds
+FOR EACH ROW
+EXECUTE FUNCTION public.notify_guild_config();
+
+CREATE TRIGGER logs_guild_config_notify
+AFTER INSERT OR UPDATE OR DELETE ON logs
+FOR EACH ROW
+EXECUTE FUNCTION public.notify_guild_config();
+
+-- boards are updated constantly for need_to_update, claims and the page and season on screen,
+-- so only notify for the settings people change.
+CREATE TRIGGER boards_guild_config_notify
+AFTER INSERT OR DELETE OR UPDATE OF guild_id, channel_id, message_id, icon_url, title, toggle, type, sort_by,
+                                    in_event, per_page, divert_to_channel_id ON boards
+FOR EACH ROW
+EXECUTE FUNCTION public.notify_guild_config();
+
+-- profiles used by the stats commands (+attacks, +defenses, +achievement), kept warm by syncer.
+CREATE TABLE player_profiles (
+    player_tag TEXT PRIMARY KEY,
+    player_name TEXT,
+    clan_tag TEXT,
+    trophies INTEGER,
+    best_trophies INTEGER,
+    attack_wins INTEGER,
+    defense_wins INTEGER,
+    achievements JSONB NOT NULL DEFAULT '{}',  -- achievement name: value
+    updated TIMESTAMP NOT NULL DEFAULT now()
+);
+create index player_profiles_updated_idx on player_profiles (updated);
+-- achievement descriptions are the same for every player, so they're kept once here rather than in every profile.
+CREATE TABLE achievement_info (
+    name TEXT PRIMARY KEY,
+    info TEXT NOT NULL
+);
+create index commands_used_idx on commands (used);
+
+-- activity rollups: one row per player / clan per day, with the day's events split by hour (UTC) in counters[hour + 1].
+-- they're kept up to date by triggers on activity_query, so graphs never have to read the raw hourly rows.
+CREATE TABLE activity_player_daily (
+    player_tag TEXT,
+    day DATE,
+    total BIGINT NOT NULL DEFAULT 0,
+    counters BIGINT[] NOT NULL DEFAULT array_fill(0, ARRAY[24]),
+
+    PRIMARY KEY (player_tag, day)
+);
+
+CREATE TABLE activity_clan_daily (
+    clan_tag TEXT,
+    day DATE,
+    num_players INTEGER NOT NULL DEFAULT 0,  -- distinct players with activity in the clan that day
+    total BIGINT NOT NULL DEFAULT 0,
+    counters BIGINT[] NOT NULL DEFAULT array_fill(0, ARRAY[24]),
+
+    PRIMARY KEY (clan_tag, day)
+);
+
+CREATE OR REPLACE FUNCTION public.add_counters(a BIGINT[], b BIGINT[])
+ RETURNS BIGINT[]
+ LANGUAGE sql
+ IMMUTABLE
+AS $function$
+    SELECT array_agg(x + y ORDER BY i) FROM unnest(a, b) WITH ORDINALITY AS t(x, y, i)
+$function$
+;
+
+CREATE OR REPLACE FUNCTION public.activity_query_rollup()
+ RETURNS trigger
+ LANGUAGE plpgsql
+AS $function$
+declare
+    changes TEXT;
+begin
+    -- syncer's flush upserts, so the same statement can insert some rows and add to others.
+    if TG_OP = 'INSERT' then
+        changes := 'SELECT player_tag, clan_tag, hour_time, counter, TRUE AS inserted FROM new_rows';
+    else
+        changes := 'SELECT n.player_tag, n.clan_tag, n.hour_time, n.counter - o.counter AS counter, FALSE AS inserted
+                    FROM new_rows n
+                    INNER JOIN old_rows o
+                    USING (player_tag, clan_tag, hour_time)';
+    end if;
+
+    EXECUTE format($query$
+        WITH changes AS (%s),
+        deltas AS (
+            SELECT player_tag, hour_time::date AS day, date_part('HOUR', hour_time)::int + 1 AS h, SUM(counter) AS counter
+            FROM changes
+            GROUP BY 1, 2, 3
+        )
+        INSERT INTO activity_player_daily (player_tag, day, total, counters)
+        SELECT days.player_tag, days.day, SUM(COALESCE(deltas.counter, 0)), array_agg(COALESCE(deltas.counter, 0) ORDER BY g.h)
+        FROM (SELECT DISTINCT player_tag, day FROM deltas) AS days
+        CROSS JOIN generate_series(1, 24) AS g(h)
+        LEFT JOIN deltas
+        ON deltas.player_tag = days.player_tag AND deltas.day = days.day AND deltas.h = g.h
+        GROUP BY days.player_tag, days.day
+        ON CONFLICT (player_tag, day)
+        DO UPDATE SET total = activity_player_daily.total + excluded.total,
+                      counters = public.add_counters(activity_player_daily.counters, excluded.counters)
+    $query$, changes);
+
+    EXECUTE format($query$
+        WITH changes AS (%s),
+        deltas AS (
+            SELECT clan_tag, hour_time::date AS day, date_part('HOUR', hour_time)::int + 1 AS h, SUM(counter) AS counter
+            FROM changes
+            GROUP BY 1, 2, 3
+        ),
+        -- a player counts towards num_players the first time they show up in the clan on a day.
+        new_players AS (
+            SELECT clan_tag, day, COUNT(*) AS num_players
+            FROM (
+                SELECT DISTINCT clan_tag, player_tag, hour_time::date AS day
+                FROM changes
+                WHERE inserted
+            ) AS c
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM activity_query
+                WHERE activity_query.player_tag = c.player_tag
+                AND activity_query.clan_tag = c.clan_tag
+                AND activity_query.hour_time >= c.day
+                AND activity_query.hour_time < c.day + 1
+                AND NOT EXISTS (
+                    SELECT 1 FROM changes
+                    WHERE changes.player_tag = activity_query.player_tag
+                    AND changes.clan_tag = activity_query.clan_tag
+                    AND changes.hour_time = activity_query.hour_time
+                )
+            )
+            GROUP BY clan_tag, day
+        )
+        INSERT INTO activity_clan_daily (clan_tag, day, num_players, total, counters)
+        SELECT days.clan_tag, days.day, COALESCE(MIN(new_players.num_players), 0),
+               SUM(COALESCE(deltas.counter, 0)), array_agg(COALESCE(deltas.counter, 0) ORDER BY g.h)
+        FROM (SELECT DISTINCT clan_tag, day FROM deltas) AS days
+        CROSS JOIN generate_series(1, 24) AS g(h)
+        LEFT JOIN deltas
+        ON deltas.clan_tag = days.clan_tag AND deltas.day = days.day AND deltas.h = g.h
+        LEFT JOIN new_players
+        ON new_players.clan_tag = days.clan_tag AND new_players.day = days.day
+        GROUP BY days.clan_tag, days.day
+        ON CONFLICT (clan_tag, day)
+        DO UPDATE SET num_players = activity_clan_daily.num_players + excluded.num_players,
+                      total = activity_clan_daily.total + excluded.total,
+                      counters = public.add_counters(activity_clan_daily.counters, excluded.counters)
+    $query$, changes);
+
+    return NULL;
+end;
+$function$
+;
+
+CREATE TRIGGER activity_query_rollup_insert
+AFTER INSERT ON activity_query
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.activity_query_rollup();
+
+CREATE TRIGGER activity_query_rollup_update
+AFTER UPDATE ON activity_query
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION public.activity_query_rollup();
+
+CREATE OR REPLACE FUNCTION public.rebuild_activity_rollups()
+ RETURNS void
+ LANGUAGE plpgsql
+AS $function$
+begin
+    TRUNCATE activity_player_daily, activity_clan_daily;
+
+    INSERT INTO activity_player_daily (player_tag, day, total, counters)
+    SELECT player_tag, day, SUM(counter), array_agg(counter ORDER BY h)
+    FROM (
+        SELECT days.player_tag, days.day, g.h, COALESCE(SUM(activity_query.counter), 0) AS counter
+        FROM (SELECT DISTINCT player_tag, hour_time::date AS day FROM activity_query) AS days
+        CROSS JOIN generate_series(1, 24) AS g(h)
+        LEFT JOIN activity_query
+        ON activity_query.player_tag = days.player_tag
+        AND activity_query.hour_time::date = days.day
+        AND date_part('HOUR', activity_query.hour_time)::int + 1 = g.h
+        GROUP BY days.player_tag, days.day, g.h
+    ) AS hours
+    GROUP BY player_tag, day;
+
+    INSERT INTO activity_clan_daily (clan_tag, day, num_players, total, counters)
+    SELECT hours.clan_tag, hours.day, MIN(players.num_players), SUM(counter), array_agg(counter ORDER BY h)
+    FROM (
+        SELECT days.clan_tag, days.day, g.h, COALESCE(SUM(activity_query.counter), 0) AS counter
+        FROM (SELECT DISTINCT clan_tag, hour_time::date AS day FROM activity_query) AS days
+        CROSS JOIN generate_series(1, 24) AS g(h)
+        LEFT JOIN activity_query
+        ON activity_query.clan_tag = days.clan_tag
+        AND activity_query.hour_time::date = days.day
+        AND date_part('HOUR', activity_query.hour_time)::int + 1 = g.h
+        GROUP BY days.clan_tag, days.day, g.h
+    ) AS hours
+    INNER JOIN (
+        SELECT clan_tag, hour_time::date AS day, COUNT(DISTINCT player_tag) AS num_players
+        FROM activity_query
+        GROUP BY clan_tag, day
+    ) AS players
+    ON players.clan_tag = hours.clan_tag AND players.day = hours.day
+    GROUP BY hours.clan_tag, hours.day;
+end;
+$function$
+;
+
+-- backfill from the activity already recorded
+SELECT public.rebuild_activity_rollups();
+
+-- players_history only gets a row when one of a player's tracked fields changed since their last snapshot.
+-- players_history_latest holds that last snapshot so the daily diff doesn't have to search players_history,
+-- and a row with deleted = TRUE marks when a player stopped being tracked.
+ALTER TABLE players_history ADD COLUMN deleted BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE TABLE players_history_latest (LIKE players_history INCLUDING DEFAULTS);
+ALTER TABLE players_history_latest ADD PRIMARY KEY (player_tag);
+
+INSERT INTO players_history_latest
+SELECT DISTINCT ON (player_tag) *
+FROM players_history
+WHERE player_tag IS NOT NULL
+ORDER BY player_tag, date_added DESC;
+
+CREATE OR REPLACE FUNCTION public.snapshot_players_history(season INTEGER)
+ RETURNS INTEGER
+ LANGUAGE plpgsql
+AS $function$
+declare
+    written INTEGER;
+    removed INTEGER;
+begin
+    WITH tracked AS (
+        SELECT player_tag, donations, received, user_id, end_friend_in_need AS friend_in_need,
+               end_sharing_is_caring AS sharing_is_caring, trophies, end_best_trophies AS best_trophies, last_updated,
+               league_id, versus_trophies, clan_tag, level, player_name, attacks, defenses, versus_attacks,
+               exp_level, games_champion, well_seasoned
+        FROM players
+        WHERE season_id = season
+        AND player_tag IS NOT NULL
+    ),
+    changed AS (
+        SELECT tracked.*
+        FROM tracked
+        LEFT JOIN players_history_latest AS latest
+        ON latest.player_tag = tracked.player_tag
+        -- last_updated isn't compared, since the syncer bumps it for every online player. it's only stored
+        -- along with a change to something else.
+        WHERE latest.player_tag IS NULL
+        OR (tracked.donations, tracked.received, tracked.user_id, tracked.friend_in_need, tracked.sharing_is_caring,
+            tracked.trophies, tracked.best_trophies, tracked.league_id, tracked.versus_trophies,
+            tracked.clan_tag, tracked.level, tracked.player_name, tracked.attacks, tracked.defenses,
+            tracked.versus_attacks, tracked.exp_level, tracked.games_champion, tracked.well_seasoned)
+        IS DISTINCT FROM
+           (latest.donations, latest.received, latest.user_id, latest.friend_in_need, latest.sharing_is_caring,
+            latest.trophies, latest.best_trophies, latest.league_id, latest.versus_trophies,
+            latest.clan_tag, latest.level, latest.player_name, latest.attacks, latest.defenses,
+            latest.versus_attacks, latest.exp_level, latest.games_champion, latest.well_seasoned)
+    ),
+    inserted AS (
+        INSERT INTO players_history (player_tag, donations, received, user_id, friend_in_need, sharing_is_caring, trophies,
+                                     best_trophies, last_updated, league_id, versus_trophies, clan_tag, level,
+                                     player_name, attacks, defenses, versus_attacks, exp_level, games_champion, well_seasoned)
+        SELECT * FROM changed
+        RETURNING *
+    )
+    INSERT INTO players_history_latest
+    SELECT * FROM inserted
+    ON CONFLICT (player_tag)
+    DO UPDATE SET id = excluded.id, donations = excluded.donations, received = excluded.received,
+                  trophies = excluded.trophies, user_id = excluded.user_id, friend_in_need = excluded.friend_in_need,
+                  sharing_is_caring = excluded.sharing_is_caring, attacks = excluded.attacks,
+                  defenses = excluded.defenses, best_trophies = excluded.best_trophies,
+                  last_updated = excluded.last_updated, name = excluded.name, league_id = excluded.league_id,
+                  versus_trophies = excluded.versus_trophies, clan_tag = excluded.clan_tag, level = excluded.level,
+                  player_name = excluded.player_name, versus_attacks = excluded.versus_attacks,
+                  exp_level = excluded.exp_level, date_added = excluded.date_added,
+                  games_champion = excluded.games_champion, well_seasoned = excluded.well_seasoned,
+                  deleted = excluded.deleted;
+    GET DIAGNOSTICS written = ROW_COUNT;
+
+    -- players that aren't tracked this season anymore get a tombstone, so they drop out of later days.
+    WITH gone AS (
+        DELETE FROM players_history_latest AS latest
+        WHERE NOT EXISTS (SELECT 1 FROM players WHERE players.season_id = season AND players.player_tag = latest.player_tag)
+        RETURNING latest.player_tag
+    )
+    INSERT INTO players_history (player_tag, deleted)
+    SELECT player_tag, TRUE FROM gone;
+    GET DIAGNOSTICS removed = ROW_COUNT;
+
+    return written + removed;
+end;
+$function$
+;
+
+-- everyone's state as of the end of ``day``: their last snapshot on or before it.
+CREATE OR REPLACE FUNCTION public.players_history_on(day DATE)
+ RETURNS SETOF players_history
+ LANGUAGE sql
+ STABLE
+AS $function$
+    SELECT *
+    FROM (
+        SELECT DISTINCT ON (player_tag) *
+        FROM players_history
+        WHERE date_added < day + 1
+        ORDER BY player_tag, date_added DESC
+    ) AS last_snapshot
+    WHERE NOT deleted
+$function$
+;
+
+-- the legend days each board has been archived for, so a day is only posted once.
+create table legend_board_archives (
+    channel_id bigint,
+    day timestamp,
+    primary key (channel_id, day)
+);
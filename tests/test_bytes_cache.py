@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("lru")
+
+from cogs.utils.cache import BytesCache
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class Fetcher:
+    def __init__(self, data):
+        self.data = data
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return self.data
+
+
+def test_hit_after_miss():
+    async def main():
+        cache = BytesCache(max_bytes=100)
+        fetch = Fetcher(b"abc")
+        assert await cache.get("a", fetch) == b"abc"
+        assert await cache.get("a", fetch) == b"abc"
+        assert fetch.calls == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    run(main())
+
+
+def test_concurrent_misses_share_a_fetch():
+    async def main():
+        cache = BytesCache(max_bytes=100)
+        fetch = Fetcher(b"abc")
+        results = await asyncio.gather(*(cache.get("a", fetch) for _ in range(5)))
+        assert results == [b"abc"] * 5
+        assert fetch.calls == 1
+
+    run(main())
+
+
+def test_evicts_least_recently_used_over_max_bytes():
+    async def main():
+        cache = BytesCache(max_bytes=10)
+        await cache.get("a", Fetcher(b"aaaa"))
+        await cache.get("b", Fetcher(b"bbbb"))
+        await cache.get("a", Fetcher(None))  # a is now the most recently used
+        await cache.get("c", Fetcher(b"cccc"))
+
+        assert "a" in cache and "c" in cache
+        assert "b" not in cache
+
+    run(main())
+
+
+def test_values_bigger_than_the_cache_are_not_kept():
+    async def main():
+        cache = BytesCache(max_bytes=3)
+        assert await cache.get("a", Fetcher(b"abcd")) == b"abcd"
+        assert len(cache) == 0
+
+    run(main())
+
+
+def test_expired_values_are_fetched_again():
+    async def main():
+        cache = BytesCache(max_bytes=100)
+        fetch = Fetcher(b"abc")
+        await cache.get("a", fetch, ttl=-1)
+        await cache.get("a", fetch)
+        assert fetch.calls == 2
+
+    run(main())
+
+
+def test_misses_and_errors_are_not_cached():
+    async def main():
+        cache = BytesCache(max_bytes=100)
+        assert await cache.get("a", Fetcher(None)) is None
+
+        async def fail():
+            raise OSError
+
+        with pytest.raises(OSError):
+            await cache.get("a", fail)
+
+        assert await cache.get("a", Fetcher(b"abc")) == b"abc"
+
+    run(main())
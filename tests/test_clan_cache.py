@@ -0,0 +1,92 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("lru")
+
+from cogs.utils.cache import ClanCache
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def clan(tag, name="clan"):
+    return SimpleNamespace(tag=tag, name=name)
+
+
+class Fetcher:
+    def __init__(self, clans):
+        self.clans = clans
+        self.calls = 0
+        # lets a test invalidate the guild while its clans are being fetched.
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.gate.wait()
+        return self.clans
+
+
+def test_bounded_by_number_of_guilds():
+    async def main():
+        cache = ClanCache(max_guilds=2)
+        for guild_id in (1, 2, 3):
+            await cache.get((guild_id, False), Fetcher([clan("#A"), clan("#B")]))
+
+        assert len(cache) == 2
+        assert (1, False) not in cache
+
+    run(main())
+
+
+def test_invalidate_during_fetch_is_not_cached():
+    async def main():
+        cache = ClanCache()
+        fetch = Fetcher([clan("#A")])
+        fetch.gate.clear()
+
+        load = asyncio.create_task(cache.get((1, False), fetch))
+        await asyncio.sleep(0)
+        cache.invalidate(1)
+        fetch.gate.set()
+        await load
+
+        assert len(cache) == 0
+        await cache.get((1, False), fetch)
+        assert fetch.calls == 2
+
+    run(main())
+
+
+def test_invalidate_all_during_fetch_is_not_cached():
+    async def main():
+        cache = ClanCache()
+        fetch = Fetcher([clan("#A")])
+        fetch.gate.clear()
+
+        load = asyncio.create_task(cache.get((1, False), fetch))
+        await asyncio.sleep(0)
+        cache.invalidate()
+        fetch.gate.set()
+        await load
+
+        assert len(cache) == 0
+
+    run(main())
+
+
+def test_update_clan():
+    async def main():
+        cache = ClanCache()
+        await cache.get((1, False), Fetcher([clan("#A"), clan("#B")]))
+        await cache.get((2, False), Fetcher([clan("#B")]))
+
+        assert cache.update_clan(clan("#B", "renamed")) == 2
+        assert [c.name for c in await cache.get((1, False), Fetcher(None))] == ["clan", "renamed"]
+        assert cache.has_clan("#A") and not cache.has_clan("#C")
+
+    run(main())
@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("discord")
+pytest.importorskip("lru")
+
+from cogs.utils.cache import GuildConfigCache
+
+
+def board(guild_id, message_id, title="Donation Leaderboard"):
+    return {
+        "id": message_id, "guild_id": guild_id, "channel_id": 10, "icon_url": None, "title": title,
+        "sort_by": "donations", "toggle": True, "type": "donation", "in_event": False, "message_id": message_id,
+        "per_page": 0, "page": 1, "season_id": None,
+    }
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    async def fetchrow(self, query, guild_id):
+        self.db.queries += 1
+        # lets a test change the config while a load is in the middle of reading it.
+        await self.db.gate.wait()
+        return {"guild_id": guild_id, "prefix": "+"}
+
+    async def fetch(self, query, guild_id):
+        if "FROM boards" in query:
+            return [row for row in self.db.boards if row["guild_id"] == guild_id]
+        return []
+
+
+class FakePool:
+    def __init__(self):
+        self.boards = []
+        self.queries = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    def acquire(self):
+        pool = self
+
+        class Acquire:
+            async def __aenter__(self):
+                return FakeConnection(pool)
+
+            async def __aexit__(self, *exc):
+                pass
+
+        return Acquire()
+
+    async def fetchval(self, query, message_id):
+        for row in self.boards:
+            if row["message_id"] == message_id:
+                return row["guild_id"]
+
+
+class FakeBot:
+    def __init__(self):
+        self.pool = FakePool()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_get_caches_until_invalidated():
+    async def main():
+        cache = GuildConfigCache(FakeBot())
+        cache.bot.pool.boards.append(board(1, 100))
+
+        assert (await cache.board_config(100)).title == "Donation Leaderboard"
+        await cache.board_config(100)
+        assert cache.bot.pool.queries == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        cache.bot.pool.boards[0]["title"] = "Renamed"
+        cache.invalidate(1)
+        assert (await cache.board_config(100)).title == "Renamed"
+        assert cache.bot.pool.queries == 2
+
+    run(main())
+
+
+def test_concurrent_gets_share_a_load():
+    async def main():
+        cache = GuildConfigCache(FakeBot())
+        cache.bot.pool.gate.clear()
+        tasks = [asyncio.create_task(cache.get(1)) for _ in range(3)]
+        await asyncio.sleep(0)
+        cache.bot.pool.gate.set()
+        entries = await asyncio.gather(*tasks)
+
+        assert cache.bot.pool.queries == 1
+        assert entries[0] is entries[1] is entries[2]
+
+    run(main())
+
+
+def test_invalidate_during_load_is_not_lost():
+    async def main():
+        cache = GuildConfigCache(FakeBot())
+        cache.bot.pool.boards.append(board(1, 100))
+        cache.bot.pool.gate.clear()
+
+        load = asyncio.create_task(cache.get(1))
+        await asyncio.sleep(0)
+        # the change is notified while the old config is being read.
+        cache.invalidate(1)
+        cache.bot.pool.gate.set()
+        await load
+
+        assert len(cache) == 0
+        cache.bot.pool.boards[0]["title"] = "Renamed"
+        assert (await cache.board_config(100)).title == "Renamed"
+
+    run(main())
+
+
+def test_invalidate_all_during_load_is_not_lost():
+    async def main():
+        cache = GuildConfigCache(FakeBot())
+        cache.bot.pool.gate.clear()
+
+        load = asyncio.create_task(cache.get(1))
+        await asyncio.sleep(0)
+        cache.invalidate()
+        cache.bot.pool.gate.set()
+        await load
+
+        assert len(cache) == 0
+
+    run(main())
+
+
+def test_invalidate_forgets_board_messages():
+    async def main():
+        cache = GuildConfigCache(FakeBot())
+        cache.bot.pool.boards.extend([board(1, 100), board(2, 200)])
+        await cache.board_config(100)
+        await cache.board_config(200)
+
+        # the board was moved to another message.
+        cache.bot.pool.boards[0]["message_id"] = 101
+        cache.invalidate(1)
+        assert 100 not in cache._message_guilds
+        assert 200 in cache._message_guilds
+
+        assert await cache.board_config(100) is None
+        assert (await cache.board_config(101)).message_id == 101
+
+    run(main())
+
+
+def test_configs_are_copies():
+    async def main():
+        cache = GuildConfigCache(FakeBot())
+        cache.bot.pool.boards.append(board(1, 100))
+
+        config = await cache.board_config(100)
+        config.title = "Changed"
+        assert (await cache.board_config(100)).title == "Donation Leaderboard"
+
+    run(main())
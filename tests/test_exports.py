@@ -0,0 +1,89 @@
+import asyncio
+import csv
+import gzip
+import io
+
+from cogs.utils.exports import export_csv, export_filename
+
+
+class FakeRecord(dict):
+    pass
+
+
+class FakeCursor:
+    def __init__(self, records):
+        self.records = records
+        self.fetches = []
+
+    async def fetch(self, n):
+        self.fetches.append(n)
+        chunk, self.records = self.records[:n], self.records[n:]
+        return chunk
+
+
+class FakeTransaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        self.conn.in_transaction = True
+
+    async def __aexit__(self, *exc):
+        self.conn.in_transaction = False
+
+
+class FakeConnection:
+    def __init__(self, records):
+        self.cursor_ = FakeCursor(records)
+        self.in_transaction = False
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    async def cursor(self, query, *args):
+        # asyncpg only allows cursors inside a transaction.
+        assert self.in_transaction
+        return self.cursor_
+
+
+def records(n):
+    return [FakeRecord(player_tag=f"#{i}", player_name=f"player é{i}", donations=i) for i in range(n)]
+
+
+def read(fp, compress):
+    data = fp.read()
+    if compress:
+        data = gzip.decompress(data)
+    return list(csv.reader(io.StringIO(data.decode("utf-8-sig"), newline="")))
+
+
+def test_export_in_chunks():
+    conn = FakeConnection(records(25))
+    fp, rows = asyncio.run(export_csv(conn, "SELECT", chunk_size=10))
+    with fp:
+        assert rows == 25
+        assert conn.cursor_.fetches == [10, 10, 10, 10]
+        lines = read(fp, compress=False)
+
+    assert lines[0] == ["player_tag", "player_name", "donations"]
+    assert lines[1] == ["#0", "player é0", "0"]
+    assert len(lines) == 26
+
+
+def test_export_compressed():
+    fp, rows = asyncio.run(export_csv(FakeConnection(records(3)), "SELECT", compress=True))
+    with fp:
+        assert rows == 3
+        assert read(fp, compress=True)[-1] == ["#2", "player é2", "2"]
+
+
+def test_export_nothing():
+    fp, rows = asyncio.run(export_csv(FakeConnection([]), "SELECT"))
+    with fp:
+        assert rows == 0
+        assert fp.read() == b""
+
+
+def test_filename():
+    assert export_filename("export", False) == "export.csv"
+    assert export_filename("export", True) == "export.csv.gz"
@@ -0,0 +1,47 @@
+from cogs.utils.keyset import get_order_by, get_keyset_condition, get_keyset_values
+
+
+DONATIONS = (("donations", "DESC", "integer"), ("player_tag", "ASC", "text"))
+LAST_ONLINE = (
+    ("last_updated", "DESC NULLS LAST", "timestamp"), ("player_name", "DESC", "text"), ("player_tag", "ASC", "text")
+)
+
+
+def test_order_by():
+    assert get_order_by(DONATIONS) == "donations DESC, player_tag ASC"
+    assert get_order_by(LAST_ONLINE) == "last_updated DESC NULLS LAST, player_name DESC, player_tag ASC"
+
+
+def test_condition_seeks_past_every_key():
+    assert get_keyset_condition(DONATIONS, 5) == (
+        "((donations < $5::text::integer) OR (donations = $5::text::integer AND player_tag > $6::text))"
+    )
+
+
+def test_condition_keeps_nulls_last():
+    condition = get_keyset_condition(LAST_ONLINE, 3)
+    assert condition == (
+        "(((last_updated < $3::text::timestamp OR last_updated IS NULL))"
+        " OR (last_updated = $3::text::timestamp AND player_name < $4::text)"
+        " OR (last_updated = $3::text::timestamp AND player_name = $4::text AND player_tag > $5::text))"
+    )
+
+
+def test_condition_qualified_columns():
+    keys = (("COALESCE(legend_days.finishing, -1)", "DESC", "integer"), ("legend_days.player_tag", "ASC", "text"))
+    assert "legend_days.player_tag > $7::text" in get_keyset_condition(keys, 6)
+
+
+def test_values():
+    row = {"donations": 120, "player_tag": "#ABC", "received": 3}
+    assert get_keyset_values(DONATIONS, row) == ["120", "#ABC"]
+
+
+def test_values_qualified_columns():
+    keys = (("legend_days.finishing", "DESC", "integer"), ("legend_days.player_tag", "ASC", "text"))
+    assert get_keyset_values(keys, {"finishing": 5000, "player_tag": "#ABC"}) == ["5000", "#ABC"]
+
+
+def test_values_with_null_fall_back_to_offset():
+    row = {"last_updated": None, "player_name": "bob", "player_tag": "#ABC"}
+    assert get_keyset_values(LAST_ONLINE, row) is None